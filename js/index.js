@@ -360,9 +360,7 @@ async function showSyndromeDetail(syndromeId) {
 
   if (!data) {
     try {
-      const response = await fetch(`data/zhenghou/syndromes/${syndromeId}.json`);
-      if (!response.ok) throw new Error('無法載入證型資料');
-      data = await response.json();
+      data = await fetchSyndromeDetail(syndromeId);
       syndromeCache[syndromeId] = data;
     } catch (error) {
       console.error('載入證型詳情失敗:', error);
@@ -0,0 +1,83 @@
+/**
+ * 中醫證候資料庫 - 證候詳情打包檔讀取
+ *
+ * 以 data/indexes/syndromes_pack.json 的位移對照表，透過 HTTP Range 請求單筆證候；
+ * 也可一次下載整個打包檔供離線使用。打包檔不存在時退回逐檔讀取。
+ */
+
+const SYNDROME_PACK_TABLE = 'data/indexes/syndromes_pack.json';
+const SYNDROME_PACK_DIR = 'data/indexes';
+
+let syndromePackTable;            // undefined: 尚未載入；null: 無打包檔
+let syndromePackBytes = null;     // 整包下載後的位元組
+const syndromePackDecoder = new TextDecoder('utf-8');
+
+/**
+ * 載入位移對照表（只載入一次）
+ */
+async function loadSyndromePackTable() {
+  if (syndromePackTable !== undefined) return syndromePackTable;
+
+  try {
+    const response = await fetch(SYNDROME_PACK_TABLE);
+    if (!response.ok) throw new Error('無打包檔對照表');
+    syndromePackTable = await response.json();
+  } catch (error) {
+    syndromePackTable = null;
+  }
+  return syndromePackTable;
+}
+
+/**
+ * 從已下載的整包中取出單筆證候
+ */
+function readPackedSyndrome(bytes, entry) {
+  const [offset, length] = entry;
+  return JSON.parse(syndromePackDecoder.decode(bytes.subarray(offset, offset + length)));
+}
+
+/**
+ * 一次下載整個打包檔（離線使用或預先載入全部證候）
+ */
+async function preloadSyndromePack() {
+  if (syndromePackBytes) return true;
+
+  const table = await loadSyndromePackTable();
+  if (!table) return false;
+
+  const response = await fetch(`${SYNDROME_PACK_DIR}/${table.pack}`);
+  if (!response.ok) return false;
+  syndromePackBytes = new Uint8Array(await response.arrayBuffer());
+  return true;
+}
+
+/**
+ * 取得單筆證候詳情：整包已下載時直接取用，否則以 Range 請求該筆的位元組範圍
+ */
+async function fetchSyndromeDetail(syndromeId) {
+  const table = await loadSyndromePackTable();
+  const entry = table?.entries?.[syndromeId];
+
+  if (entry) {
+    if (syndromePackBytes) {
+      return readPackedSyndrome(syndromePackBytes, entry);
+    }
+
+    const [offset, length] = entry;
+    const response = await fetch(`${SYNDROME_PACK_DIR}/${table.pack}`, {
+      headers: { Range: `bytes=${offset}-${offset + length - 1}` }
+    });
+    if (response.status === 206) {
+      return JSON.parse(await response.text());
+    }
+    if (response.ok) {
+      // 伺服器不支援 Range 時會回傳整包，順便保留供後續使用
+      syndromePackBytes = new Uint8Array(await response.arrayBuffer());
+      return readPackedSyndrome(syndromePackBytes, entry);
+    }
+  }
+
+  const response = await fetch(`data/zhenghou/syndromes/${syndromeId}.json`);
+  if (!response.ok) throw new Error('無法載入證型資料');
+  return response.json();
+}
@@ -1,5 +1,6 @@
 /**
  * 中醫證候資料庫 - 證候模組
+ * 需先載入 js/syndrome-pack.js
  */
 
 // 全域資料
@@ -7,6 +8,28 @@ let zhenghouIndex = null;
 let zhenghouCache = {};
 let syndromeMap = {}; // id -> syndrome 的快速查找
 
+// 證候位元集合：第 i 個位元對應 syndromeOrdinals[i]
+const SYNDROME_BITSETS_URL = 'data/indexes/syndrome_bitsets.json';
+let syndromeBitsets = null;      // 預先計算的證素/症狀位元集合（無檔案時為 null）
+let syndromeOrdinals = [];       // 序號 -> id
+let syndromeOrdinalMap = {};     // id -> 序號
+let bitsetCache = {};            // `${種類}:${鍵}` -> Uint32Array
+let bitsetsPromise = null;       // 首次以證素/症狀篩選時才載入
+
+// 取自位元集合索引的條件種類；其餘種類由證候索引的 search_indexes 建立
+const SHIPPED_BITSET_KINDS = ['zhengsu', 'symptoms'];
+
+// 預先計算的相似證候（依證素組成）；首次開啟詳情時才載入
+const SYNDROME_NEIGHBORS_URL = 'data/indexes/syndrome_neighbors.json';
+const NEIGHBORS_SHOWN = 8;
+let syndromeNeighbors = null;
+let neighborsPromise = null;
+
+// 預先計算的方劑 × 證候適配矩陣（uint8 量化）；首次開啟詳情時才載入
+const FORMULA_AFFINITY_URL = 'data/indexes/formula_affinity.json';
+const FORMULAS_SHOWN = 5;
+let affinityPromise = null;
+
 // DOM 載入完成後執行
 document.addEventListener('DOMContentLoaded', async () => {
   await loadZhenghouIndex();
@@ -212,9 +235,7 @@ async function showZhenghouDetail(syndromeId) {
 
   if (!data) {
     try {
-      const response = await fetch(`data/zhenghou/syndromes/${syndromeId}.json`);
-      if (!response.ok) throw new Error('無法載入證候資料');
-      data = await response.json();
+      data = await fetchSyndromeDetail(syndromeId);
       zhenghouCache[syndromeId] = data;
     } catch (error) {
       console.error('載入證候詳情失敗:', error);
@@ -232,11 +253,29 @@ async function showZhenghouDetail(syndromeId) {
   const modalBody = document.getElementById('modal-body');
   modalBody.innerHTML = buildDetailContent(data);
 
+  // 相似證候與相關方劑於索引載入後補上，不延遲彈窗開啟
+  appendDeferredSection(modalBody, loadSyndromeNeighbors, neighbors => buildNeighborsContent(syndromeId, neighbors));
+  appendDeferredSection(modalBody, loadFormulaAffinity, affinity => buildFormulasContent(syndromeId, affinity));
+
   // 顯示彈窗
   modal.classList.remove('hidden');
   document.body.style.overflow = 'hidden';
 }
 
+/**
+ * 在容器末端預留位置，loader 完成後以 build 產生的區塊取代；
+ * 區塊為空時只移除預留位置，彈窗已改顯示其他證候（預留位置已不在文件中）時不插入
+ */
+function appendDeferredSection(container, loader, build) {
+  const slot = document.createElement('div');
+  container.appendChild(slot);
+  loader().then(index => {
+    if (!slot.parentNode) return;
+    slot.insertAdjacentHTML('beforebegin', build(index));
+    slot.remove();
+  });
+}
+
 /**
  * 建構證候詳情內容
  */
@@ -306,6 +345,107 @@ function buildDetailContent(data) {
   return html;
 }
 
+/**
+ * 載入相似證候索引（只載入一次；檔案不存在時為 null）
+ */
+function loadSyndromeNeighbors() {
+  if (!neighborsPromise) {
+    neighborsPromise = fetch(SYNDROME_NEIGHBORS_URL)
+      .then(response => {
+        if (!response.ok) throw new Error('無相似證候索引');
+        return response.json();
+      })
+      .then(data => {
+        syndromeNeighbors = data;
+        return data;
+      })
+      .catch(() => null);
+  }
+  return neighborsPromise;
+}
+
+/**
+ * 建構相似證候區塊（直接取用預先計算的鄰居，不需在瀏覽器計算相似度）
+ */
+function buildNeighborsContent(syndromeId, neighbors) {
+  if (!neighbors || !neighbors.neighbors[syndromeId]) return '';
+
+  const rows = neighbors.neighbors[syndromeId].slice(0, NEIGHBORS_SHOWN);
+  if (rows.length === 0) return '';
+
+  return `
+    <section class="detail-section">
+      <h3 class="section-heading">相似證候</h3>
+      <div class="section-content">
+        <div class="symptom-tags">
+          ${rows.map(([id, score]) => `
+            <span class="symptom-tag neighbor-tag" onclick="showZhenghouDetail('${id}')">
+              ${neighbors.names[id] || id}<span class="neighbor-score">${Math.round(score * 100)}%</span>
+            </span>
+          `).join('')}
+        </div>
+      </div>
+    </section>
+  `;
+}
+
+/**
+ * 載入方劑適配矩陣（只載入一次；檔案不存在時為 null）
+ * matrix 解碼為 Uint8Array，第 f 個方劑與第 s 個證候位於 f × 證候數 + s
+ */
+function loadFormulaAffinity() {
+  if (!affinityPromise) {
+    affinityPromise = fetch(FORMULA_AFFINITY_URL)
+      .then(response => {
+        if (!response.ok) throw new Error('無方劑適配矩陣');
+        return response.json();
+      })
+      .then(data => {
+        const binary = atob(data.matrix);
+        const matrix = new Uint8Array(binary.length);
+        for (let i = 0; i < binary.length; i++) {
+          matrix[i] = binary.charCodeAt(i);
+        }
+        const positions = {};
+        data.syndromes.forEach((id, i) => { positions[id] = i; });
+        return { ...data, matrix, positions };
+      })
+      .catch(() => null);
+  }
+  return affinityPromise;
+}
+
+/**
+ * 建構適用方劑區塊（取適配矩陣的一欄，同分時依方劑順序）
+ */
+function buildFormulasContent(syndromeId, affinity) {
+  if (!affinity || affinity.positions[syndromeId] === undefined) return '';
+
+  const s = affinity.positions[syndromeId];
+  const width = affinity.syndromes.length;
+  const rows = affinity.formulas
+    .map((id, f) => [id, affinity.matrix[f * width + s]])
+    .filter(([, value]) => value > 0)
+    .sort((a, b) => b[1] - a[1])
+    .slice(0, FORMULAS_SHOWN);
+  if (rows.length === 0) return '';
+
+  return `
+    <section class="detail-section">
+      <h3 class="section-heading">適用方劑</h3>
+      <div class="section-content">
+        <div class="symptom-tags">
+          ${rows.map(([id, value]) => `
+            <span class="symptom-tag">
+              ${affinity.formula_names[id] || id}<span class="neighbor-score">${Math.round(value / affinity.scale * 100)}%</span>
+            </span>
+          `).join('')}
+        </div>
+      </div>
+    </section>
+  `;
+}
+
 /**
  * 格式化段落文字
  */
@@ -484,48 +624,203 @@ function hideSearchResults() {
 }
 
 /**
- * 按病位篩選
+ * 設定位元集合的序號表（序號改變時清除已建立的位元集合）
  */
-function filterByLocation(location) {
-  if (!zhenghouIndex?.search_indexes?.by_location) return [];
+function setSyndromeOrdinals(ids) {
+  syndromeOrdinals = ids;
+  syndromeOrdinalMap = {};
+  syndromeOrdinals.forEach((id, i) => {
+    syndromeOrdinalMap[id] = i;
+  });
+  bitsetCache = {};
+}
 
-  const syndromeIds = zhenghouIndex.search_indexes.by_location[location] || [];
-  return syndromeIds.map(id => syndromeMap[id]).filter(s => s);
+/**
+ * 載入證候位元集合並改用其序號表（只載入一次，僅在以證素/症狀篩選時下載）；
+ * 檔案不存在時沿用索引中的證候順序，證素/症狀條件視為無符合證候
+ */
+function loadSyndromeBitsets() {
+  if (!bitsetsPromise) {
+    bitsetsPromise = fetch(SYNDROME_BITSETS_URL)
+      .then(response => {
+        if (!response.ok) throw new Error('無位元集合索引');
+        return response.json();
+      })
+      .catch(() => null)
+      .then(data => {
+        syndromeBitsets = data;
+        if (data) setSyndromeOrdinals(data.syndromes);
+      });
+  }
+  return bitsetsPromise;
 }
 
 /**
- * 按病性篩選
+ * 位元集合的 32 位元字組數
  */
-function filterByNature(nature) {
-  if (!zhenghouIndex?.search_indexes?.by_nature) return [];
+function bitsetWords() {
+  return Math.ceil(syndromeOrdinals.length / 32);
+}
 
-  const byNature = zhenghouIndex.search_indexes.by_nature;
-  let syndromeIds = [];
+/**
+ * base64（小端序）→ 位元集合
+ */
+function decodeBitset(text) {
+  const bytes = Uint8Array.from(atob(text), c => c.charCodeAt(0));
+  const view = new DataView(bytes.buffer);
+  const bits = new Uint32Array(bitsetWords());
+  for (let w = 0; w < bits.length && w * 4 < bytes.length; w++) {
+    bits[w] = view.getUint32(w * 4, true);
+  }
+  return bits;
+}
+
+/**
+ * 證候 ID 清單 → 位元集合（忽略未知 ID）
+ */
+function bitsetFromIds(ids) {
+  const bits = new Uint32Array(bitsetWords());
+  ids.forEach(id => {
+    const i = syndromeOrdinalMap[id];
+    if (i !== undefined) bits[i >>> 5] |= 1 << (i & 31);
+  });
+  return bits;
+}
+
+/**
+ * 全部證候的位元集合
+ */
+function bitsetAll() {
+  const bits = new Uint32Array(bitsetWords()).fill(0xffffffff);
+  const tail = syndromeOrdinals.length & 31;
+  if (tail) bits[bits.length - 1] = (1 << tail) - 1;
+  return bits;
+}
+
+function bitsetAnd(a, b) {
+  return a.map((word, w) => word & b[w]);
+}
+
+function bitsetOr(a, b) {
+  return a.map((word, w) => word | b[w]);
+}
+
+function bitsetAndNot(a, b) {
+  return a.map((word, w) => word & ~b[w]);
+}
+
+/**
+ * 位元集合 → 證候 ID（依序號排序）
+ */
+function bitsetToIds(bits) {
+  const ids = [];
+  bits.forEach((word, w) => {
+    while (word) {
+      const low = word & -word;
+      ids.push(syndromeOrdinals[(w << 5) + 31 - Math.clz32(low)]);
+      word ^= low;
+    }
+  });
+  return ids;
+}
+
+/**
+ * 依病性取得證候 ID 清單（虛證、實證子類或直接分類）
+ */
+function natureSyndromeIds(nature) {
+  const byNature = zhenghouIndex?.search_indexes?.by_nature;
+  if (!byNature) return [];
 
   // 檢查虛證子類
   if (byNature.虛 && byNature.虛[nature]) {
-    syndromeIds = byNature.虛[nature];
+    return byNature.虛[nature];
   }
   // 檢查實證子類
-  else if (byNature.實 && byNature.實[nature]) {
-    syndromeIds = byNature.實[nature];
+  if (byNature.實 && byNature.實[nature]) {
+    return byNature.實[nature];
   }
   // 檢查直接分類（寒、熱、風、燥）
-  else if (byNature[nature]) {
-    syndromeIds = byNature[nature];
+  return Array.isArray(byNature[nature]) ? byNature[nature] : [];
+}
+
+/**
+ * 取得單一條件的位元集合
+ * kind: location / nature / severity（來自證候索引）、zhengsu / symptoms（來自位元集合索引）
+ */
+function getBitset(kind, key) {
+  const cacheKey = `${kind}:${key}`;
+  if (bitsetCache[cacheKey]) return bitsetCache[cacheKey];
+
+  let bits;
+  if (kind === 'zhengsu' || kind === 'symptoms') {
+    const text = syndromeBitsets?.[kind]?.[key];
+    bits = text ? decodeBitset(text) : new Uint32Array(bitsetWords());
+  } else if (kind === 'nature') {
+    bits = bitsetFromIds(natureSyndromeIds(key));
+  } else {
+    const index = zhenghouIndex?.search_indexes?.[`by_${kind}`];
+    bits = bitsetFromIds(index?.[key] || []);
   }
 
-  return syndromeIds.map(id => syndromeMap[id]).filter(s => s);
+  bitsetCache[cacheKey] = bits;
+  return bits;
+}
+
+/**
+ * 多條件篩選證候
+ * conditions: { all: [[種類, 鍵], ...], any: [...], none: [...] }
+ * 同時符合 all 的全部、至少符合 any 之一、不符合 none 的任何一個
+ */
+async function filterSyndromes(conditions) {
+  const { all = [], any = [], none = [] } = conditions;
+  if ([...all, ...any, ...none].some(([kind]) => SHIPPED_BITSET_KINDS.includes(kind))) {
+    await loadSyndromeBitsets();
+  }
+  if (syndromeOrdinals.length === 0) {
+    setSyndromeOrdinals(Object.keys(syndromeMap));
+  }
+
+  let bits = bitsetAll();
+
+  all.forEach(([kind, key]) => {
+    bits = bitsetAnd(bits, getBitset(kind, key));
+  });
+  if (any.length > 0) {
+    let union = new Uint32Array(bitsetWords());
+    any.forEach(([kind, key]) => {
+      union = bitsetOr(union, getBitset(kind, key));
+    });
+    bits = bitsetAnd(bits, union);
+  }
+  none.forEach(([kind, key]) => {
+    bits = bitsetAndNot(bits, getBitset(kind, key));
+  });
+
+  return bitsetToIds(bits).map(id => syndromeMap[id]).filter(s => s);
+}
+
+/**
+ * 按病位篩選
+ */
+async function filterByLocation(location) {
+  if (!zhenghouIndex?.search_indexes?.by_location) return [];
+  return filterSyndromes({ all: [['location', location]] });
+}
+
+/**
+ * 按病性篩選
+ */
+async function filterByNature(nature) {
+  if (!zhenghouIndex?.search_indexes?.by_nature) return [];
+  return filterSyndromes({ all: [['nature', nature]] });
 }
 
 /**
  * 按輕重篩選
  */
-function filterBySeverity(severity) {
+async function filterBySeverity(severity) {
   if (!zhenghouIndex?.search_indexes?.by_severity) return [];
-
-  const syndromeIds = zhenghouIndex.search_indexes.by_severity[severity] || [];
-  return syndromeIds.map(id => syndromeMap[id]).filter(s => s);
+  return filterSyndromes({ all: [['severity', severity]] });
 }
 
 /**
@@ -632,7 +927,7 @@ function setupEventListeners() {
 
   // 篩選藥丸點擊
   document.querySelectorAll('.filter-pill').forEach(pill => {
-    pill.addEventListener('click', () => {
+    pill.addEventListener('click', async () => {
       // 切換 active 狀態
       const wasActive = pill.classList.contains('active');
       document.querySelectorAll('.filter-pill').forEach(p => p.classList.remove('active'));
@@ -651,15 +946,15 @@ function setupEventListeners() {
       if (pill.dataset.location) {
         filterType = 'location';
         filterValue = pill.dataset.location;
-        results = filterByLocation(filterValue);
+        results = await filterByLocation(filterValue);
       } else if (pill.dataset.nature) {
         filterType = 'nature';
         filterValue = pill.dataset.nature;
-        results = filterByNature(filterValue);
+        results = await filterByNature(filterValue);
       } else if (pill.dataset.severity) {
         filterType = 'severity';
         filterValue = pill.dataset.severity;
-        results = filterBySeverity(filterValue);
+        results = await filterBySeverity(filterValue);
       }
 
       showFilterResults(results, filterType, filterValue);
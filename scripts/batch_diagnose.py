@@ -0,0 +1,217 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+串流批次辨證
+由標準輸入或 JSONL 檔逐行讀取醫案（格式同 data/cases/_schema.json），
+每累積一批即以 case_matcher 的向量比對計分，並依輸入順序將結果以 JSONL 寫至標準輸出；
+同時只保留有限批次於記憶體中，可處理遠大於記憶體的醫案封存檔。
+--workers 大於 1 時將批次分派至行程池（以 fork 共用已建立的向量庫）
+"""
+
+import json
+import multiprocessing
+import sys
+import time
+from collections import deque
+from contextlib import redirect_stdout
+from pathlib import Path
+from typing import List, Iterable, Iterator, Optional, TextIO, Tuple
+
+from corpus import load_corpus, add_jobs_arguments, add_cache_arguments, snapshot_cache_for
+from build_scheduler import fork_available
+from case_matcher import CaseMatcher, DEFAULT_TOP, KIND_ZHENGXING, KIND_SYNDROME
+
+
+DEFAULT_BATCH_SIZE = 512
+
+# 每個工作行程最多同時排隊的批次數（限制記憶體中的批次總量）
+BATCHES_PER_WORKER = 2
+
+# (JSONL 輸出行, 錯誤訊息, 命中記錄證型的名次清單)
+BatchResult = Tuple[List[str], List[str], List[Optional[int]]]
+
+# 行程池以 fork 建立，子行程直接繼承已建立的向量庫，不需序列化
+_MATCHER: Optional[CaseMatcher] = None
+_TOP = DEFAULT_TOP
+_KINDS: Optional[List[str]] = None
+
+
+def iter_line_batches(stream: TextIO, size: int) -> Iterator[List[Tuple[int, str]]]:
+    """逐行讀取，每 size 個非空行為一批（保留行號以便回報錯誤）"""
+    batch: List[Tuple[int, str]] = []
+    for line_no, line in enumerate(stream, 1):
+        if not line.strip():
+            continue
+        batch.append((line_no, line))
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def score_batch(batch: List[Tuple[int, str]]) -> BatchResult:
+    """解析並比對一批醫案；無法解析的行以錯誤訊息回傳而不中止整批"""
+    cases = []
+    errors = []
+    for line_no, line in batch:
+        try:
+            case = json.loads(line)
+        except json.JSONDecodeError as e:
+            errors.append(f"第 {line_no} 行無法解析: {e}")
+            continue
+        if not isinstance(case, dict):
+            errors.append(f"第 {line_no} 行不是醫案物件")
+            continue
+        case.setdefault("id", f"#{line_no}")
+        cases.append(case)
+
+    results = _MATCHER.score_cases(cases, _TOP, _KINDS) if cases else []
+    lines = [json.dumps(result.to_json(), ensure_ascii=False) for result in results]
+    ranks = [result.expected_rank for result in results if result.expected]
+    return lines, errors, ranks
+
+
+def run_batches(batches: Iterable[List[Tuple[int, str]]], workers: int = 1) -> Iterator[BatchResult]:
+    """
+    依輸入順序產生各批結果
+    workers > 1 且平台支援 fork 時以行程池並行，排隊中的批次不超過 workers × BATCHES_PER_WORKER
+    """
+    if workers <= 1 or not fork_available():
+        for batch in batches:
+            yield score_batch(batch)
+        return
+
+    from concurrent.futures import ProcessPoolExecutor
+
+    context = multiprocessing.get_context("fork")
+    limit = workers * BATCHES_PER_WORKER
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context) as executor:
+        pending = deque()
+        for batch in batches:
+            pending.append(executor.submit(score_batch, batch))
+            if len(pending) >= limit:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+def main():
+    """主函數"""
+    import argparse
+
+    global _MATCHER, _TOP, _KINDS
+
+    parser = argparse.ArgumentParser(description="串流批次比對 JSONL 醫案，結果以 JSONL 寫至標準輸出")
+    parser.add_argument(
+        "input",
+        nargs="?",
+        default="-",
+        help="醫案 JSONL 檔（每行一個醫案；省略或 - 表示標準輸入）"
+    )
+    parser.add_argument(
+        "--data-dir",
+        default="data",
+        help="資料目錄路徑 (預設: data)"
+    )
+    parser.add_argument(
+        "-k", "--top",
+        type=int,
+        default=DEFAULT_TOP,
+        help=f"每個醫案回傳筆數 (預設: {DEFAULT_TOP})"
+    )
+    parser.add_argument(
+        "--kind",
+        choices=[KIND_ZHENGXING, KIND_SYNDROME],
+        help="只比對證型或證候"
+    )
+    parser.add_argument(
+        "--zhengsu",
+        action="store_true",
+        help="將醫案的證素分析納入向量"
+    )
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=DEFAULT_BATCH_SIZE,
+        help=f"每批醫案數 (預設: {DEFAULT_BATCH_SIZE})"
+    )
+    parser.add_argument(
+        "--workers", "-w",
+        type=int,
+        default=1,
+        help="比對批次的工作行程數 (預設: 1)"
+    )
+    add_jobs_arguments(parser)
+    add_cache_arguments(parser)
+
+    args = parser.parse_args()
+
+    # 確定資料目錄
+    script_dir = Path(__file__).parent
+    data_dir = script_dir.parent / args.data_dir
+
+    # 標準輸出只寫結果，其餘訊息一律寫至標準錯誤
+    log = sys.stderr
+
+    if not data_dir.exists():
+        print(f"錯誤: 資料目錄不存在: {data_dir}", file=log)
+        return 1
+
+    if args.batch_size < 1:
+        print("錯誤: --batch-size 須大於 0", file=log)
+        return 1
+
+    with redirect_stdout(log):
+        cache = snapshot_cache_for(data_dir, args.no_cache, args.rebuild_cache)
+        corpus = load_corpus(data_dir, ["zhengxing", "syndromes", "symptoms"], args.jobs, args.pool, cache)
+
+    _MATCHER = CaseMatcher.from_corpus(corpus, use_zhengsu=args.zhengsu)
+    _TOP = args.top
+    _KINDS = [args.kind] if args.kind else None
+    del corpus
+
+    if args.input == "-":
+        stream = sys.stdin
+    else:
+        input_path = script_dir.parent / args.input
+        if not input_path.exists():
+            print(f"錯誤: 找不到醫案檔: {input_path}", file=log)
+            return 1
+        stream = open(input_path, 'r', encoding='utf-8')
+
+    total = 0
+    failed = 0
+    labelled = 0
+    top1 = 0
+    start = time.perf_counter()
+    try:
+        for lines, errors, ranks in run_batches(iter_line_batches(stream, args.batch_size), args.workers):
+            if lines:
+                sys.stdout.write("\n".join(lines) + "\n")
+            for error in errors:
+                print(f"⚠️  警告: {error}", file=log)
+            total += len(lines)
+            failed += len(errors)
+            labelled += len(ranks)
+            top1 += sum(1 for rank in ranks if rank == 1)
+    except BrokenPipeError:
+        # 下游（如 head）提前關閉時安靜結束
+        return 0
+    finally:
+        if stream is not sys.stdin:
+            stream.close()
+    elapsed = time.perf_counter() - start
+
+    rate = total / elapsed if elapsed else 0.0
+    print(f"✅ 已比對 {total} 個醫案，{elapsed:.2f} 秒（{rate:.0f} 個/秒，{args.workers} 個工作行程）", file=log)
+    if failed:
+        print(f"   略過無法解析的行: {failed}", file=log)
+    if labelled:
+        print(f"   記錄證型為第 1 名: {top1}/{labelled}", file=log)
+
+    return 0
+
+
+if __name__ == "__main__":
+    exit(main())
@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+語料平行讀取效能測試
+以現有證候檔案為模板，產生大量合成證候檔案，比較序列與平行讀取的耗時
+"""
+
+import json
+import shutil
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List
+
+from corpus import entity_files, read_json_files, default_jobs
+
+
+def build_synthetic_corpus(template_dir: Path, output_dir: Path, count: int) -> List[Path]:
+    """以模板證候循環產生合成證候檔案"""
+    templates = []
+    for _, data, error in read_json_files(entity_files(template_dir)):
+        if not error and isinstance(data, dict) and "id" in data:
+            templates.append(data)
+
+    if not templates:
+        raise RuntimeError(f"找不到可用的模板證候: {template_dir}")
+
+    output_dir.mkdir(parents=True, exist_ok=True)
+    for i in range(count):
+        data = dict(templates[i % len(templates)])
+        data["id"] = f"{data['id']}_{i:06d}"
+        data["number"] = i + 1
+        with open(output_dir / f"{data['id']}.json", 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+
+    return entity_files(output_dir)
+
+
+def time_read(paths: List[Path], jobs: int, pool: str) -> Dict:
+    """計時一次完整讀取"""
+    start = time.perf_counter()
+    results = read_json_files(paths, jobs, pool)
+    elapsed = time.perf_counter() - start
+    return {
+        "elapsed": elapsed,
+        "ids": [data["id"] for _, data, error in results if not error]
+    }
+
+
+def main():
+    """主函數"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="比較序列與平行讀取證候檔案的耗時")
+    parser.add_argument(
+        "--data-dir",
+        default="data",
+        help="資料目錄路徑 (預設: data)"
+    )
+    parser.add_argument(
+        "--files",
+        type=int,
+        default=50000,
+        help="合成證候檔案數 (預設: 50000)"
+    )
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        nargs="+",
+        default=[2, 4, default_jobs()],
+        help="要測試的平行數"
+    )
+    parser.add_argument(
+        "--work-dir",
+        help="合成檔案存放目錄 (預設: 暫存目錄，結束後刪除)"
+    )
+
+    args = parser.parse_args()
+
+    script_dir = Path(__file__).parent
+    template_dir = script_dir.parent / args.data_dir / "zhenghou" / "syndromes"
+
+    work_dir = Path(args.work_dir) if args.work_dir else Path(tempfile.mkdtemp(prefix="tcm_bench_"))
+    try:
+        print(f"正在產生 {args.files} 個合成證候檔案: {work_dir}")
+        paths = build_synthetic_corpus(template_dir, work_dir / "syndromes", args.files)
+        total_mb = sum(p.stat().st_size for p in paths) / 1024 / 1024
+        print(f"共 {len(paths)} 個檔案，{total_mb:.1f} MB")
+
+        # 先讀一次暖機，讓各組測試都在檔案系統快取已熱的狀態下比較
+        read_json_files(paths)
+
+        baseline = time_read(paths, 1, "thread")
+        print(f"\n{'模式':<16}{'耗時 (秒)':>12}{'加速比':>10}")
+        print("-" * 38)
+        print(f"{'serial':<16}{baseline['elapsed']:>12.3f}{1.0:>10.2f}")
+
+        for pool in ["thread", "process"]:
+            for jobs in sorted(set(args.jobs)):
+                if jobs <= 1:
+                    continue
+                result = time_read(paths, jobs, pool)
+                if result["ids"] != baseline["ids"]:
+                    print(f"❌ {pool} x{jobs} 的讀取順序與序列讀取不一致")
+                    return 1
+                speedup = baseline["elapsed"] / result["elapsed"]
+                label = f"{pool} x{jobs}"
+                print(f"{label:<16}{result['elapsed']:>12.3f}{speedup:>10.2f}")
+
+        print("\n✅ 所有平行模式的讀取結果與順序皆與序列讀取一致")
+    finally:
+        if not args.work_dir:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    return 0
+
+
+if __name__ == "__main__":
+    exit(main())
@@ -2,41 +2,40 @@
 # -*- coding: utf-8 -*-
 """
 類證鑑別矩陣建構腳本
-讀取證型的 differentiation 資料建立鑑別矩陣
+讀取證型的 differentiation 資料建立鑑別矩陣；
+並將證候 differential_syndromes 所列的名稱解析為 ID，以及找出症狀與證素高度重疊的候選鑑別配對
 輸出: data/indexes/differentiation_matrix.json
 """
 
 import json
+import math
+import re
 from pathlib import Path
 from typing import Dict, List, Set, Any, Optional, Tuple
 from datetime import datetime
 from collections import defaultdict
 
+from corpus import Corpus, ensure_corpus, load_corpus, add_cache_arguments, snapshot_cache_for
+from extract_symptoms import parse_clinical_manifestations
 
-def load_zhengxing_data(data_dir: Path) -> Dict[str, Dict]:
-    """載入所有證型資料"""
-    zhengxing_data: Dict[str, Dict] = {}
 
-    zhengxing_dir = data_dir / "zhengxing"
-    if not zhengxing_dir.exists():
-        print(f"警告: 證型目錄不存在: {zhengxing_dir}")
-        return zhengxing_data
+# 實體類型
+KIND_ZHENGXING = "zhengxing"
+KIND_SYNDROME = "syndrome"
 
-    for f in zhengxing_dir.glob("*.json"):
-        if f.name.startswith("_"):
-            continue
+# 證型主症的欄位名稱（部分證型檔案使用 primary）
+SYMPTOM_FIELDS = ["main", "primary", "secondary"]
 
-        try:
-            with open(f, 'r', encoding='utf-8') as fp:
-                data = json.load(fp)
-        except (json.JSONDecodeError, Exception) as e:
-            print(f"警告: 無法讀取 {f}: {e}")
-            continue
+# 候選鑑別配對的最低重疊度（症狀與證素合併集合的 Jaccard 係數）
+DEFAULT_MIN_OVERLAP = 0.3
 
-        if "id" in data:
-            zhengxing_data[data["id"]] = data
+# differential_syndromes 中以引號標示的證名（如「“痰濕壅肺證”以及“風水”」）
+QUOTED_NAME_PATTERN = re.compile(r'[“"「]([^”"」]+)[”"」]')
+NAME_STRIP_CHARS = " \t\r\n“”\"「」。，、"
 
-    return zhengxing_data
+# 特徵鍵前綴
+FEATURE_SYMPTOM = "s:"
+FEATURE_ZHENGSU = "z:"
 
 
 def extract_comparison_table(zx_data: Dict, compare_data: Dict) -> List[Dict]:
@@ -231,10 +230,202 @@ def build_suggested_comparisons(zhengxing_data: Dict[str, Dict]) -> Dict[str, Li
     return suggestions
 
 
-def build_differentiation_matrix(data_dir: Path) -> Dict:
+def normalize_name(name: str) -> str:
+    """正規化證名（去除引號、空白與標點）"""
+    return name.strip(NAME_STRIP_CHARS)
+
+
+def split_differential_names(text: str) -> List[str]:
+    """拆出 differential_syndromes 單一條目中的證名（有引號時取引號內的各名稱）"""
+    names = QUOTED_NAME_PATTERN.findall(text)
+    if not names:
+        names = [text]
+    return [name for name in (normalize_name(n) for n in names) if name]
+
+
+def build_name_index(corpus: Corpus) -> Dict[str, List[Tuple[str, str]]]:
+    """
+    證名雜湊索引：正規化名稱 → [(類型, ID)]
+    證候名稱優先於證型名稱與別名；同名的證候（編號重複）全部保留
+    """
+    index: Dict[str, List[Tuple[str, str]]] = defaultdict(list)
+    for zh_id, data in corpus.syndromes.items():
+        name = normalize_name(data.get("name", ""))
+        if name:
+            index[name].append((KIND_SYNDROME, zh_id))
+    for zx_id, data in corpus.zhengxing.items():
+        for name in [data.get("name", "")] + data.get("alias", []):
+            name = normalize_name(name) if isinstance(name, str) else ""
+            if name and (KIND_ZHENGXING, zx_id) not in index[name]:
+                index[name].append((KIND_ZHENGXING, zx_id))
+    return dict(index)
+
+
+def resolve_name(name_index: Dict[str, List[Tuple[str, str]]], name: str) -> List[Tuple[str, str]]:
+    """證名 → [(類型, ID)]；有證候時只回傳證候"""
+    entries = name_index.get(normalize_name(name), [])
+    syndromes = [entry for entry in entries if entry[0] == KIND_SYNDROME]
+    return syndromes or entries
+
+
+def entity_features(data: Dict, kind: str) -> Tuple[Set[str], Set[str]]:
+    """證型/證候的（症狀集合, 證素集合）"""
+    symptoms: Set[str] = set()
+    if kind == KIND_ZHENGXING:
+        symptom_data = data.get("symptoms", {})
+        for field_name in SYMPTOM_FIELDS:
+            for symptom in symptom_data.get(field_name, []):
+                if isinstance(symptom, str) and symptom.strip():
+                    symptoms.add(symptom.strip())
+        for field_name in ["tongue", "pulse"]:
+            value = symptom_data.get(field_name)
+            if isinstance(value, str):
+                symptoms.update(parse_clinical_manifestations(value))
+    else:
+        symptoms.update(parse_clinical_manifestations(data.get("clinical_manifestations", "")))
+
+    composition = data.get("zhengsu_composition") or {}
+    zhengsu = {zs for role in ["location", "nature"] for zs in composition.get(role, [])}
+    return symptoms, zhengsu
+
+
+def overlap_record(a: Tuple[str, str], b: Tuple[str, str],
+                   features: Dict[Tuple[str, str], Tuple[Set[str], Set[str]]]) -> Dict:
+    """兩個證型/證候的共有與各自特有的症狀、證素，以及合併集合的 Jaccard 係數"""
+    symptoms_a, zhengsu_a = features[a]
+    symptoms_b, zhengsu_b = features[b]
+    union = len(symptoms_a | symptoms_b) + len(zhengsu_a | zhengsu_b)
+    shared = len(symptoms_a & symptoms_b) + len(zhengsu_a & zhengsu_b)
+    return {
+        "jaccard": round(shared / union, 4) if union else 0.0,
+        "overlap": {
+            "symptoms": sorted(symptoms_a & symptoms_b),
+            "zhengsu": sorted(zhengsu_a & zhengsu_b)
+        },
+        "differences": {
+            a[1]: {"symptoms": sorted(symptoms_a - symptoms_b), "zhengsu": sorted(zhengsu_a - zhengsu_b)},
+            b[1]: {"symptoms": sorted(symptoms_b - symptoms_a), "zhengsu": sorted(zhengsu_b - zhengsu_a)}
+        }
+    }
+
+
+def resolve_differential_pairs(corpus: Corpus, name_index: Dict[str, List[Tuple[str, str]]],
+                               features: Dict[Tuple[str, str], Tuple[Set[str], Set[str]]]) -> Tuple[List[Dict], Dict[str, List[str]]]:
+    """
+    將證候 differential_syndromes 所列的證名解析為配對
+    回傳 (配對清單, 無法解析的證名：證候 ID → 名稱)；雙方互列時只保留一筆並記錄兩方皆有列出
+    """
+    pairs: Dict[Tuple[Tuple[str, str], Tuple[str, str]], Dict] = {}
+    unresolved: Dict[str, List[str]] = {}
+
+    for zh_id, data in corpus.syndromes.items():
+        source = (KIND_SYNDROME, zh_id)
+        for text in data.get("differential_syndromes") or []:
+            if not isinstance(text, str):
+                continue
+            for name in split_differential_names(text):
+                targets = [t for t in resolve_name(name_index, name) if t != source]
+                if not targets:
+                    unresolved.setdefault(zh_id, []).append(name)
+                    continue
+                for target in targets:
+                    key = tuple(sorted([source, target]))
+                    pair = pairs.get(key)
+                    if pair is None:
+                        entities = [corpus.syndromes if kind == KIND_SYNDROME else corpus.zhengxing for kind, _ in key]
+                        pair = pairs[key] = {
+                            "syndromes": [entity_id for _, entity_id in key],
+                            "kinds": [kind for kind, _ in key],
+                            "syndrome_names": [entities[i][entity_id].get("name", entity_id) for i, (_, entity_id) in enumerate(key)],
+                            "listed_by": [],
+                            **overlap_record(key[0], key[1], features)
+                        }
+                    if zh_id not in pair["listed_by"]:
+                        pair["listed_by"].append(zh_id)
+
+    return list(pairs.values()), unresolved
+
+
+def similar_set_pairs(sets: List[Set[str]], threshold: float) -> List[Tuple[int, int, float]]:
+    """
+    找出 Jaccard 係數 ≥ threshold 的集合配對 (i, j, 係數)，i < j
+    以前綴過濾分塊（AllPairs）：特徵依全域頻率由少至多排序，每個集合只以前綴建立與查詢倒排串列，
+    再以長度過濾排除不可能達到門檻者；候選以整數位元集合的 AND 與 popcount 驗證
+    """
+    if not 0 < threshold <= 1:
+        raise ValueError(f"門檻須介於 0 與 1 之間: {threshold}")
+
+    frequency: Dict[str, int] = defaultdict(int)
+    for features in sets:
+        for feature in features:
+            frequency[feature] += 1
+    rank = {feature: r for r, feature in enumerate(sorted(frequency, key=lambda f: (frequency[f], f)))}
+
+    ordered = [sorted((rank[f] for f in features)) for features in sets]
+    masks = [sum(1 << r for r in row) for row in ordered]
+    # 依集合大小由小至大處理，已建立索引者必不大於目前集合
+    order = sorted(range(len(sets)), key=lambda i: (len(ordered[i]), i))
+
+    postings: Dict[int, List[int]] = defaultdict(list)
+    results: List[Tuple[int, int, float]] = []
+    for i in order:
+        size = len(ordered[i])
+        if not size:
+            continue
+        prefix = ordered[i][:size - math.ceil(threshold * size - 1e-9) + 1]
+        min_size = threshold * size
+
+        candidates: Set[int] = set()
+        for r in prefix:
+            candidates.update(j for j in postings[r] if len(ordered[j]) >= min_size)
+
+        for j in candidates:
+            shared = (masks[i] & masks[j]).bit_count()
+            score = shared / (size + len(ordered[j]) - shared)
+            if score >= threshold:
+                results.append((min(i, j), max(i, j), score))
+
+        for r in prefix:
+            postings[r].append(i)
+
+    results.sort(key=lambda item: (-item[2], item[0], item[1]))
+    return results
+
+
+def find_candidate_pairs(corpus: Corpus, features: Dict[Tuple[str, str], Tuple[Set[str], Set[str]]],
+                         declared: Set[Tuple[Tuple[str, str], Tuple[str, str]]],
+                         min_overlap: float = DEFAULT_MIN_OVERLAP) -> List[Dict]:
+    """
+    由症狀與證素的重疊度找出候選鑑別配對（證候之間）
+    須同時共有症狀與證素；已由 differential_syndromes 列出的配對不重複輸出
+    """
+    keys = [(KIND_SYNDROME, zh_id) for zh_id in corpus.syndromes]
+    sets = [
+        {FEATURE_SYMPTOM + s for s in features[key][0]} | {FEATURE_ZHENGSU + z for z in features[key][1]}
+        for key in keys
+    ]
+
+    pairs = []
+    for i, j, _ in similar_set_pairs(sets, min_overlap):
+        a, b = keys[i], keys[j]
+        if not (features[a][0] & features[b][0]) or not (features[a][1] & features[b][1]):
+            continue
+        if tuple(sorted([a, b])) in declared:
+            continue
+        pairs.append({
+            "syndromes": [a[1], b[1]],
+            "syndrome_names": [corpus.syndromes[a[1]].get("name", a[1]), corpus.syndromes[b[1]].get("name", b[1])],
+            **overlap_record(a, b, features)
+        })
+    return pairs
+
+
+def build_differentiation_matrix(data_dir: Path, corpus: Optional[Corpus] = None,
+                                 min_overlap: float = DEFAULT_MIN_OVERLAP) -> Dict:
     """建立完整的鑑別矩陣"""
     print("正在載入證型資料...")
-    zhengxing_data = load_zhengxing_data(data_dir)
+    corpus = ensure_corpus(data_dir, corpus, ["zhengxing", "syndromes"])
+    zhengxing_data = corpus.zhengxing
 
     print(f"載入了 {len(zhengxing_data)} 個證型")
 
@@ -263,6 +454,26 @@ def build_differentiation_matrix(data_dir: Path) -> Dict:
     print("正在建立建議對比...")
     suggested = build_suggested_comparisons(zhengxing_data)
 
+    features = {(KIND_ZHENGXING, zx_id): entity_features(data, KIND_ZHENGXING) for zx_id, data in zhengxing_data.items()}
+    features.update({(KIND_SYNDROME, zh_id): entity_features(data, KIND_SYNDROME) for zh_id, data in corpus.syndromes.items()})
+
+    print("正在解析證候的類證名稱...")
+    name_index = build_name_index(corpus)
+    syndrome_pairs, unresolved = resolve_differential_pairs(corpus, name_index, features)
+    declared = {
+        tuple(sorted(zip(pair["kinds"], pair["syndromes"])))
+        for pair in syndrome_pairs
+    }
+
+    print("正在找出症狀與證素重疊的候選配對...")
+    candidate_pairs = find_candidate_pairs(corpus, features, declared, min_overlap)
+
+    covered: Set[str] = set()
+    for pair in syndrome_pairs:
+        covered.update(entity_id for kind, entity_id in zip(pair["kinds"], pair["syndromes"]) if kind == KIND_SYNDROME)
+    for pair in candidate_pairs:
+        covered.update(pair["syndromes"])
+
     # 構建最終矩陣
     matrix = {
         "version": "1.0",
@@ -271,10 +482,18 @@ def build_differentiation_matrix(data_dir: Path) -> Dict:
         "pairs": pairs,
         "groups": groups,
         "suggested_comparisons": suggested,
+        "syndrome_pairs": syndrome_pairs,
+        "candidate_pairs": candidate_pairs,
+        "unresolved_differentials": unresolved,
         "statistics": {
             "total_pairs": len(pairs),
             "total_groups": len(groups),
-            "syndromes_with_suggestions": len(suggested)
+            "syndromes_with_suggestions": len(suggested),
+            "total_syndrome_pairs": len(syndrome_pairs),
+            "total_candidate_pairs": len(candidate_pairs),
+            "unresolved_differential_names": sum(len(names) for names in unresolved.values()),
+            "syndromes_covered": len(covered),
+            "min_overlap": min_overlap
         }
     }
 
@@ -296,6 +515,13 @@ def main():
         default="data/indexes/differentiation_matrix.json",
         help="輸出檔案路徑"
     )
+    parser.add_argument(
+        "--min-overlap",
+        type=float,
+        default=DEFAULT_MIN_OVERLAP,
+        help=f"候選鑑別配對的最低重疊度（Jaccard）(預設: {DEFAULT_MIN_OVERLAP})"
+    )
+    add_cache_arguments(parser)
 
     args = parser.parse_args()
 
@@ -312,7 +538,9 @@ def main():
     output_path.parent.mkdir(parents=True, exist_ok=True)
 
     # 建立鑑別矩陣
-    matrix = build_differentiation_matrix(data_dir)
+    cache = snapshot_cache_for(data_dir, args.no_cache, args.rebuild_cache)
+    corpus = load_corpus(data_dir, ["zhengxing", "syndromes"], cache=cache)
+    matrix = build_differentiation_matrix(data_dir, corpus, args.min_overlap)
 
     # 寫入檔案
     with open(output_path, 'w', encoding='utf-8') as f:
@@ -322,6 +550,10 @@ def main():
     print(f"   配對比較數: {matrix['statistics']['total_pairs']}")
     print(f"   證素群組數: {matrix['statistics']['total_groups']}")
     print(f"   有建議對比的證型: {matrix['statistics']['syndromes_with_suggestions']}")
+    print(f"   證候類證配對: {matrix['statistics']['total_syndrome_pairs']}"
+          f"（無法解析的證名 {matrix['statistics']['unresolved_differential_names']}）")
+    print(f"   候選鑑別配對: {matrix['statistics']['total_candidate_pairs']}")
+    print(f"   涵蓋證候: {matrix['statistics']['syndromes_covered']}")
 
     return 0
 
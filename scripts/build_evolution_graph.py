@@ -12,6 +12,8 @@ from typing import Dict, List, Set, Any, Optional, Tuple
 from datetime import datetime
 from collections import defaultdict
 
+from corpus import Corpus, ensure_corpus, load_corpus, add_cache_arguments, snapshot_cache_for
+
 
 # 證型類別定義
 ZHENGXING_CATEGORIES = {
@@ -86,32 +88,6 @@ def is_critical(data: Dict) -> bool:
     return False
 
 
-def load_zhengxing_data(data_dir: Path) -> Dict[str, Dict]:
-    """載入所有證型資料"""
-    zhengxing_data: Dict[str, Dict] = {}
-
-    zhengxing_dir = data_dir / "zhengxing"
-    if not zhengxing_dir.exists():
-        print(f"警告: 證型目錄不存在: {zhengxing_dir}")
-        return zhengxing_data
-
-    for f in zhengxing_dir.glob("*.json"):
-        if f.name.startswith("_"):
-            continue
-
-        try:
-            with open(f, 'r', encoding='utf-8') as fp:
-                data = json.load(fp)
-        except (json.JSONDecodeError, Exception) as e:
-            print(f"警告: 無法讀取 {f}: {e}")
-            continue
-
-        if "id" in data:
-            zhengxing_data[data["id"]] = data
-
-    return zhengxing_data
-
-
 def build_nodes(zhengxing_data: Dict[str, Dict]) -> List[Dict]:
     """建立節點列表"""
     nodes = []
@@ -306,10 +282,10 @@ def find_branch_points(edges: List[Dict], zhengxing_data: Dict[str, Dict]) -> Li
     return branches
 
 
-def build_evolution_graph(data_dir: Path) -> Dict:
+def build_evolution_graph(data_dir: Path, corpus: Optional[Corpus] = None) -> Dict:
     """建立完整的演變圖"""
     print("正在載入證型資料...")
-    zhengxing_data = load_zhengxing_data(data_dir)
+    zhengxing_data = ensure_corpus(data_dir, corpus, ["zhengxing"]).zhengxing
 
     print(f"載入了 {len(zhengxing_data)} 個證型")
 
@@ -360,6 +336,7 @@ def main():
         default="data/indexes/evolution_graph.json",
         help="輸出檔案路徑"
     )
+    add_cache_arguments(parser)
 
     args = parser.parse_args()
 
@@ -376,7 +353,9 @@ def main():
     output_path.parent.mkdir(parents=True, exist_ok=True)
 
     # 建立演變圖
-    graph = build_evolution_graph(data_dir)
+    cache = snapshot_cache_for(data_dir, args.no_cache, args.rebuild_cache)
+    corpus = load_corpus(data_dir, ["zhengxing"], cache=cache)
+    graph = build_evolution_graph(data_dir, corpus)
 
     # 寫入檔案
     with open(output_path, 'w', encoding='utf-8') as f:
@@ -2,7 +2,8 @@
 # -*- coding: utf-8 -*-
 """
 主控腳本：生成所有索引
-依序呼叫各索引建構腳本，並輸出生成報告
+以相依排程呼叫各索引建構腳本（--jobs 大於 1 時彼此獨立的索引並行建構），並輸出生成報告
+依建構清單 (_build_manifest.json) 比對輸入內容雜湊，略過輸入未變更的索引
 """
 
 import sys
@@ -10,24 +11,194 @@ import json
 import time
 from pathlib import Path
 from datetime import datetime
-from typing import Dict, List, Any
+from typing import Dict, List, Any, Callable, Tuple
+from dataclasses import dataclass, field
 
 # 添加腳本目錄到路徑
 script_dir = Path(__file__).parent
 sys.path.insert(0, str(script_dir))
 
-from validate_data import DataValidator
-from extract_symptoms import build_symptom_index
+from corpus import (
+    Corpus, ENTITY_DIRS, load_corpus, ensure_corpus, update_entity_files,
+    add_jobs_arguments, add_cache_arguments, snapshot_cache_for
+)
+from build_manifest import BuildManifest
+from build_scheduler import Task, TaskResult, run_tasks
+from file_watcher import DirectoryWatcher
+from validate_data import DataValidator, VALIDATION_ENTITIES
+from extract_symptoms import build_symptom_index_with_matcher
+from symptom_matcher import MATCHER_NAME
 from build_evolution_graph import build_evolution_graph
 from build_diff_matrix import build_differentiation_matrix
 from build_zhengsu_mapping import build_zhengsu_mapping
-
-
-def write_json(data: Dict, output_path: Path):
-    """寫入 JSON 檔案"""
+from syndrome_pack import build_syndrome_pack, PACK_NAME, TABLE_NAME
+from syndrome_bitsets import build_syndrome_bitsets
+from symptom_cooccurrence import build_symptom_cooccurrence, COOCCURRENCE_NAME
+from syndrome_neighbors import build_syndrome_neighbors, NEIGHBORS_NAME
+from formula_affinity import build_formula_affinity, AFFINITY_NAME
+
+
+@dataclass
+class IndexTarget:
+    """
+    索引建構目標：宣告輸出檔、依賴的實體目錄與腳本
+    modules 只需列出建構腳本本身，其匯入的 scripts/ 模組由建構清單自動納入
+    """
+    name: str
+    result_key: str
+    title: str
+    output: str
+    entities: List[str]
+    modules: List[str]
+    build: Callable[[Path, Corpus], Dict]
+    summarize: Callable[[Dict], Dict]
+    depends_on: List[str] = field(default_factory=list)
+    # 建構時一併寫出的其他檔案（缺少時同樣需要重建）
+    artifacts: List[str] = field(default_factory=list)
+    # 供瀏覽器下載的索引不加縮排
+    compact: bool = False
+
+
+# 所有目標都依賴語料載入模組
+COMMON_MODULES = ["corpus.py"]
+
+INDEX_TARGETS: List[IndexTarget] = [
+    IndexTarget(
+        name="symptoms",
+        result_key="symptom_index",
+        title="症狀反查索引",
+        output="symptom_index.json",
+        entities=["zhengxing", "syndromes", "symptoms"],
+        modules=["extract_symptoms.py"],
+        build=build_symptom_index_with_matcher,
+        summarize=lambda index: {
+            "total_symptoms": index["statistics"]["total_symptoms"],
+            "matcher_phrases": index["statistics"]["matcher"]["total_phrases"]
+        },
+        artifacts=[MATCHER_NAME]
+    ),
+    IndexTarget(
+        name="evolution",
+        result_key="evolution_graph",
+        title="證型演變圖",
+        output="evolution_graph.json",
+        entities=["zhengxing"],
+        modules=["build_evolution_graph.py"],
+        build=build_evolution_graph,
+        summarize=lambda graph: {
+            "nodes": graph["statistics"]["total_nodes"],
+            "edges": graph["statistics"]["total_edges"]
+        }
+    ),
+    IndexTarget(
+        name="diff",
+        result_key="differentiation_matrix",
+        title="類證鑑別矩陣",
+        output="differentiation_matrix.json",
+        entities=["zhengxing", "syndromes"],
+        modules=["build_diff_matrix.py"],
+        build=build_differentiation_matrix,
+        summarize=lambda matrix: {
+            "pairs": matrix["statistics"]["total_pairs"],
+            "groups": matrix["statistics"]["total_groups"],
+            "syndrome_pairs": matrix["statistics"]["total_syndrome_pairs"],
+            "candidate_pairs": matrix["statistics"]["total_candidate_pairs"]
+        }
+    ),
+    IndexTarget(
+        name="zhengsu",
+        result_key="zhengsu_mapping",
+        title="證素-證型對應",
+        output="zhengsu_mapping.json",
+        entities=["zhengsu", "zhengxing", "syndromes"],
+        modules=["build_zhengsu_mapping.py"],
+        build=build_zhengsu_mapping,
+        summarize=lambda mapping: {
+            "zhengsu": mapping["statistics"]["total_zhengsu"],
+            "zhengxing": mapping["statistics"]["total_zhengxing"],
+            "itemsets": mapping["statistics"]["frequent_itemsets"],
+            "rules": mapping["statistics"]["association_rules"]
+        }
+    ),
+    IndexTarget(
+        name="pack",
+        result_key="syndrome_pack",
+        title="證候詳情打包",
+        output=TABLE_NAME,
+        entities=["syndromes"],
+        modules=["syndrome_pack.py"],
+        build=build_syndrome_pack,
+        summarize=lambda table: {
+            "syndromes": table["statistics"]["total_syndromes"],
+            "bytes": table["statistics"]["total_bytes"]
+        },
+        artifacts=[PACK_NAME]
+    ),
+    IndexTarget(
+        name="bitsets",
+        result_key="syndrome_bitsets",
+        title="證候位元集合",
+        output="syndrome_bitsets.json",
+        entities=["syndromes"],
+        modules=["syndrome_bitsets.py"],
+        build=build_syndrome_bitsets,
+        summarize=lambda bitsets: {
+            "zhengsu": bitsets["statistics"]["total_zhengsu"],
+            "symptoms": bitsets["statistics"]["total_symptoms"]
+        }
+    ),
+    IndexTarget(
+        name="cooccurrence",
+        result_key="symptom_cooccurrence",
+        title="症狀共現矩陣",
+        output=COOCCURRENCE_NAME,
+        entities=["zhengxing", "syndromes"],
+        modules=["symptom_cooccurrence.py"],
+        build=build_symptom_cooccurrence,
+        summarize=lambda matrix: {
+            "symptoms": matrix["statistics"]["total_symptoms"],
+            "nonzero": matrix["statistics"]["cooccurrence_nonzero"]
+        }
+    ),
+    IndexTarget(
+        name="neighbors",
+        result_key="syndrome_neighbors",
+        title="相似證候",
+        output=NEIGHBORS_NAME,
+        entities=["syndromes"],
+        modules=["syndrome_neighbors.py"],
+        build=build_syndrome_neighbors,
+        summarize=lambda neighbors: {
+            "syndromes": neighbors["statistics"]["total_syndromes"],
+            "pairs": neighbors["statistics"]["total_pairs"]
+        },
+        compact=True
+    ),
+    IndexTarget(
+        name="affinity",
+        result_key="formula_affinity",
+        title="方劑適配矩陣",
+        output=AFFINITY_NAME,
+        entities=["zhengsu", "herbs", "formulas", "syndromes"],
+        modules=["formula_affinity.py"],
+        build=build_formula_affinity,
+        summarize=lambda affinity: {
+            "formulas": affinity["statistics"]["total_formulas"],
+            "nonzero": affinity["statistics"]["nonzero"]
+        },
+        compact=True
+    ),
+]
+
+
+def write_json(data: Dict, output_path: Path, compact: bool = False):
+    """寫入 JSON 檔案（compact 時不加縮排）"""
     output_path.parent.mkdir(parents=True, exist_ok=True)
     with open(output_path, 'w', encoding='utf-8') as f:
-        json.dump(data, f, ensure_ascii=False, indent=2)
+        if compact:
+            json.dump(data, f, ensure_ascii=False, separators=(",", ":"))
+        else:
+            json.dump(data, f, ensure_ascii=False, indent=2)
 
 
 def print_header(title: str):
@@ -43,6 +214,174 @@ def print_step(step: int, total: int, name: str):
     print("-" * 40)
 
 
+def is_target_current(manifest: BuildManifest, target: IndexTarget,
+                      inputs: Dict[str, str], indexes_dir: Path) -> bool:
+    """輸入未變更且輸出與附帶檔案都存在時視為最新"""
+    if any(not (indexes_dir / artifact).exists() for artifact in target.artifacts):
+        return False
+    return manifest.is_up_to_date(target.result_key, inputs, indexes_dir / target.output)
+
+
+def print_task_result(task_result: TaskResult):
+    """輸出任務日誌與耗時"""
+    print(task_result.log, end="")
+    timing = f"耗時 {task_result.wall_seconds:.2f} 秒，CPU {task_result.cpu_seconds:.2f} 秒"
+    if task_result.ok:
+        print(f"✅ 完成 ({timing})")
+    else:
+        print(f"❌ 錯誤: {task_result.error}")
+
+
+def create_tasks(data_dir: Path, indexes_dir: Path, corpus: Corpus,
+                 stale_targets: List[IndexTarget], run_validation: bool) -> Tuple[List[Task], Dict[str, str]]:
+    """建立任務：驗證與各個需重建的索引彼此獨立，可並行執行"""
+    tasks: List[Task] = []
+    titles: Dict[str, str] = {}
+
+    if run_validation:
+        def validate() -> Dict:
+            validation_result = DataValidator(str(data_dir), corpus).run()
+            return {
+                "errors": len(validation_result.errors),
+                "warnings": len(validation_result.warnings)
+            }
+
+        tasks.append(Task("validate", validate))
+        titles["validate"] = "資料驗證"
+
+    for target in stale_targets:
+        def build(target: IndexTarget = target) -> Dict:
+            data = target.build(data_dir, corpus)
+            write_json(data, indexes_dir / target.output, target.compact)
+            return target.summarize(data)
+
+        tasks.append(Task(target.name, build, target.depends_on))
+        titles[target.name] = target.title
+
+    return tasks, titles
+
+
+def collect_results(task_results: Dict[str, TaskResult], stale_targets: List[IndexTarget],
+                    indexes_dir: Path, manifest: BuildManifest, target_inputs: Dict[str, Dict[str, str]],
+                    results: Dict[str, Dict], rebuilt: List[str]) -> bool:
+    """彙整任務結果並記錄成功建構的索引；回傳是否有驗證錯誤"""
+    validation_failed = False
+    if "validate" in task_results:
+        task_result = task_results["validate"]
+        timing = {
+            "wall_seconds": round(task_result.wall_seconds, 3),
+            "cpu_seconds": round(task_result.cpu_seconds, 3)
+        }
+        if task_result.ok:
+            results["validation"] = {**task_result.value, **timing}
+            validation_failed = task_result.value["errors"] > 0
+        else:
+            results["validation"] = {"error": task_result.error, **timing}
+            validation_failed = True
+
+    for target in stale_targets:
+        task_result = task_results[target.name]
+        output_path = indexes_dir / target.output
+        timing = {
+            "wall_seconds": round(task_result.wall_seconds, 3),
+            "cpu_seconds": round(task_result.cpu_seconds, 3)
+        }
+        if task_result.ok:
+            results[target.result_key] = {
+                "path": str(output_path),
+                **task_result.value,
+                "status": "rebuilt",
+                **timing
+            }
+            manifest.record(target.result_key, target.output, target_inputs[target.name], task_result.value)
+            rebuilt.append(target.result_key)
+        else:
+            results[target.result_key] = {"error": task_result.error, **timing}
+
+    return validation_failed
+
+
+def watch(data_dir: Path, indexes_dir: Path, corpus: Corpus, manifest: BuildManifest,
+          targets: List[IndexTarget], run_validation: bool, args) -> int:
+    """
+    監看模式：語料保留在記憶體中，檔案變更時只重新解析變更的檔案，
+    並只重建依賴該實體類型的索引（內容未變的存檔經雜湊比對後略過）
+    """
+    watched = [e for t in targets for e in t.entities]
+    if run_validation:
+        watched += VALIDATION_ENTITIES
+    watched = list(dict.fromkeys(watched))
+
+    # 初次建構時可能略過了部分實體，監看前補齊
+    ensure_corpus(data_dir, corpus, watched, args.jobs, args.pool)
+
+    watcher = DirectoryWatcher(
+        {name: data_dir / ENTITY_DIRS[name] for name in watched},
+        debounce=args.debounce,
+        poll_interval=args.poll_interval,
+        polling=args.polling
+    )
+    print(f"\n👀 監看中 ({watcher.backend.name})：{', '.join(ENTITY_DIRS[name] for name in watched)}")
+    print("按 Ctrl+C 結束")
+
+    # 驗證沒有建構清單紀錄，以其輸入摘要判斷內容是否真的有變更
+    validation_digest = manifest.digest(manifest.input_hashes(VALIDATION_ENTITIES, [])) if run_validation else ""
+
+    try:
+        while True:
+            changes = watcher.wait_for_changes()
+            round_start = time.time()
+
+            print_header(f"偵測到變更 {datetime.now().strftime('%H:%M:%S')}")
+            for name, change in changes.items():
+                for f in change.changed:
+                    print(f"  ✏️  {f.relative_to(data_dir)}")
+                for file_name in change.removed:
+                    print(f"  🗑️  {ENTITY_DIRS[name]}/{file_name}")
+                update_entity_files(corpus, name, change.changed, change.removed, args.jobs, args.pool)
+
+            manifest.refresh()
+            target_inputs: Dict[str, Dict[str, str]] = {}
+            stale_targets: List[IndexTarget] = []
+            for target in targets:
+                if not any(e in changes for e in target.entities):
+                    continue
+                inputs = manifest.input_hashes(target.entities, target.modules + COMMON_MODULES)
+                target_inputs[target.name] = inputs
+                if not is_target_current(manifest, target, inputs, indexes_dir):
+                    stale_targets.append(target)
+
+            revalidate = False
+            if run_validation and any(e in changes for e in VALIDATION_ENTITIES):
+                digest = manifest.digest(manifest.input_hashes(VALIDATION_ENTITIES, []))
+                revalidate = digest != validation_digest
+                validation_digest = digest
+
+            if not stale_targets and not revalidate:
+                print("⏭️  內容未變更，無需重建")
+                continue
+
+            tasks, titles = create_tasks(data_dir, indexes_dir, corpus, stale_targets, revalidate)
+
+            def report_task(task_result: TaskResult):
+                print(f"\n[{titles[task_result.name]}]")
+                print_task_result(task_result)
+
+            task_results = run_tasks(tasks, args.jobs, report_task)
+            results: Dict[str, Dict] = {}
+            rebuilt: List[str] = []
+            collect_results(task_results, stale_targets, indexes_dir, manifest, target_inputs, results, rebuilt)
+            manifest.save()
+
+            print(f"\n重建: {', '.join(rebuilt) or '無'}，耗時 {time.time() - round_start:.2f} 秒")
+    except KeyboardInterrupt:
+        print("\n已停止監看")
+    finally:
+        watcher.close()
+
+    return 0
+
+
 def main():
     """主函數"""
     import argparse
@@ -60,9 +399,38 @@ def main():
     )
     parser.add_argument(
         "--only",
-        choices=["symptoms", "evolution", "diff", "zhengsu", "validate"],
+        choices=[t.name for t in INDEX_TARGETS] + ["validate"],
         help="只執行指定的索引建構"
     )
+    parser.add_argument(
+        "--force",
+        action="store_true",
+        help="忽略建構清單，重建所有索引"
+    )
+    parser.add_argument(
+        "--watch",
+        action="store_true",
+        help="建構後持續監看資料目錄，檔案變更時只重建受影響的索引"
+    )
+    parser.add_argument(
+        "--debounce",
+        type=float,
+        default=0.5,
+        help="監看模式下合併連續存檔的靜止秒數 (預設: 0.5)"
+    )
+    parser.add_argument(
+        "--poll-interval",
+        type=float,
+        default=1.0,
+        help="無 inotify 時輪詢目錄的間隔秒數 (預設: 1.0)"
+    )
+    parser.add_argument(
+        "--polling",
+        action="store_true",
+        help="監看模式強制使用輪詢而非 inotify"
+    )
+    add_jobs_arguments(parser, "平行讀取 JSON 與並行建構索引的工作數")
+    add_cache_arguments(parser)
 
     args = parser.parse_args()
 
@@ -81,105 +449,69 @@ def main():
     print(f"輸出目錄: {indexes_dir}")
     print(f"開始時間: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
 
-    total_steps = 5
-    current_step = 0
-    results = {}
+    # 比對建構清單，找出輸入有變更的索引
+    manifest = BuildManifest.load(indexes_dir / "_build_manifest.json", data_dir, script_dir)
+    targets = [t for t in INDEX_TARGETS if args.only in [None, t.name]]
 
-    # Step 1: 資料驗證
-    if not args.skip_validation and args.only in [None, "validate"]:
-        current_step += 1
-        print_step(current_step, total_steps, "資料驗證")
+    target_inputs: Dict[str, Dict[str, str]] = {}
+    stale_targets: List[IndexTarget] = []
+    for target in targets:
+        inputs = manifest.input_hashes(target.entities, target.modules + COMMON_MODULES)
+        target_inputs[target.name] = inputs
+        if args.force or not is_target_current(manifest, target, inputs, indexes_dir):
+            stale_targets.append(target)
 
-        validator = DataValidator(str(data_dir))
-        validation_result = validator.run()
-        results["validation"] = {
-            "errors": len(validation_result.errors),
-            "warnings": len(validation_result.warnings)
-        }
+    run_validation = not args.skip_validation and args.only in [None, "validate"]
 
-        if validation_result.has_errors:
-            print("\n⚠️  發現驗證錯誤，建議修正後再生成索引")
-            if args.only == "validate":
-                return 1
+    # 只載入需要重建的索引與驗證所用到的資料，一次載入後共用
+    needed_entities: List[str] = list(VALIDATION_ENTITIES) if run_validation else []
+    for target in stale_targets:
+        needed_entities.extend(e for e in target.entities if e not in needed_entities)
 
-    # Step 2: 症狀索引
-    if args.only in [None, "symptoms"]:
-        current_step += 1
-        print_step(current_step, total_steps, "症狀反查索引")
+    cache = snapshot_cache_for(data_dir, args.no_cache, args.rebuild_cache)
+    corpus = load_corpus(data_dir, needed_entities, jobs=args.jobs, pool=args.pool, cache=cache)
+    print(f"讀取檔案: {corpus.files_read} 個，快照命中: {corpus.files_cached} 個，"
+          f"清除過期快照: {corpus.cache_evicted} 個")
 
-        try:
-            index = build_symptom_index(data_dir)
-            output_path = indexes_dir / "symptom_index.json"
-            write_json(index, output_path)
+    total_steps = len(INDEX_TARGETS) + 1
+    current_step = 0
+    results = {}
+    rebuilt: List[str] = []
+    skipped: List[str] = []
 
-            results["symptom_index"] = {
+    for target in targets:
+        if target not in stale_targets:
+            output_path = indexes_dir / target.output
+            results[target.result_key] = {
                 "path": str(output_path),
-                "total_symptoms": index["statistics"]["total_symptoms"]
+                **manifest.previous_stats(target.result_key),
+                "status": "skipped"
             }
-            print(f"✅ 完成: {output_path}")
-        except Exception as e:
-            print(f"❌ 錯誤: {e}")
-            results["symptom_index"] = {"error": str(e)}
-
-    # Step 3: 演變圖
-    if args.only in [None, "evolution"]:
-        current_step += 1
-        print_step(current_step, total_steps, "證型演變圖")
+            skipped.append(target.result_key)
+            current_step += 1
+            print_step(current_step, total_steps, target.title)
+            print(f"⏭️  輸入未變更，略過: {output_path}")
 
-        try:
-            graph = build_evolution_graph(data_dir)
-            output_path = indexes_dir / "evolution_graph.json"
-            write_json(graph, output_path)
+    tasks, titles = create_tasks(data_dir, indexes_dir, corpus, stale_targets, run_validation)
 
-            results["evolution_graph"] = {
-                "path": str(output_path),
-                "nodes": graph["statistics"]["total_nodes"],
-                "edges": graph["statistics"]["total_edges"]
-            }
-            print(f"✅ 完成: {output_path}")
-        except Exception as e:
-            print(f"❌ 錯誤: {e}")
-            results["evolution_graph"] = {"error": str(e)}
-
-    # Step 4: 鑑別矩陣
-    if args.only in [None, "diff"]:
+    def report_task(task_result: TaskResult):
+        """任務完成時依完成順序輸出其日誌"""
+        nonlocal current_step
         current_step += 1
-        print_step(current_step, total_steps, "類證鑑別矩陣")
-
-        try:
-            matrix = build_differentiation_matrix(data_dir)
-            output_path = indexes_dir / "differentiation_matrix.json"
-            write_json(matrix, output_path)
-
-            results["differentiation_matrix"] = {
-                "path": str(output_path),
-                "pairs": matrix["statistics"]["total_pairs"],
-                "groups": matrix["statistics"]["total_groups"]
-            }
-            print(f"✅ 完成: {output_path}")
-        except Exception as e:
-            print(f"❌ 錯誤: {e}")
-            results["differentiation_matrix"] = {"error": str(e)}
+        print_step(current_step, total_steps, titles[task_result.name])
+        print_task_result(task_result)
 
-    # Step 5: 證素對應
-    if args.only in [None, "zhengsu"]:
-        current_step += 1
-        print_step(current_step, total_steps, "證素-證型對應")
+    task_results = run_tasks(tasks, args.jobs, report_task)
+    validation_failed = collect_results(
+        task_results, stale_targets, indexes_dir, manifest, target_inputs, results, rebuilt
+    )
 
-        try:
-            mapping = build_zhengsu_mapping(data_dir)
-            output_path = indexes_dir / "zhengsu_mapping.json"
-            write_json(mapping, output_path)
+    if validation_failed:
+        print("\n⚠️  發現驗證錯誤，建議修正後再生成索引")
+        if args.only == "validate" and not args.watch:
+            return 1
 
-            results["zhengsu_mapping"] = {
-                "path": str(output_path),
-                "zhengsu": mapping["statistics"]["total_zhengsu"],
-                "zhengxing": mapping["statistics"]["total_zhengxing"]
-            }
-            print(f"✅ 完成: {output_path}")
-        except Exception as e:
-            print(f"❌ 錯誤: {e}")
-            results["zhengsu_mapping"] = {"error": str(e)}
+    manifest.save()
 
     # 輸出總結報告
     elapsed_time = time.time() - start_time
@@ -200,7 +532,12 @@ def main():
     report = {
         "generated_at": datetime.now().isoformat(),
         "elapsed_seconds": elapsed_time,
+        "jobs": args.jobs,
         "data_dir": str(data_dir),
+        "files_read": corpus.files_read,
+        "files_cached": corpus.files_cached,
+        "rebuilt": rebuilt,
+        "skipped": skipped,
         "results": results
     }
     report_path = indexes_dir / "_build_report.json"
@@ -211,10 +548,13 @@ def main():
     has_errors = any("error" in r for r in results.values())
     if has_errors:
         print("\n⚠️  部分索引生成失敗，請檢查錯誤訊息")
-        return 1
+    else:
+        print("\n✅ 所有索引生成完成！")
 
-    print("\n✅ 所有索引生成完成！")
-    return 0
+    if args.watch:
+        return watch(data_dir, indexes_dir, corpus, manifest, targets, run_validation, args)
+
+    return 1 if has_errors else 0
 
 
 if __name__ == "__main__":
@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+建構清單模組
+記錄來源檔案的內容雜湊，以及每個索引輸出所依賴的輸入，供增量建構判斷是否需要重建
+輸出: data/indexes/_build_manifest.json
+"""
+
+import ast
+import hashlib
+import json
+from pathlib import Path
+from typing import Dict, List, Any, Iterable, Optional
+
+from corpus import ENTITY_DIRS, entity_files
+
+
+MANIFEST_VERSION = 1
+
+# 來源鍵前綴：資料檔案相對於資料目錄，腳本相對於 scripts/
+DATA_PREFIX = "data:"
+CODE_PREFIX = "code:"
+
+
+# 腳本路徑 → (修改時間, 其匯入的同目錄模組檔名)
+_import_cache: Dict[Path, Any] = {}
+
+
+def local_imports(path: Path) -> List[str]:
+    """腳本以 import / from ... import 匯入、且位於同一目錄的模組檔名"""
+    mtime = path.stat().st_mtime_ns
+    cached = _import_cache.get(path)
+    if cached and cached[0] == mtime:
+        return cached[1]
+
+    with open(path, 'r', encoding='utf-8') as f:
+        tree = ast.parse(f.read(), filename=str(path))
+    names = []
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            names.extend(alias.name for alias in node.names)
+        elif isinstance(node, ast.ImportFrom) and node.module and not node.level:
+            names.append(node.module)
+    modules = sorted({
+        f"{name}.py" for name in names
+        if "." not in name and (path.parent / f"{name}.py").exists()
+    })
+    _import_cache[path] = (mtime, modules)
+    return modules
+
+
+def module_closure(script_dir: Path, modules: Iterable[str]) -> List[str]:
+    """腳本及其遞移匯入的同目錄模組（含函式內延遲匯入），依檔名排序"""
+    seen = set()
+    pending = [m for m in modules if (Path(script_dir) / m).exists()]
+    while pending:
+        module = pending.pop()
+        if module in seen:
+            continue
+        seen.add(module)
+        pending.extend(local_imports(Path(script_dir) / module))
+    return sorted(seen)
+
+
+def hash_file(path: Path) -> str:
+    """計算檔案內容的 SHA-256"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 16), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class BuildManifest:
+    """
+    建構清單
+    sources: 來源鍵 → {sha256, size, mtime_ns}；大小與修改時間未變時沿用舊雜湊，不重新讀檔
+    targets: 輸出名稱 → {output, inputs, digest, stats}
+    """
+
+    def __init__(self, path: Path, data_dir: Path, script_dir: Path):
+        self.path = Path(path)
+        self.data_dir = Path(data_dir)
+        self.script_dir = Path(script_dir)
+        self.sources: Dict[str, Dict[str, Any]] = {}
+        self.targets: Dict[str, Dict[str, Any]] = {}
+        self._previous_sources: Dict[str, Dict[str, Any]] = {}
+
+    @classmethod
+    def load(cls, path: Path, data_dir: Path, script_dir: Path) -> "BuildManifest":
+        """讀取既有清單；不存在或版本不符時回傳空清單"""
+        manifest = cls(path, data_dir, script_dir)
+        if manifest.path.exists():
+            try:
+                with open(manifest.path, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+            except (json.JSONDecodeError, OSError):
+                data = {}
+            if data.get("version") == MANIFEST_VERSION:
+                manifest._previous_sources = data.get("sources", {})
+                manifest.targets = data.get("targets", {})
+        return manifest
+
+    def refresh(self):
+        """開始新一輪比對（監看模式用）：本輪的雜湊轉為舊紀錄，下次比對時重新檢查檔案狀態"""
+        self._previous_sources = {**self._previous_sources, **self.sources}
+        self.sources = {}
+
+    def _source_hash(self, key: str, path: Path) -> str:
+        """取得來源檔案的雜湊（優先沿用大小與修改時間皆未變的舊紀錄）"""
+        if key in self.sources:
+            return self.sources[key]["sha256"]
+
+        st = path.stat()
+        previous = self._previous_sources.get(key)
+        if previous and previous.get("size") == st.st_size and previous.get("mtime_ns") == st.st_mtime_ns:
+            sha = previous["sha256"]
+        else:
+            sha = hash_file(path)
+
+        self.sources[key] = {"sha256": sha, "size": st.st_size, "mtime_ns": st.st_mtime_ns}
+        return sha
+
+    def input_hashes(self, entities: Iterable[str], modules: Iterable[str]) -> Dict[str, str]:
+        """收集一組實體目錄與腳本的來源雜湊；腳本包含其遞移匯入的 scripts/ 模組"""
+        hashes: Dict[str, str] = {}
+        for name in entities:
+            for f in entity_files(self.data_dir / ENTITY_DIRS[name]):
+                key = DATA_PREFIX + f.relative_to(self.data_dir).as_posix()
+                hashes[key] = self._source_hash(key, f)
+        for module in module_closure(self.script_dir, modules):
+            key = CODE_PREFIX + module
+            hashes[key] = self._source_hash(key, self.script_dir / module)
+        return hashes
+
+    @staticmethod
+    def digest(inputs: Dict[str, str]) -> str:
+        """將一組輸入雜湊合併為單一摘要"""
+        digest = hashlib.sha256()
+        for key in sorted(inputs):
+            digest.update(f"{key}\0{inputs[key]}\n".encode('utf-8'))
+        return digest.hexdigest()
+
+    def is_up_to_date(self, target: str, inputs: Dict[str, str], output_path: Path) -> bool:
+        """輸出存在且輸入摘要與上次建構相同時視為最新"""
+        record = self.targets.get(target)
+        if not record or not output_path.exists():
+            return False
+        return record.get("digest") == self.digest(inputs)
+
+    def previous_stats(self, target: str) -> Dict[str, Any]:
+        """上次建構時記錄的統計資訊"""
+        return self.targets.get(target, {}).get("stats", {})
+
+    def record(self, target: str, output: str, inputs: Dict[str, str], stats: Optional[Dict[str, Any]] = None):
+        """記錄一次成功的建構"""
+        self.targets[target] = {
+            "output": output,
+            "inputs": sorted(inputs),
+            "digest": self.digest(inputs),
+            "stats": stats or {}
+        }
+
+    def save(self):
+        """寫入清單；只保留仍被某個目標引用的來源（已刪除的檔案自然被清除）"""
+        referenced = {key for record in self.targets.values() for key in record.get("inputs", [])}
+        merged = {**self._previous_sources, **self.sources}
+        sources = {key: value for key, value in merged.items() if key in referenced}
+        data = {
+            "version": MANIFEST_VERSION,
+            "sources": dict(sorted(sources.items())),
+            "targets": dict(sorted(self.targets.items()))
+        }
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
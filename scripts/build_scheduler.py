@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+建構排程模組
+依任務宣告的相依關係排程執行；彼此獨立的任務在行程池中並行，
+單一任務失敗不會中止其他任務，並記錄每個任務的實際耗時與 CPU 時間
+"""
+
+import io
+import multiprocessing
+import time
+import traceback
+from contextlib import redirect_stdout
+from dataclasses import dataclass, field
+from typing import Dict, List, Any, Callable, Optional
+
+
+@dataclass
+class Task:
+    """排程任務"""
+    name: str
+    action: Callable[[], Any]
+    depends_on: List[str] = field(default_factory=list)
+
+
+@dataclass
+class TaskResult:
+    """任務執行結果"""
+    name: str
+    status: str                     # done / failed / blocked
+    value: Any = None
+    error: str = ""
+    log: str = ""
+    wall_seconds: float = 0.0
+    cpu_seconds: float = 0.0
+
+    @property
+    def ok(self) -> bool:
+        return self.status == "done"
+
+
+# 行程池以 fork 建立，子行程直接繼承此表（含已載入的語料），不需序列化任務本身
+_TASKS: Dict[str, Task] = {}
+
+
+def _execute(name: str) -> TaskResult:
+    """執行單一任務，攔截其輸出並計時；例外轉為失敗結果而不拋出"""
+    task = _TASKS[name]
+    buffer = io.StringIO()
+    wall_start = time.perf_counter()
+    cpu_start = time.process_time()
+    try:
+        with redirect_stdout(buffer):
+            value = task.action()
+        status, error = "done", ""
+    except Exception as e:
+        value = None
+        status, error = "failed", f"{e}"
+        buffer.write(traceback.format_exc())
+    return TaskResult(
+        name=name,
+        status=status,
+        value=value,
+        error=error,
+        log=buffer.getvalue(),
+        wall_seconds=time.perf_counter() - wall_start,
+        cpu_seconds=time.process_time() - cpu_start
+    )
+
+
+def fork_available() -> bool:
+    """目前平台是否支援以 fork 建立行程"""
+    return "fork" in multiprocessing.get_all_start_methods()
+
+
+def run_tasks(tasks: List[Task], jobs: int = 1,
+              on_complete: Optional[Callable[[TaskResult], None]] = None) -> Dict[str, TaskResult]:
+    """
+    依相依關係執行任務
+    jobs > 1 且平台支援 fork 時以行程池並行，否則依序執行；
+    相依任務失敗時，下游任務標記為 blocked 而不執行
+    """
+    _TASKS.clear()
+    _TASKS.update({task.name: task for task in tasks})
+
+    for task in tasks:
+        for dep in task.depends_on:
+            if dep not in _TASKS:
+                raise ValueError(f"任務 {task.name} 依賴未知的任務: {dep}")
+
+    results: Dict[str, TaskResult] = {}
+    pending = [task.name for task in tasks]
+
+    def finish(result: TaskResult):
+        results[result.name] = result
+        if on_complete:
+            on_complete(result)
+
+    def take_ready() -> List[str]:
+        """取出相依任務皆已結束的任務；相依失敗者直接標記為 blocked"""
+        ready = []
+        for name in list(pending):
+            deps = _TASKS[name].depends_on
+            if not all(dep in results for dep in deps):
+                continue
+            pending.remove(name)
+            failed = [dep for dep in deps if not results[dep].ok]
+            if failed:
+                finish(TaskResult(name=name, status="blocked",
+                                  error=f"相依任務失敗: {', '.join(failed)}"))
+            else:
+                ready.append(name)
+        return ready
+
+    if jobs <= 1 or len(tasks) <= 1 or not fork_available():
+        while pending:
+            ready = take_ready()
+            if not ready:
+                break
+            for name in ready:
+                finish(_execute(name))
+        return results
+
+    from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+
+    context = multiprocessing.get_context("fork")
+    with ProcessPoolExecutor(max_workers=jobs, mp_context=context) as executor:
+        running = {}
+        while pending or running:
+            for name in take_ready():
+                running[executor.submit(_execute, name)] = name
+            if not running:
+                break
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                name = running.pop(future)
+                try:
+                    result = future.result()
+                except Exception as e:
+                    # 子行程異常終止等無法在任務內攔截的錯誤
+                    result = TaskResult(name=name, status="failed", error=f"{e}")
+                finish(result)
+
+    return results
@@ -2,7 +2,7 @@
 # -*- coding: utf-8 -*-
 """
 證素對應建構腳本
-建立證素與證型的雙向對應關係
+建立證素與證型的雙向對應關係，並探勘證型與證候證素組成的頻繁項目集與關聯規則
 輸出: data/indexes/zhengsu_mapping.json
 """
 
@@ -12,57 +12,12 @@ from typing import Dict, List, Set, Any, Optional, Tuple
 from datetime import datetime
 from collections import defaultdict
 
-
-def load_zhengsu_data(data_dir: Path) -> Dict[str, Dict]:
-    """載入所有證素資料"""
-    zhengsu_data: Dict[str, Dict] = {}
-
-    zhengsu_dir = data_dir / "zhengsu"
-    if not zhengsu_dir.exists():
-        print(f"警告: 證素目錄不存在: {zhengsu_dir}")
-        return zhengsu_data
-
-    for f in zhengsu_dir.glob("*.json"):
-        if f.name.startswith("_"):
-            continue
-
-        try:
-            with open(f, 'r', encoding='utf-8') as fp:
-                data = json.load(fp)
-        except (json.JSONDecodeError, Exception) as e:
-            print(f"警告: 無法讀取 {f}: {e}")
-            continue
-
-        if "id" in data:
-            zhengsu_data[data["id"]] = data
-
-    return zhengsu_data
-
-
-def load_zhengxing_data(data_dir: Path) -> Dict[str, Dict]:
-    """載入所有證型資料"""
-    zhengxing_data: Dict[str, Dict] = {}
-
-    zhengxing_dir = data_dir / "zhengxing"
-    if not zhengxing_dir.exists():
-        print(f"警告: 證型目錄不存在: {zhengxing_dir}")
-        return zhengxing_data
-
-    for f in zhengxing_dir.glob("*.json"):
-        if f.name.startswith("_"):
-            continue
-
-        try:
-            with open(f, 'r', encoding='utf-8') as fp:
-                data = json.load(fp)
-        except (json.JSONDecodeError, Exception) as e:
-            print(f"警告: 無法讀取 {f}: {e}")
-            continue
-
-        if "id" in data:
-            zhengxing_data[data["id"]] = data
-
-    return zhengxing_data
+from corpus import Corpus, ensure_corpus, load_corpus, add_cache_arguments, snapshot_cache_for
+from zhengsu_itemsets import (
+    build_transactions, mine_zhengsu_patterns, itemsets_to_json,
+    DEFAULT_MIN_SUPPORT, DEFAULT_MIN_CONFIDENCE, DEFAULT_MIN_LIFT, DEFAULT_MAX_LENGTH
+)
+from zhengsu_composition_index import CompositionIndex
 
 
 def build_by_zhengsu(zhengsu_data: Dict[str, Dict], zhengxing_data: Dict[str, Dict]) -> Dict[str, Dict]:
@@ -228,13 +183,34 @@ def build_category_summary(zhengsu_data: Dict[str, Dict]) -> Dict[str, Dict]:
     return summary
 
 
-def build_zhengsu_mapping(data_dir: Path) -> Dict:
-    """建立完整的證素對應"""
-    print("正在載入證素資料...")
-    zhengsu_data = load_zhengsu_data(data_dir)
+def build_frequent_patterns(corpus: Corpus,
+                            min_support: float = DEFAULT_MIN_SUPPORT,
+                            min_confidence: float = DEFAULT_MIN_CONFIDENCE,
+                            min_lift: float = DEFAULT_MIN_LIFT,
+                            max_length: int = DEFAULT_MAX_LENGTH) -> Dict:
+    """探勘證型與證候證素組成的頻繁項目集與關聯規則"""
+    transactions = build_transactions(corpus)
+    itemsets, rules = mine_zhengsu_patterns(transactions, min_support, min_confidence, min_lift, max_length)
+
+    names = {zs_id: zs_data.get("name", zs_id) for zs_id, zs_data in corpus.zhengsu.items()}
+    thresholds = {
+        "min_support": min_support,
+        "min_confidence": min_confidence,
+        "min_lift": min_lift,
+        "max_length": max_length
+    }
+    return itemsets_to_json(itemsets, rules, names, len(transactions), thresholds)
+
 
-    print("正在載入證型資料...")
-    zhengxing_data = load_zhengxing_data(data_dir)
+def build_zhengsu_mapping(data_dir: Path, corpus: Optional[Corpus] = None, **pattern_options) -> Dict:
+    """
+    建立完整的證素對應
+    pattern_options 為頻繁項目集的門檻
+    """
+    print("正在載入證素、證型資料...")
+    corpus = ensure_corpus(data_dir, corpus, ["zhengsu", "zhengxing", "syndromes"])
+    zhengsu_data = corpus.zhengsu
+    zhengxing_data = corpus.zhengxing
 
     print(f"載入了 {len(zhengsu_data)} 個證素, {len(zhengxing_data)} 個證型")
 
@@ -247,6 +223,12 @@ def build_zhengsu_mapping(data_dir: Path) -> Dict:
     print("正在識別組合模式...")
     patterns = find_combination_patterns(zhengsu_data, zhengxing_data)
 
+    print("正在探勘頻繁證素組合...")
+    frequent_patterns = build_frequent_patterns(corpus, **pattern_options)
+
+    print("正在建立證素組成遮罩索引...")
+    composition_index = CompositionIndex.from_corpus(corpus).to_json()
+
     print("正在建立分類摘要...")
     category_summary = build_category_summary(zhengsu_data)
 
@@ -261,6 +243,8 @@ def build_zhengsu_mapping(data_dir: Path) -> Dict:
             "description": "常見的證素組合模式",
             "patterns": patterns
         },
+        "frequent_patterns": frequent_patterns,
+        "composition_index": composition_index,
         "category_summary": category_summary,
         "statistics": {
             "total_zhengsu": len(zhengsu_data),
@@ -269,7 +253,10 @@ def build_zhengsu_mapping(data_dir: Path) -> Dict:
                 1 for zs in by_zhengsu.values()
                 if zs.get("related_zhengxing")
             ),
-            "combination_patterns": len(patterns)
+            "combination_patterns": len(patterns),
+            "frequent_itemsets": len(frequent_patterns["itemsets"]),
+            "association_rules": len(frequent_patterns["rules"]),
+            "distinct_compositions": composition_index["statistics"]["distinct_compositions"]
         }
     }
 
@@ -291,6 +278,31 @@ def main():
         default="data/indexes/zhengsu_mapping.json",
         help="輸出檔案路徑"
     )
+    parser.add_argument(
+        "--min-support",
+        type=float,
+        default=DEFAULT_MIN_SUPPORT,
+        help=f"頻繁項目集的最低支持度（比例）(預設: {DEFAULT_MIN_SUPPORT})"
+    )
+    parser.add_argument(
+        "--min-confidence",
+        type=float,
+        default=DEFAULT_MIN_CONFIDENCE,
+        help=f"關聯規則的最低信賴度 (預設: {DEFAULT_MIN_CONFIDENCE})"
+    )
+    parser.add_argument(
+        "--min-lift",
+        type=float,
+        default=DEFAULT_MIN_LIFT,
+        help=f"關聯規則的最低提升度 (預設: {DEFAULT_MIN_LIFT})"
+    )
+    parser.add_argument(
+        "--max-length",
+        type=int,
+        default=DEFAULT_MAX_LENGTH,
+        help=f"項目集最大長度 (預設: {DEFAULT_MAX_LENGTH})"
+    )
+    add_cache_arguments(parser)
 
     args = parser.parse_args()
 
@@ -307,7 +319,15 @@ def main():
     output_path.parent.mkdir(parents=True, exist_ok=True)
 
     # 建立證素對應
-    mapping = build_zhengsu_mapping(data_dir)
+    cache = snapshot_cache_for(data_dir, args.no_cache, args.rebuild_cache)
+    corpus = load_corpus(data_dir, ["zhengsu", "zhengxing", "syndromes"], cache=cache)
+    mapping = build_zhengsu_mapping(
+        data_dir, corpus,
+        min_support=args.min_support,
+        min_confidence=args.min_confidence,
+        min_lift=args.min_lift,
+        max_length=args.max_length
+    )
 
     # 寫入檔案
     with open(output_path, 'w', encoding='utf-8') as f:
@@ -318,6 +338,9 @@ def main():
     print(f"   證型數: {mapping['statistics']['total_zhengxing']}")
     print(f"   有關聯的證素: {mapping['statistics']['zhengsu_with_related']}")
     print(f"   組合模式數: {mapping['statistics']['combination_patterns']}")
+    print(f"   頻繁項目集: {mapping['statistics']['frequent_itemsets']}")
+    print(f"   關聯規則: {mapping['statistics']['association_rules']}")
+    print(f"   不同證素組成: {mapping['statistics']['distinct_compositions']}")
 
     return 0
 
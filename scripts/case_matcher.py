@@ -0,0 +1,506 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+醫案與證型/證候的向量比對
+將醫案與證型/證候表示為以症狀（及選用的證素）為維度的稀疏 TF-IDF 向量（CSR 陣列），
+以餘弦相似度排序；整批醫案以一次稀疏矩陣乘積（醫案 × 證型/證候ᵀ）計分，
+知識庫更新後可快速重新比對大量歷史醫案
+輸入: data/cases/ 目錄或 JSONL 檔（每行一個醫案）
+"""
+
+import heapq
+import json
+import math
+import time
+from array import array
+from pathlib import Path
+from typing import Dict, List, Any, Iterable, Iterator, Optional, Tuple
+from dataclasses import dataclass
+
+from corpus import Corpus, entity_files, load_corpus, add_jobs_arguments, add_cache_arguments, snapshot_cache_for
+from extract_symptoms import parse_clinical_manifestations
+from diagnosis_engine import FIELD_WEIGHTS, normalize_symptom, build_aliases, resolve_symptom_names, KIND_ZHENGXING, KIND_SYNDROME
+from keyword_matcher import KeywordAutomaton
+
+
+# 特徵鍵的前綴
+FEATURE_SYMPTOM = "symptom"
+FEATURE_ZHENGSU = "zhengsu"
+
+# 證型主症的欄位名稱（部分證型檔案使用 primary）
+MAIN_FIELDS = ["main", "primary"]
+
+# 醫案中以全文比對症狀的欄位
+CASE_TEXT_FIELDS = [
+    ("chief_complaint",),
+    ("history", "present_illness"),
+    ("examination", "inspection"),
+    ("examination", "auscultation"),
+    ("examination", "inquiry"),
+    ("examination", "palpation"),
+]
+
+# 醫案全文比對時，過短的症狀詞（單字）容易誤中，不納入
+MIN_TEXT_TERM_LENGTH = 2
+
+DEFAULT_TOP = 5
+DEFAULT_BATCH_SIZE = 1024
+
+
+def symptom_feature(name: str) -> str:
+    return f"{FEATURE_SYMPTOM}:{name}"
+
+
+def zhengsu_feature(zhengsu_id: str) -> str:
+    return f"{FEATURE_ZHENGSU}:{zhengsu_id}"
+
+
+class SparseMatrix:
+    """
+    CSR 稀疏矩陣：第 i 列的非零元素為 indices/data[indptr[i]:indptr[i + 1]]
+    """
+
+    def __init__(self, indptr: array, indices: array, data: array, ncols: int):
+        self.indptr = indptr
+        self.indices = indices
+        self.data = data
+        self.ncols = ncols
+
+    @classmethod
+    def from_rows(cls, rows: Iterable[Dict[int, float]], ncols: int) -> "SparseMatrix":
+        """由「欄 → 值」的列清單建立（各列內依欄序排列）"""
+        indptr, indices, data = array('l', [0]), array('l'), array('d')
+        for row in rows:
+            for col in sorted(row):
+                indices.append(col)
+                data.append(row[col])
+            indptr.append(len(indices))
+        return cls(indptr, indices, data, ncols)
+
+    def __len__(self) -> int:
+        return len(self.indptr) - 1
+
+    @property
+    def nnz(self) -> int:
+        return len(self.indices)
+
+    def row(self, i: int) -> Tuple[array, array]:
+        start, end = self.indptr[i], self.indptr[i + 1]
+        return self.indices[start:end], self.data[start:end]
+
+    def transpose(self) -> "SparseMatrix":
+        """轉置（計數排序，O(nnz)）"""
+        counts = [0] * (self.ncols + 1)
+        for col in self.indices:
+            counts[col + 1] += 1
+        for col in range(self.ncols):
+            counts[col + 1] += counts[col]
+
+        indptr = array('l', counts)
+        indices = array('l', bytes(indptr.itemsize * self.nnz))
+        data = array('d', bytes(self.data.itemsize * self.nnz))
+        cursor = counts[:-1]
+        for i in range(len(self)):
+            for pos in range(self.indptr[i], self.indptr[i + 1]):
+                col = self.indices[pos]
+                dest = cursor[col]
+                indices[dest] = i
+                data[dest] = self.data[pos]
+                cursor[col] = dest + 1
+        return SparseMatrix(indptr, indices, data, len(self))
+
+    def row_product(self, i: int, other: "SparseMatrix") -> Dict[int, float]:
+        """第 i 列 × other（other 的列數等於本矩陣的欄數），回傳「欄 → 值」"""
+        row: Dict[int, float] = {}
+        for pos in range(self.indptr[i], self.indptr[i + 1]):
+            k, weight = self.indices[pos], self.data[pos]
+            for ptr in range(other.indptr[k], other.indptr[k + 1]):
+                col = other.indices[ptr]
+                row[col] = row.get(col, 0.0) + weight * other.data[ptr]
+        return row
+
+    def multiply(self, other: "SparseMatrix") -> "SparseMatrix":
+        """稀疏矩陣乘積 self × other（Gustavson 演算法，逐列累加）"""
+        return SparseMatrix.from_rows((self.row_product(i, other) for i in range(len(self))), other.ncols)
+
+    def normalize_rows(self):
+        """各列除以其 L2 範數（零向量不變），內積即為餘弦相似度"""
+        for i in range(len(self)):
+            start, end = self.indptr[i], self.indptr[i + 1]
+            norm = math.sqrt(sum(v * v for v in self.data[start:end]))
+            if norm:
+                for pos in range(start, end):
+                    self.data[pos] /= norm
+
+
+@dataclass
+class CaseMatch:
+    """單一醫案的比對結果"""
+    id: str
+    name: str
+    kind: str
+    score: float
+
+
+@dataclass
+class CaseResult:
+    """醫案的前 k 名證型/證候；expected 為醫案記錄的證型（若有）"""
+    case_id: str
+    matches: List[CaseMatch]
+    features: int
+    expected: Optional[str] = None
+
+    @property
+    def expected_rank(self) -> Optional[int]:
+        """醫案記錄的證型在前 k 名中的名次（未列入為 None）"""
+        if not self.expected:
+            return None
+        for rank, match in enumerate(self.matches, 1):
+            if match.kind == KIND_ZHENGXING and match.id == self.expected:
+                return rank
+        return None
+
+    def to_json(self) -> Dict[str, Any]:
+        data: Dict[str, Any] = {
+            "id": self.case_id,
+            "features": self.features,
+            "matches": [
+                {"id": m.id, "name": m.name, "kind": m.kind, "score": m.score}
+                for m in self.matches
+            ]
+        }
+        if self.expected:
+            data["expected"] = self.expected
+            data["expected_rank"] = self.expected_rank
+        return data
+
+
+class CaseMatcher:
+    """
+    證型/證候向量庫（建立一次，可重複比對）
+    特徵權重為欄位權重 × IDF，並正規化為單位向量；
+    另存轉置矩陣（特徵 → 證型/證候），批次乘積時逐一累加醫案的非零特徵
+    """
+
+    def __init__(self, corpus: Corpus, use_zhengsu: bool = False):
+        self.use_zhengsu = use_zhengsu
+        self.aliases = build_aliases(corpus)
+        self.symptom_names = resolve_symptom_names(corpus)
+
+        self.columns: List[Dict[str, str]] = []
+        self.features: Dict[str, int] = {}
+        rows: List[Dict[int, float]] = []
+
+        for kind, entities in [(KIND_ZHENGXING, corpus.zhengxing), (KIND_SYNDROME, corpus.syndromes)]:
+            for entity_id, data in entities.items():
+                self.columns.append({"id": entity_id, "name": data.get("name", ""), "kind": kind})
+                rows.append(self._entity_terms(data, kind))
+
+        # IDF：出現於越少證型/證候的特徵權重越高
+        total = len(rows)
+        doc_freq = [0] * len(self.features)
+        for row in rows:
+            for col in row:
+                doc_freq[col] += 1
+        self.idf = array('d', (math.log(1 + (total - df + 0.5) / (df + 0.5)) for df in doc_freq))
+
+        matrix = SparseMatrix.from_rows(
+            ({col: tf * self.idf[col] for col, tf in row.items()} for row in rows),
+            len(self.features)
+        )
+        matrix.normalize_rows()
+        self.matrix = matrix
+        self.by_feature = matrix.transpose()
+
+        # 醫案全文比對用的症狀詞自動機（長詞優先，已命中的片段不再被短詞重複使用）
+        self.text_automaton = KeywordAutomaton(
+            (key[len(FEATURE_SYMPTOM) + 1:], col)
+            for key, col in self.features.items()
+            if key.startswith(FEATURE_SYMPTOM + ":") and len(key) - len(FEATURE_SYMPTOM) - 1 >= MIN_TEXT_TERM_LENGTH
+        )
+
+    @classmethod
+    def from_corpus(cls, corpus: Corpus, **kwargs) -> "CaseMatcher":
+        return cls(corpus, **kwargs)
+
+    def __len__(self) -> int:
+        return len(self.columns)
+
+    def _feature(self, key: str) -> int:
+        col = self.features.get(key)
+        if col is None:
+            col = self.features[key] = len(self.features)
+        return col
+
+    def _add_symptom(self, terms: Dict[int, float], text: str, weight: float):
+        name = self.normalize(text)
+        if name:
+            col = self._feature(symptom_feature(name))
+            terms[col] = terms.get(col, 0.0) + weight
+
+    def _entity_terms(self, data: Dict[str, Any], kind: str) -> Dict[int, float]:
+        """證型/證候的加權詞頻（欄 → 權重）"""
+        terms: Dict[int, float] = {}
+        if kind == KIND_ZHENGXING:
+            symptoms = data.get("symptoms", {})
+            for field_name in MAIN_FIELDS + ["secondary"]:
+                weight = FIELD_WEIGHTS["main" if field_name in MAIN_FIELDS else field_name]
+                for symptom in symptoms.get(field_name, []):
+                    if isinstance(symptom, str):
+                        self._add_symptom(terms, self.symptom_names.get(symptom, symptom), weight)
+            for field_name in ["tongue", "pulse"]:
+                value = symptoms.get(field_name)
+                if isinstance(value, str):
+                    for part in parse_clinical_manifestations(value):
+                        self._add_symptom(terms, part, FIELD_WEIGHTS[field_name])
+        else:
+            clinical = data.get("clinical_manifestations", "")
+            if clinical:
+                for symptom in dict.fromkeys(parse_clinical_manifestations(clinical)):
+                    self._add_symptom(terms, symptom, FIELD_WEIGHTS["clinical"])
+
+        if self.use_zhengsu:
+            composition = data.get("zhengsu_composition") or {}
+            for role in ["location", "nature"]:
+                for zhengsu_id in composition.get(role, []):
+                    terms[self._feature(zhengsu_feature(zhengsu_id))] = 1.0
+        return terms
+
+    def normalize(self, text: str) -> str:
+        """正規化症狀文字並套用別名"""
+        text = normalize_symptom(text)
+        return self.aliases.get(text, text)
+
+    def case_terms(self, case: Dict[str, Any]) -> Dict[int, float]:
+        """
+        醫案的特徵（欄 → 權重，已乘 IDF）
+        來源：symptoms_collected 的症狀 ID、主訴/現病史/四診全文中出現的已知症狀，
+        以及（use_zhengsu 時）diagnosis.zhengsu_analysis；未出現在證型/證候中的特徵不影響相似度，直接略過
+        """
+        cols: Dict[int, None] = {}
+        for symptom in case.get("symptoms_collected", []):
+            if isinstance(symptom, str):
+                col = self.features.get(symptom_feature(self.normalize(self.symptom_names.get(symptom, symptom))))
+                if col is not None:
+                    cols[col] = None
+
+        for path in CASE_TEXT_FIELDS:
+            value: Any = case
+            for key in path:
+                value = value.get(key) if isinstance(value, dict) else None
+            if isinstance(value, str) and value:
+                for hit in self.text_automaton.longest_first(value):
+                    cols[hit.value] = None
+
+        if self.use_zhengsu:
+            diagnosis = case.get("diagnosis") or {}
+            for zhengsu_id in diagnosis.get("zhengsu_analysis", []):
+                col = self.features.get(zhengsu_feature(zhengsu_id))
+                if col is not None:
+                    cols[col] = None
+
+        return {col: self.idf[col] for col in cols}
+
+    def case_matrix(self, cases: List[Dict[str, Any]]) -> SparseMatrix:
+        """一批醫案 → 單位化的 CSR 矩陣"""
+        matrix = SparseMatrix.from_rows((self.case_terms(case) for case in cases), len(self.features))
+        matrix.normalize_rows()
+        return matrix
+
+    def score_matrix(self, cases: SparseMatrix, k: int = DEFAULT_TOP,
+                     kinds: Optional[Iterable[str]] = None) -> List[List[Tuple[int, float]]]:
+        """
+        批次計算 cases × matrixᵀ，每列只保留前 k 名（欄序號, 相似度）
+        以列為單位累加（Gustavson 演算法），累加器重複使用，只清除本列觸及的欄
+        """
+        allowed = None
+        if kinds is not None:
+            kinds = set(kinds)
+            allowed = [column["kind"] in kinds for column in self.columns]
+
+        indptr, indices, data = self.by_feature.indptr, self.by_feature.indices, self.by_feature.data
+        accumulator = [0.0] * len(self.columns)
+        results: List[List[Tuple[int, float]]] = []
+        for i in range(len(cases)):
+            touched: List[int] = []
+            for pos in range(cases.indptr[i], cases.indptr[i + 1]):
+                feature, weight = cases.indices[pos], cases.data[pos]
+                for ptr in range(indptr[feature], indptr[feature + 1]):
+                    col = indices[ptr]
+                    if not accumulator[col]:
+                        touched.append(col)
+                    accumulator[col] += weight * data[ptr]
+
+            candidates = touched if allowed is None else [col for col in touched if allowed[col]]
+            top = heapq.nlargest(k, candidates, key=lambda col: (accumulator[col], -col))
+            results.append([(col, accumulator[col]) for col in top])
+            for col in touched:
+                accumulator[col] = 0.0
+        return results
+
+    def score_cases(self, cases: List[Dict[str, Any]], k: int = DEFAULT_TOP,
+                    kinds: Optional[Iterable[str]] = None) -> List[CaseResult]:
+        """比對一批醫案"""
+        matrix = self.case_matrix(cases)
+        results = []
+        for i, (case, top) in enumerate(zip(cases, self.score_matrix(matrix, k, kinds))):
+            diagnosis = case.get("diagnosis") or {}
+            results.append(CaseResult(
+                case_id=case.get("id", f"#{i}"),
+                matches=[
+                    CaseMatch(self.columns[col]["id"], self.columns[col]["name"], self.columns[col]["kind"], round(s, 4))
+                    for col, s in top
+                ],
+                features=matrix.indptr[i + 1] - matrix.indptr[i],
+                expected=diagnosis.get("zhengxing_id")
+            ))
+        return results
+
+
+def iter_cases(path: Path) -> Iterator[Dict[str, Any]]:
+    """
+    讀取醫案：目錄（每檔一個醫案，排除 _ 開頭的結構定義檔）或 JSONL 檔（每行一個醫案）
+    無法解析的檔案或行以警告略過
+    """
+    if path.is_dir():
+        for file_path in entity_files(path):
+            try:
+                with open(file_path, 'r', encoding='utf-8') as f:
+                    yield json.load(f)
+            except (OSError, json.JSONDecodeError) as e:
+                print(f"⚠️  警告: 無法讀取 {file_path.name}: {e}")
+        return
+
+    with open(path, 'r', encoding='utf-8') as f:
+        for line_no, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError as e:
+                print(f"⚠️  警告: {path.name} 第 {line_no} 行無法解析: {e}")
+
+
+def iter_batches(items: Iterable[Dict[str, Any]], size: int) -> Iterator[List[Dict[str, Any]]]:
+    batch: List[Dict[str, Any]] = []
+    for item in items:
+        batch.append(item)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def main():
+    """主函數"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="以症狀向量的餘弦相似度比對醫案與證型/證候")
+    parser.add_argument(
+        "cases",
+        nargs="?",
+        help="醫案目錄或 JSONL 檔 (預設: <資料目錄>/cases)"
+    )
+    parser.add_argument(
+        "--data-dir",
+        default="data",
+        help="資料目錄路徑 (預設: data)"
+    )
+    parser.add_argument(
+        "-k", "--top",
+        type=int,
+        default=DEFAULT_TOP,
+        help=f"每個醫案回傳筆數 (預設: {DEFAULT_TOP})"
+    )
+    parser.add_argument(
+        "--kind",
+        choices=[KIND_ZHENGXING, KIND_SYNDROME],
+        help="只比對證型或證候"
+    )
+    parser.add_argument(
+        "--zhengsu",
+        action="store_true",
+        help="將醫案的證素分析（diagnosis.zhengsu_analysis）與證型/證候的證素組成納入向量"
+    )
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=DEFAULT_BATCH_SIZE,
+        help=f"每次矩陣乘積的醫案數 (預設: {DEFAULT_BATCH_SIZE})"
+    )
+    parser.add_argument(
+        "--output",
+        help="將結果以 JSONL 寫入指定路徑（不指定則列印摘要）"
+    )
+    add_jobs_arguments(parser)
+    add_cache_arguments(parser)
+
+    args = parser.parse_args()
+
+    # 確定資料目錄
+    script_dir = Path(__file__).parent
+    data_dir = script_dir.parent / args.data_dir
+
+    if not data_dir.exists():
+        print(f"錯誤: 資料目錄不存在: {data_dir}")
+        return 1
+
+    cases_path = script_dir.parent / args.cases if args.cases else data_dir / "cases"
+    if not cases_path.exists():
+        print(f"錯誤: 找不到醫案: {cases_path}")
+        return 1
+
+    cache = snapshot_cache_for(data_dir, args.no_cache, args.rebuild_cache)
+    corpus = load_corpus(data_dir, ["zhengxing", "syndromes", "symptoms"], args.jobs, args.pool, cache)
+
+    build_start = time.perf_counter()
+    matcher = CaseMatcher.from_corpus(corpus, use_zhengsu=args.zhengsu)
+    build_elapsed = time.perf_counter() - build_start
+    print(f"向量庫: {len(matcher)} 個證型/證候，{len(matcher.features)} 個特徵，"
+          f"非零元素 {matcher.matrix.nnz}，建構 {build_elapsed * 1000:.1f} ms")
+
+    kinds = [args.kind] if args.kind else None
+    output = open(script_dir.parent / args.output, 'w', encoding='utf-8') if args.output else None
+
+    total = 0
+    labelled = 0
+    top1 = 0
+    topk = 0
+    score_start = time.perf_counter()
+    try:
+        for batch in iter_batches(iter_cases(cases_path), args.batch_size):
+            for result in matcher.score_cases(batch, args.top, kinds):
+                total += 1
+                if result.expected:
+                    labelled += 1
+                    rank = result.expected_rank
+                    top1 += rank == 1
+                    topk += rank is not None
+
+                if output:
+                    output.write(json.dumps(result.to_json(), ensure_ascii=False) + "\n")
+                else:
+                    print(f"\n{result.case_id}（{result.features} 個特徵）")
+                    for rank, match in enumerate(result.matches, 1):
+                        kind = "證型" if match.kind == KIND_ZHENGXING else "證候"
+                        flag = " ✓" if result.expected and match.kind == KIND_ZHENGXING and match.id == result.expected else ""
+                        print(f"  {rank:>2}. [{kind}] {match.name} ({match.id})  {match.score:.3f}{flag}")
+    finally:
+        if output:
+            output.close()
+    score_elapsed = time.perf_counter() - score_start
+
+    rate = total / score_elapsed if score_elapsed else 0.0
+    print(f"\n✅ 已比對 {total} 個醫案，{score_elapsed * 1000:.1f} ms（{rate:.0f} 個/秒）")
+    if labelled:
+        print(f"   記錄證型命中: 第 1 名 {top1}/{labelled}，前 {args.top} 名 {topk}/{labelled}")
+    if output:
+        print(f"   結果: {script_dir.parent / args.output}")
+
+    return 0
+
+
+if __name__ == "__main__":
+    exit(main())
@@ -0,0 +1,325 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+語料載入模組
+一次讀取 data/ 下所有實體目錄，將解析結果交給各索引建構腳本與資料驗證器共用
+"""
+
+import json
+import os
+import pickle
+from pathlib import Path
+from typing import Dict, List, Any, Iterable, Optional, Tuple
+from dataclasses import dataclass, field
+
+
+# 實體名稱 → 相對於資料目錄的子目錄
+ENTITY_DIRS: Dict[str, str] = {
+    "zhengsu": "zhengsu",
+    "zhengxing": "zhengxing",
+    "syndromes": "zhenghou/syndromes",
+    "formulas": "formulas",
+    "herbs": "herbs",
+    "symptoms": "symptoms",
+    "diseases": "diseases",
+    "cases": "cases",
+}
+
+# ID → 實體資料
+EntityMap = Dict[str, Dict[str, Any]]
+
+# 平行讀取的池類型
+POOL_TYPES = ["thread", "process"]
+
+# (檔案路徑, 解析結果, 錯誤訊息)
+ReadResult = Tuple[Path, Optional[Any], Optional[str]]
+
+# 快照格式版本，格式變更時遞增以使舊快照失效
+SNAPSHOT_VERSION = 1
+
+
+@dataclass
+class Corpus:
+    """已解析的資料語料，各實體以 ID 為鍵"""
+    data_dir: Path
+    zhengsu: EntityMap = field(default_factory=dict)
+    zhengxing: EntityMap = field(default_factory=dict)
+    syndromes: EntityMap = field(default_factory=dict)
+    formulas: EntityMap = field(default_factory=dict)
+    herbs: EntityMap = field(default_factory=dict)
+    symptoms: EntityMap = field(default_factory=dict)
+    diseases: EntityMap = field(default_factory=dict)
+    cases: EntityMap = field(default_factory=dict)
+
+    loaded: List[str] = field(default_factory=list)
+    load_errors: Dict[str, List[str]] = field(default_factory=dict)
+    # 實體名稱 → 檔名 → (解析結果, 錯誤訊息)；供監看模式逐檔更新
+    file_records: Dict[str, Dict[str, Tuple[Optional[Any], Optional[str]]]] = field(default_factory=dict)
+    files_read: int = 0
+    files_cached: int = 0
+    cache_evicted: int = 0
+
+    def entities(self, name: str) -> EntityMap:
+        """按實體名稱取得 ID 映射"""
+        if name not in ENTITY_DIRS:
+            raise KeyError(f"未知的實體類型: {name}")
+        return getattr(self, name)
+
+
+def entity_files(entity_dir: Path) -> List[Path]:
+    """列出實體目錄下的資料檔案（排除 _ 開頭的結構定義檔），依檔名排序"""
+    if not entity_dir.exists():
+        return []
+    return sorted(
+        f for f in entity_dir.glob("*.json")
+        if not f.name.startswith("_")
+    )
+
+
+def read_json_file(path: Path) -> ReadResult:
+    """讀取單一 JSON 檔案，錯誤以訊息回傳而不拋出"""
+    try:
+        with open(path, 'r', encoding='utf-8') as fp:
+            return path, json.load(fp), None
+    except json.JSONDecodeError as e:
+        return path, None, f"JSON 解析錯誤: {path} - {e}"
+    except Exception as e:
+        return path, None, f"讀取檔案錯誤: {path} - {e}"
+
+
+def read_json_files(paths: List[Path], jobs: int = 1, pool: str = "thread") -> List[ReadResult]:
+    """
+    讀取多個 JSON 檔案
+    jobs > 1 時以執行緒池或行程池平行讀取；回傳順序與輸入順序一致，確保輸出可重現
+    """
+    paths = list(paths)
+    if jobs <= 1 or len(paths) <= 1:
+        return [read_json_file(p) for p in paths]
+
+    if pool not in POOL_TYPES:
+        raise ValueError(f"未知的池類型: {pool}")
+
+    # 延遲匯入：序列讀取（如查詢工具啟動）不需負擔載入執行池模組的成本
+    from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+    if pool == "process":
+        # 行程間傳遞有序列化成本，以較大的批次攤提
+        chunksize = max(1, len(paths) // (jobs * 4))
+        with ProcessPoolExecutor(max_workers=jobs) as executor:
+            return list(executor.map(read_json_file, paths, chunksize=chunksize))
+
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        return list(executor.map(read_json_file, paths))
+
+
+def default_jobs() -> int:
+    """預設的平行數（CPU 核心數）"""
+    return os.cpu_count() or 1
+
+
+def add_jobs_arguments(parser, help_text: str = "平行讀取 JSON 的工作數"):
+    """為命令列加入 --jobs / --pool 參數"""
+    parser.add_argument(
+        "--jobs", "-j",
+        type=int,
+        default=1,
+        help=f"{help_text} (預設: 1；本機核心數: {default_jobs()})"
+    )
+    parser.add_argument(
+        "--pool",
+        choices=POOL_TYPES,
+        default="thread",
+        help="平行讀取使用的池類型 (預設: thread)"
+    )
+
+
+class SnapshotCache:
+    """
+    解析結果快照快取
+    每個實體目錄一個快照檔，以來源檔案的檔名、大小、修改時間為鍵；
+    未變更的檔案直接取用快照，只有變更過的檔案才重新解析
+    """
+
+    def __init__(self, cache_dir: Path, rebuild: bool = False):
+        self.cache_dir = Path(cache_dir)
+        self.rebuild = rebuild
+
+    def snapshot_path(self, name: str) -> Path:
+        return self.cache_dir / f"corpus-{name}.pickle"
+
+    def load(self, name: str) -> Dict[str, Tuple[int, int, Any]]:
+        """讀取快照；不存在、版本不符或損壞時回傳空快照"""
+        path = self.snapshot_path(name)
+        if self.rebuild or not path.exists():
+            return {}
+        try:
+            with open(path, 'rb') as f:
+                snapshot = pickle.load(f)
+        except Exception:
+            return {}
+        if not isinstance(snapshot, dict) or snapshot.get("version") != SNAPSHOT_VERSION:
+            return {}
+        return snapshot.get("entries", {})
+
+    def save(self, name: str, entries: Dict[str, Tuple[int, int, Any]]):
+        """寫入快照（先寫暫存檔再替換，避免中斷時留下不完整的快照）"""
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        path = self.snapshot_path(name)
+        tmp_path = path.with_suffix(".tmp")
+        with open(tmp_path, 'wb') as f:
+            pickle.dump(
+                {"version": SNAPSHOT_VERSION, "entries": entries},
+                f, protocol=pickle.HIGHEST_PROTOCOL
+            )
+        os.replace(tmp_path, path)
+
+
+def read_with_snapshot(corpus: Corpus, name: str, files: List[Path], cache: SnapshotCache,
+                       jobs: int = 1, pool: str = "thread") -> List[ReadResult]:
+    """透過快照讀取實體檔案，並清除已刪除或已變更檔案的舊快照項目"""
+    snapshot = cache.load(name)
+    fresh: Dict[str, Tuple[int, int, Any]] = {}
+
+    results: List[Optional[ReadResult]] = []
+    stale: List[Tuple[int, Path, os.stat_result]] = []
+    for f in files:
+        st = f.stat()
+        entry = snapshot.get(f.name)
+        if entry is not None and entry[0] == st.st_size and entry[1] == st.st_mtime_ns:
+            fresh[f.name] = entry
+            results.append((f, entry[2], None))
+            corpus.files_cached += 1
+        else:
+            stale.append((len(results), f, st))
+            results.append(None)
+
+    parsed = read_json_files([f for _, f, _ in stale], jobs, pool)
+    for (pos, f, st), result in zip(stale, parsed):
+        results[pos] = result
+        corpus.files_read += 1
+        # 解析失敗的檔案不寫入快照，下次仍會重新解析並回報錯誤
+        if result[2] is None:
+            fresh[f.name] = (st.st_size, st.st_mtime_ns, result[1])
+
+    # 快照中不再對應到目前檔案版本的項目即為過期項目
+    evicted = sum(1 for key in snapshot if key not in fresh)
+    corpus.cache_evicted += evicted
+
+    if stale or evicted or not snapshot:
+        cache.save(name, fresh)
+
+    return results
+
+
+def add_cache_arguments(parser):
+    """為命令列加入 --no-cache / --rebuild-cache 參數"""
+    group = parser.add_mutually_exclusive_group()
+    group.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="不使用快照快取，所有檔案重新解析"
+    )
+    group.add_argument(
+        "--rebuild-cache",
+        action="store_true",
+        help="忽略既有快照，重新解析所有檔案並重建快照"
+    )
+
+
+def snapshot_cache_for(data_dir: Path, no_cache: bool = False,
+                       rebuild: bool = False) -> Optional[SnapshotCache]:
+    """依命令列選項建立資料目錄的快照快取（位於 data/.cache/）"""
+    if no_cache:
+        return None
+    return SnapshotCache(Path(data_dir) / ".cache", rebuild=rebuild)
+
+
+def load_entity_dir(corpus: Corpus, name: str, jobs: int = 1, pool: str = "thread",
+                    cache: Optional[SnapshotCache] = None):
+    """載入單一實體目錄到語料中"""
+    entity_dir = corpus.data_dir / ENTITY_DIRS[name]
+
+    files = entity_files(entity_dir)
+    if cache is not None:
+        results = read_with_snapshot(corpus, name, files, cache, jobs, pool)
+    else:
+        results = read_json_files(files, jobs, pool)
+        corpus.files_read += len(results)
+
+    records = corpus.file_records.setdefault(name, {})
+    records.clear()
+    for f, data, error in results:
+        if error:
+            print(f"警告: {error}")
+        records[f.name] = (data, error)
+
+    index_entity_records(corpus, name)
+    if name not in corpus.loaded:
+        corpus.loaded.append(name)
+
+
+def index_entity_records(corpus: Corpus, name: str):
+    """依檔名順序由逐檔紀錄重建實體的 ID 映射與載入錯誤"""
+    entity_map = corpus.entities(name)
+    errors = corpus.load_errors.setdefault(name, [])
+    entity_map.clear()
+    errors.clear()
+
+    records = corpus.file_records.get(name, {})
+    for file_name in sorted(records):
+        data, error = records[file_name]
+        if error:
+            errors.append(error)
+            continue
+
+        # 無 ID 的檔案（如 syndromes/index.json）不屬於實體資料
+        if isinstance(data, dict) and "id" in data:
+            entity_map[data["id"]] = data
+
+
+def update_entity_files(corpus: Corpus, name: str, changed: List[Path], removed: Iterable[str],
+                        jobs: int = 1, pool: str = "thread"):
+    """
+    只重新解析變更的檔案並更新語料中的實體
+    ID 映射依檔名順序重建，結果與重新完整載入相同
+    """
+    records = corpus.file_records.setdefault(name, {})
+    for file_name in removed:
+        records.pop(file_name, None)
+
+    for f, data, error in read_json_files(changed, jobs, pool):
+        if error:
+            print(f"警告: {error}")
+        records[f.name] = (data, error)
+    corpus.files_read += len(changed)
+
+    index_entity_records(corpus, name)
+
+
+def load_corpus(data_dir: Path, entities: Optional[Iterable[str]] = None,
+                jobs: int = 1, pool: str = "thread",
+                cache: Optional[SnapshotCache] = None) -> Corpus:
+    """
+    載入資料語料
+    entities 為 None 時載入所有實體目錄，否則只載入指定的實體
+    """
+    corpus = Corpus(data_dir=Path(data_dir))
+
+    names = list(ENTITY_DIRS) if entities is None else list(entities)
+    for name in names:
+        load_entity_dir(corpus, name, jobs, pool, cache)
+
+    return corpus
+
+
+def ensure_corpus(data_dir: Path, corpus: Optional[Corpus], entities: Iterable[str],
+                  jobs: int = 1, pool: str = "thread",
+                  cache: Optional[SnapshotCache] = None) -> Corpus:
+    """確保語料已載入所需的實體；未提供語料時只載入所需部分"""
+    if corpus is None:
+        return load_corpus(data_dir, entities, jobs, pool, cache)
+
+    for name in entities:
+        if name not in corpus.loaded:
+            load_entity_dir(corpus, name, jobs, pool, cache)
+    return corpus
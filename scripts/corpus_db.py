@@ -0,0 +1,608 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+語料資料庫編譯腳本
+將 data/ 下的證素、證型、證候、症狀、方劑、中藥編譯為單一 SQLite 資料庫，
+以正規化的關聯表支援索引查詢，並以 FTS5 對證候的概述、鑑別分析與文獻建立全文索引
+輸出: data/indexes/tcm.db
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+from pathlib import Path
+from typing import Dict, List, Any, Iterable, Optional, Tuple
+from datetime import datetime
+
+from corpus import (
+    Corpus, ENTITY_DIRS, ensure_corpus, load_corpus, entity_files,
+    add_jobs_arguments, add_cache_arguments, snapshot_cache_for
+)
+from extract_symptoms import parse_clinical_manifestations
+
+
+DB_VERSION = 2
+DEFAULT_DB_PATH = Path("indexes") / "tcm.db"
+
+DB_ENTITIES = ["zhengsu", "zhengxing", "syndromes", "symptoms", "formulas", "herbs"]
+
+# trigram 分詞器以三字為單位建索引，較短的查詢改以 LIKE 比對
+FTS_MIN_QUERY_LENGTH = 3
+
+SCHEMA = """
+CREATE TABLE meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+
+CREATE TABLE zhengsu (
+    id TEXT PRIMARY KEY,
+    name TEXT NOT NULL,
+    category TEXT,
+    subcategory TEXT,
+    treatment TEXT,
+    is_critical INTEGER NOT NULL DEFAULT 0,
+    description TEXT,
+    data TEXT NOT NULL
+);
+
+CREATE TABLE zhengxing (
+    id TEXT PRIMARY KEY,
+    name TEXT NOT NULL,
+    description TEXT,
+    tongue TEXT,
+    pulse TEXT,
+    data TEXT NOT NULL
+);
+
+CREATE TABLE zhengxing_zhengsu (
+    zhengxing_id TEXT NOT NULL REFERENCES zhengxing(id),
+    zhengsu_id TEXT NOT NULL,
+    role TEXT NOT NULL
+);
+CREATE INDEX idx_zhengxing_zhengsu ON zhengxing_zhengsu(zhengsu_id);
+
+CREATE TABLE zhengxing_symptoms (
+    zhengxing_id TEXT NOT NULL REFERENCES zhengxing(id),
+    symptom TEXT NOT NULL,
+    relevance TEXT NOT NULL
+);
+CREATE INDEX idx_zhengxing_symptoms ON zhengxing_symptoms(symptom);
+
+CREATE TABLE syndromes (
+    id TEXT PRIMARY KEY,
+    number INTEGER,
+    name TEXT NOT NULL,
+    category TEXT,
+    overview TEXT,
+    clinical_manifestations TEXT,
+    self_analysis TEXT,
+    type_comparison TEXT,
+    literature TEXT,
+    data TEXT NOT NULL
+);
+CREATE INDEX idx_syndromes_name ON syndromes(name);
+CREATE INDEX idx_syndromes_category ON syndromes(category);
+
+CREATE TABLE syndrome_zhengsu (
+    syndrome_id TEXT NOT NULL REFERENCES syndromes(id),
+    zhengsu_id TEXT NOT NULL,
+    role TEXT NOT NULL
+);
+CREATE INDEX idx_syndrome_zhengsu ON syndrome_zhengsu(zhengsu_id, syndrome_id);
+
+CREATE TABLE syndrome_symptoms (
+    syndrome_id TEXT NOT NULL REFERENCES syndromes(id),
+    symptom TEXT NOT NULL
+);
+CREATE INDEX idx_syndrome_symptoms ON syndrome_symptoms(symptom);
+
+CREATE TABLE syndrome_diseases (
+    syndrome_id TEXT NOT NULL REFERENCES syndromes(id),
+    disease TEXT NOT NULL
+);
+CREATE INDEX idx_syndrome_diseases ON syndrome_diseases(disease);
+
+CREATE TABLE symptoms (
+    id TEXT PRIMARY KEY,
+    name TEXT NOT NULL,
+    category TEXT,
+    description TEXT,
+    data TEXT NOT NULL
+);
+CREATE INDEX idx_symptoms_name ON symptoms(name);
+
+CREATE TABLE symptom_aliases (
+    symptom_id TEXT NOT NULL REFERENCES symptoms(id),
+    alias TEXT NOT NULL
+);
+CREATE INDEX idx_symptom_aliases ON symptom_aliases(alias);
+
+CREATE TABLE symptom_zhengsu (
+    symptom_id TEXT NOT NULL REFERENCES symptoms(id),
+    group_no INTEGER NOT NULL,
+    zhengsu_id TEXT NOT NULL,
+    weight TEXT,
+    context TEXT
+);
+CREATE INDEX idx_symptom_zhengsu ON symptom_zhengsu(zhengsu_id);
+
+CREATE TABLE formulas (
+    id TEXT PRIMARY KEY,
+    name TEXT NOT NULL,
+    pinyin TEXT,
+    source TEXT,
+    category TEXT,
+    indications TEXT,
+    data TEXT NOT NULL
+);
+CREATE INDEX idx_formulas_name ON formulas(name);
+
+CREATE TABLE formula_herbs (
+    formula_id TEXT NOT NULL REFERENCES formulas(id),
+    position INTEGER NOT NULL,
+    herb_id TEXT,
+    name TEXT,
+    amount TEXT,
+    role TEXT,
+    is_guide INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX idx_formula_herbs ON formula_herbs(herb_id);
+
+CREATE TABLE herbs (
+    id TEXT PRIMARY KEY,
+    name TEXT NOT NULL,
+    pinyin TEXT,
+    category TEXT,
+    nature TEXT,
+    dosage TEXT,
+    data TEXT NOT NULL
+);
+CREATE INDEX idx_herbs_name ON herbs(name);
+
+CREATE TABLE herb_meridians (
+    herb_id TEXT NOT NULL REFERENCES herbs(id),
+    meridian TEXT NOT NULL
+);
+CREATE INDEX idx_herb_meridians ON herb_meridians(meridian);
+
+CREATE TABLE herb_functions (
+    herb_id TEXT NOT NULL REFERENCES herbs(id),
+    position INTEGER NOT NULL,
+    treatment TEXT,
+    prerequisite TEXT
+);
+CREATE INDEX idx_herb_functions ON herb_functions(treatment);
+
+CREATE TABLE herb_function_zhengsu (
+    herb_id TEXT NOT NULL REFERENCES herbs(id),
+    position INTEGER NOT NULL,
+    zhengsu_id TEXT NOT NULL
+);
+CREATE INDEX idx_herb_function_zhengsu ON herb_function_zhengsu(zhengsu_id);
+
+CREATE VIRTUAL TABLE syndrome_fts USING fts5(
+    id UNINDEXED,
+    overview,
+    self_analysis,
+    literature,
+    tokenize = 'trigram'
+);
+"""
+
+
+def dumps(data: Any) -> str:
+    """序列化原始 JSON（查詢端直接還原為與讀檔相同的字典）"""
+    return json.dumps(data, ensure_ascii=False, separators=(",", ":"))
+
+
+def source_state(data_dir: Path, entities: Iterable[str] = DB_ENTITIES) -> str:
+    """以來源檔案的路徑、大小與修改時間計算狀態摘要（只取檔案狀態，不讀取內容）"""
+    digest = hashlib.sha256()
+    for name in entities:
+        for f in entity_files(data_dir / ENTITY_DIRS[name]):
+            st = f.stat()
+            digest.update(f"{f.relative_to(data_dir).as_posix()}\0{st.st_size}\0{st.st_mtime_ns}\n".encode('utf-8'))
+    return digest.hexdigest()
+
+
+def insert_zhengsu(conn: sqlite3.Connection, zhengsu_data: Dict[str, Dict]):
+    """寫入證素"""
+    conn.executemany(
+        "INSERT INTO zhengsu VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+        [
+            (zs_id, data.get("name", ""), data.get("category"), data.get("subcategory"),
+             data.get("treatment"), int(bool(data.get("is_critical"))), data.get("description"), dumps(data))
+            for zs_id, data in zhengsu_data.items()
+        ]
+    )
+
+
+def insert_zhengxing(conn: sqlite3.Connection, zhengxing_data: Dict[str, Dict]):
+    """寫入證型及其證素組成、主次症"""
+    for zx_id, data in zhengxing_data.items():
+        symptoms = data.get("symptoms", {})
+        conn.execute(
+            "INSERT INTO zhengxing VALUES (?, ?, ?, ?, ?, ?)",
+            (zx_id, data.get("name", ""), data.get("description"),
+             symptoms.get("tongue"), symptoms.get("pulse"), dumps(data))
+        )
+
+        comp = data.get("zhengsu_composition", {})
+        conn.executemany(
+            "INSERT INTO zhengxing_zhengsu VALUES (?, ?, ?)",
+            [(zx_id, zs_id, role) for role in ["location", "nature"] for zs_id in comp.get(role, [])]
+        )
+
+        rows = []
+        for key, relevance in [("main", "主症"), ("primary", "主症"), ("secondary", "次症")]:
+            for symptom in symptoms.get(key, []):
+                if isinstance(symptom, str) and symptom.strip():
+                    rows.append((zx_id, symptom.strip(), relevance))
+        conn.executemany("INSERT INTO zhengxing_symptoms VALUES (?, ?, ?)", rows)
+
+
+def insert_syndromes(conn: sqlite3.Connection, syndrome_data: Dict[str, Dict]):
+    """寫入證候、證素組成、臨床表現症狀、常見疾病與全文索引"""
+    for zh_id, data in syndrome_data.items():
+        differential = data.get("differential", {})
+        if not isinstance(differential, dict):
+            differential = {}
+        overview = data.get("overview", "")
+        self_analysis = differential.get("self_analysis", "")
+        literature = data.get("literature", "")
+
+        conn.execute(
+            "INSERT INTO syndromes VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (zh_id, data.get("number"), data.get("name", ""), data.get("category"),
+             overview, data.get("clinical_manifestations", ""), self_analysis,
+             differential.get("type_comparison", ""), literature, dumps(data))
+        )
+        conn.execute(
+            "INSERT INTO syndrome_fts (id, overview, self_analysis, literature) VALUES (?, ?, ?, ?)",
+            (zh_id, overview, self_analysis, literature)
+        )
+
+        comp = data.get("zhengsu_composition", {})
+        conn.executemany(
+            "INSERT INTO syndrome_zhengsu VALUES (?, ?, ?)",
+            [(zh_id, zs_id, role) for role in ["location", "nature"] for zs_id in comp.get(role, [])]
+        )
+
+        clinical = data.get("clinical_manifestations", "")
+        symptoms = parse_clinical_manifestations(clinical) if clinical else []
+        conn.executemany(
+            "INSERT INTO syndrome_symptoms VALUES (?, ?)",
+            [(zh_id, s) for s in dict.fromkeys(symptoms)]
+        )
+
+        conn.executemany(
+            "INSERT INTO syndrome_diseases VALUES (?, ?)",
+            [(zh_id, d.strip("“”\"")) for d in data.get("common_diseases", []) if isinstance(d, str)]
+        )
+
+
+def insert_symptoms(conn: sqlite3.Connection, symptom_data: Dict[str, Dict]):
+    """寫入症狀、別名與相關證素"""
+    for sym_id, data in symptom_data.items():
+        conn.execute(
+            "INSERT INTO symptoms VALUES (?, ?, ?, ?, ?)",
+            (sym_id, data.get("name", ""), data.get("category"), data.get("description"), dumps(data))
+        )
+        conn.executemany(
+            "INSERT INTO symptom_aliases VALUES (?, ?)",
+            [(sym_id, alias) for alias in data.get("alias", [])]
+        )
+        rows = []
+        for group_no, related in enumerate(data.get("related_zhengsu", [])):
+            for zs_id in related.get("zhengsu_ids", []):
+                rows.append((sym_id, group_no, zs_id, related.get("weight"), related.get("context")))
+        conn.executemany("INSERT INTO symptom_zhengsu VALUES (?, ?, ?, ?, ?)", rows)
+
+
+def insert_formulas(conn: sqlite3.Connection, formula_data: Dict[str, Dict]):
+    """寫入方劑及其組成"""
+    for fm_id, data in formula_data.items():
+        indications = data.get("indications", "")
+        if isinstance(indications, list):
+            indications = "、".join(indications)
+        conn.execute(
+            "INSERT INTO formulas VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (fm_id, data.get("name", ""), data.get("pinyin"), data.get("source"),
+             data.get("category"), indications, dumps(data))
+        )
+        conn.executemany(
+            "INSERT INTO formula_herbs VALUES (?, ?, ?, ?, ?, ?, ?)",
+            [
+                (fm_id, position, item.get("herb_id"), item.get("name"), item.get("amount"),
+                 item.get("role"), int(bool(item.get("is_guide"))))
+                for position, item in enumerate(data.get("composition", []))
+            ]
+        )
+
+
+def insert_herbs(conn: sqlite3.Connection, herb_data: Dict[str, Dict]):
+    """寫入中藥、歸經與功效證素"""
+    for herb_id, data in herb_data.items():
+        properties = data.get("properties", {})
+        conn.execute(
+            "INSERT INTO herbs VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (herb_id, data.get("name", ""), data.get("pinyin"), data.get("category"),
+             properties.get("nature"), data.get("dosage"), dumps(data))
+        )
+        conn.executemany(
+            "INSERT INTO herb_meridians VALUES (?, ?)",
+            [(herb_id, m) for m in properties.get("meridians", [])]
+        )
+        for position, func in enumerate(data.get("functions", [])):
+            conn.execute(
+                "INSERT INTO herb_functions VALUES (?, ?, ?, ?)",
+                (herb_id, position, func.get("treatment"), func.get("prerequisite"))
+            )
+            conn.executemany(
+                "INSERT INTO herb_function_zhengsu VALUES (?, ?, ?)",
+                [(herb_id, position, zs_id) for zs_id in func.get("zhengsu", [])]
+            )
+
+
+def compile_database(data_dir: Path, db_path: Path, corpus: Optional[Corpus] = None) -> Dict[str, int]:
+    """
+    編譯語料資料庫
+    先寫入暫存檔再替換，編譯期間查詢端仍可讀取舊資料庫
+    """
+    corpus = ensure_corpus(data_dir, corpus, DB_ENTITIES)
+    state = source_state(data_dir)
+
+    db_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = db_path.with_suffix(".tmp")
+    if tmp_path.exists():
+        tmp_path.unlink()
+
+    conn = sqlite3.connect(str(tmp_path))
+    try:
+        conn.executescript(SCHEMA)
+        with conn:
+            print("正在寫入證素...")
+            insert_zhengsu(conn, corpus.zhengsu)
+            print("正在寫入證型...")
+            insert_zhengxing(conn, corpus.zhengxing)
+            print("正在寫入證候與全文索引...")
+            insert_syndromes(conn, corpus.syndromes)
+            print("正在寫入症狀...")
+            insert_symptoms(conn, corpus.symptoms)
+            print("正在寫入方劑與中藥...")
+            insert_formulas(conn, corpus.formulas)
+            insert_herbs(conn, corpus.herbs)
+
+            conn.executemany("INSERT INTO meta VALUES (?, ?)", [
+                ("version", str(DB_VERSION)),
+                ("compiled_at", datetime.now().isoformat()),
+                ("source_state", state),
+            ])
+
+        conn.execute("INSERT INTO syndrome_fts (syndrome_fts) VALUES ('optimize')")
+        conn.commit()
+        conn.execute("VACUUM")
+    finally:
+        conn.close()
+
+    os.replace(tmp_path, db_path)
+
+    return {
+        name: len(corpus.entities(name)) for name in DB_ENTITIES
+    }
+
+
+# ── 查詢 ──────────────────────────────────────────────
+
+
+def default_db_path(data_dir: Path) -> Path:
+    """資料目錄下的預設資料庫路徑"""
+    return Path(data_dir) / DEFAULT_DB_PATH
+
+
+def connect(db_path: Path) -> sqlite3.Connection:
+    """以唯讀方式開啟資料庫；版本不符時拋出 ValueError"""
+    db_path = Path(db_path)
+    if not db_path.exists():
+        raise FileNotFoundError(f"找不到資料庫: {db_path}（請先執行 scripts/corpus_db.py 編譯）")
+
+    conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+    conn.row_factory = sqlite3.Row
+    version = conn.execute("SELECT value FROM meta WHERE key = 'version'").fetchone()
+    if not version or int(version["value"]) != DB_VERSION:
+        conn.close()
+        raise ValueError(f"資料庫版本不符，請重新編譯: {db_path}")
+    return conn
+
+
+def is_stale(conn: sqlite3.Connection, data_dir: Path) -> bool:
+    """來源檔案在編譯後是否有新增、刪除或修改"""
+    row = conn.execute("SELECT value FROM meta WHERE key = 'source_state'").fetchone()
+    return not row or row["value"] != source_state(Path(data_dir))
+
+
+def _load_rows(rows: Iterable[sqlite3.Row]) -> List[Dict]:
+    return [json.loads(row["data"]) for row in rows]
+
+
+def herbs_by_meridian(conn: sqlite3.Connection, meridian: str) -> List[Dict]:
+    """按歸經查詢中藥"""
+    return _load_rows(conn.execute(
+        "SELECT h.data FROM herbs h WHERE h.id IN "
+        "(SELECT herb_id FROM herb_meridians WHERE meridian = ?) ORDER BY h.rowid",
+        (meridian,)
+    ))
+
+
+def herbs_by_zhengsu(conn: sqlite3.Connection, zhengsu_id: str) -> List[Dict]:
+    """按功效證素查詢中藥"""
+    return _load_rows(conn.execute(
+        "SELECT h.data FROM herbs h WHERE h.id IN "
+        "(SELECT herb_id FROM herb_function_zhengsu WHERE zhengsu_id = ?) ORDER BY h.rowid",
+        (zhengsu_id,)
+    ))
+
+
+def herbs_by_treatment(conn: sqlite3.Connection, treatment: str) -> List[Dict]:
+    """按治法查詢中藥"""
+    return _load_rows(conn.execute(
+        "SELECT h.data FROM herbs h WHERE h.id IN "
+        "(SELECT herb_id FROM herb_functions WHERE treatment = ?) ORDER BY h.rowid",
+        (treatment,)
+    ))
+
+
+def list_herb_meridians(conn: sqlite3.Connection) -> List[str]:
+    return [row[0] for row in conn.execute("SELECT DISTINCT meridian FROM herb_meridians ORDER BY meridian")]
+
+
+def list_herb_zhengsu(conn: sqlite3.Connection) -> List[str]:
+    return [row[0] for row in conn.execute("SELECT DISTINCT zhengsu_id FROM herb_function_zhengsu ORDER BY zhengsu_id")]
+
+
+def list_herb_treatments(conn: sqlite3.Connection) -> List[str]:
+    return [row[0] for row in conn.execute(
+        "SELECT DISTINCT treatment FROM herb_functions WHERE treatment IS NOT NULL AND treatment != '' "
+        "ORDER BY treatment"
+    )]
+
+
+def count_rows(conn: sqlite3.Connection, table: str) -> int:
+    """資料表筆數"""
+    return conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+
+
+def zhengsu_map(conn: sqlite3.Connection) -> Dict[str, Dict]:
+    """證素 ID → 證素資料"""
+    return {row["id"]: json.loads(row["data"]) for row in conn.execute("SELECT id, data FROM zhengsu")}
+
+
+def get_syndrome(conn: sqlite3.Connection, key: str) -> Optional[Dict]:
+    """以 ID 或名稱取得證候"""
+    row = conn.execute(
+        "SELECT data FROM syndromes WHERE id = ? OR name = ? LIMIT 1", (key, key)
+    ).fetchone()
+    return json.loads(row["data"]) if row else None
+
+
+def _fts_query(text: str) -> str:
+    """將以空白分隔的關鍵詞轉為 FTS5 片語查詢（各詞皆須出現）"""
+    terms = text.split()
+    return " AND ".join('"' + term.replace('"', '""') + '"' for term in terms)
+
+
+def search_syndromes(conn: sqlite3.Connection, text: str, limit: int = 20) -> List[Tuple[str, str, str]]:
+    """
+    全文搜尋證候的概述、鑑別分析與文獻，回傳 (ID, 名稱, 摘錄)
+    每個關鍵詞至少三字時以 FTS5 依相關度排序，否則退回 LIKE 比對
+    """
+    terms = text.split()
+    if not terms:
+        return []
+
+    if all(len(term) >= FTS_MIN_QUERY_LENGTH for term in terms):
+        rows = conn.execute(
+            "SELECT f.id, s.name, snippet(syndrome_fts, -1, '【', '】', '…', 24) AS excerpt "
+            "FROM syndrome_fts f JOIN syndromes s ON s.id = f.id "
+            "WHERE syndrome_fts MATCH ? ORDER BY bm25(syndrome_fts) LIMIT ?",
+            (_fts_query(text), limit)
+        )
+        return [(row["id"], row["name"], row["excerpt"]) for row in rows]
+
+    conditions = " AND ".join(
+        "(overview LIKE ? OR self_analysis LIKE ? OR literature LIKE ?)" for _ in terms
+    )
+    params: List[Any] = []
+    for term in terms:
+        params.extend([f"%{term}%"] * 3)
+    rows = conn.execute(
+        f"SELECT id, name, overview FROM syndromes WHERE {conditions} ORDER BY number LIMIT ?",
+        params + [limit]
+    )
+    results = []
+    for row in rows:
+        overview = row["overview"] or ""
+        pos = overview.find(terms[0])
+        excerpt = overview[max(0, pos - 12):pos + 24] if pos >= 0 else overview[:36]
+        results.append((row["id"], row["name"], excerpt.replace(terms[0], f"【{terms[0]}】")))
+    return results
+
+
+def syndromes_by_zhengsu(conn: sqlite3.Connection, zhengsu_ids: List[str]) -> List[Tuple[str, str]]:
+    """查詢證素組成包含所有指定證素的證候，回傳 (ID, 名稱)"""
+    if not zhengsu_ids:
+        return []
+    placeholders = ", ".join("?" for _ in zhengsu_ids)
+    rows = conn.execute(
+        "SELECT s.id, s.name FROM syndromes s JOIN ("
+        f"  SELECT syndrome_id FROM syndrome_zhengsu WHERE zhengsu_id IN ({placeholders})"
+        "  GROUP BY syndrome_id HAVING COUNT(DISTINCT zhengsu_id) = ?"
+        ") m ON m.syndrome_id = s.id ORDER BY s.number",
+        list(zhengsu_ids) + [len(set(zhengsu_ids))]
+    )
+    return [(row["id"], row["name"]) for row in rows]
+
+
+def syndromes_by_symptom(conn: sqlite3.Connection, symptom: str) -> List[Tuple[str, str]]:
+    """查詢臨床表現中含指定症狀的證候，回傳 (ID, 名稱)"""
+    rows = conn.execute(
+        "SELECT s.id, s.name FROM syndromes s WHERE s.id IN "
+        "(SELECT syndrome_id FROM syndrome_symptoms WHERE symptom = ?) ORDER BY s.number",
+        (symptom,)
+    )
+    return [(row["id"], row["name"]) for row in rows]
+
+
+def syndromes_by_category(conn: sqlite3.Connection, category: str) -> List[Tuple[str, str]]:
+    """按分類查詢證候，回傳 (ID, 名稱)"""
+    rows = conn.execute(
+        "SELECT id, name FROM syndromes WHERE category = ? ORDER BY number", (category,)
+    )
+    return [(row["id"], row["name"]) for row in rows]
+
+
+def main():
+    """主函數"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="將資料目錄編譯為 SQLite 資料庫（含 FTS5 全文索引）")
+    parser.add_argument(
+        "--data-dir",
+        default="data",
+        help="資料目錄路徑 (預設: data)"
+    )
+    parser.add_argument(
+        "--output",
+        default=f"data/{DEFAULT_DB_PATH.as_posix()}",
+        help="輸出資料庫路徑"
+    )
+    add_jobs_arguments(parser)
+    add_cache_arguments(parser)
+
+    args = parser.parse_args()
+
+    # 確定資料目錄
+    script_dir = Path(__file__).parent
+    data_dir = script_dir.parent / args.data_dir
+    output_path = script_dir.parent / args.output
+
+    if not data_dir.exists():
+        print(f"錯誤: 資料目錄不存在: {data_dir}")
+        return 1
+
+    cache = snapshot_cache_for(data_dir, args.no_cache, args.rebuild_cache)
+    corpus = load_corpus(data_dir, DB_ENTITIES, args.jobs, args.pool, cache)
+    counts = compile_database(data_dir, output_path, corpus)
+
+    print(f"\n✅ 資料庫已編譯: {output_path}")
+    for name, count in counts.items():
+        print(f"   {name}: {count}")
+    print(f"   檔案大小: {output_path.stat().st_size / 1024:.0f} KB")
+
+    return 0
+
+
+if __name__ == "__main__":
+    exit(main())
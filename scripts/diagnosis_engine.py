@@ -0,0 +1,305 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+多症狀辨證排序引擎
+以證型的主症/次症/舌象/脈象與證候的臨床表現建立倒排索引，
+對一組觀察到的症狀以 BM25 計分（主症命中權重高於次症），以堆積取前 k 名證型/證候
+"""
+
+import heapq
+import math
+import time
+from array import array
+from pathlib import Path
+from typing import Dict, List, Iterable, Optional, Tuple
+from dataclasses import dataclass, field
+
+from corpus import Corpus, load_corpus, add_jobs_arguments, add_cache_arguments, snapshot_cache_for
+from extract_symptoms import parse_clinical_manifestations
+
+
+# 各欄位命中時的詞頻權重
+FIELD_WEIGHTS: Dict[str, float] = {
+    "main": 2.0,        # 主症
+    "secondary": 1.0,   # 次症
+    "tongue": 1.0,      # 舌象
+    "pulse": 1.0,       # 脈象
+    "clinical": 1.0,    # 證候臨床表現
+}
+
+# 證型主症的欄位名稱（部分證型檔案使用 primary）
+MAIN_FIELDS = ["main", "primary"]
+
+# BM25 參數
+DEFAULT_K1 = 1.2
+DEFAULT_B = 0.75
+
+# 文件類型
+KIND_ZHENGXING = "zhengxing"
+KIND_SYNDROME = "syndrome"
+
+# 症狀文字前後需去除的標點
+STRIP_CHARS = " \t\r\n。．.，,；;、"
+
+
+def normalize_symptom(text: str) -> str:
+    """正規化症狀文字（去除前後空白與標點）"""
+    return text.strip(STRIP_CHARS)
+
+
+@dataclass
+class DiagnosisDocument:
+    """可被檢索的證型或證候：詞 → 加權詞頻"""
+    id: str
+    name: str
+    kind: str
+    terms: Dict[str, float] = field(default_factory=dict)
+
+    def add_term(self, term: str, field_name: str, aliases: Optional[Dict[str, str]] = None):
+        term = normalize_symptom(term)
+        if aliases:
+            term = aliases.get(term, term)
+        if term:
+            self.terms[term] = self.terms.get(term, 0.0) + FIELD_WEIGHTS[field_name]
+
+
+@dataclass
+class DiagnosisHit:
+    """檢索結果"""
+    id: str
+    name: str
+    kind: str
+    score: float
+    matched: List[str]
+
+
+def resolve_symptom_names(corpus: Corpus) -> Dict[str, str]:
+    """症狀 ID（如 symptom_qiduan）→ 症狀名稱"""
+    return {sym_id: data.get("name", sym_id) for sym_id, data in corpus.symptoms.items()}
+
+
+def build_documents(corpus: Corpus) -> List[DiagnosisDocument]:
+    """由語料建立證型與證候文件（症狀別名統一為正式名稱，與查詢端一致）"""
+    symptom_names = resolve_symptom_names(corpus)
+    aliases = build_aliases(corpus)
+    documents: List[DiagnosisDocument] = []
+
+    for zx_id, data in corpus.zhengxing.items():
+        doc = DiagnosisDocument(zx_id, data.get("name", ""), KIND_ZHENGXING)
+        symptoms = data.get("symptoms", {})
+        for field_name in MAIN_FIELDS + ["secondary"]:
+            weight_field = "main" if field_name in MAIN_FIELDS else field_name
+            for symptom in symptoms.get(field_name, []):
+                if isinstance(symptom, str):
+                    doc.add_term(symptom_names.get(symptom, symptom), weight_field, aliases)
+        for field_name in ["tongue", "pulse"]:
+            value = symptoms.get(field_name)
+            if isinstance(value, str):
+                doc.add_term(value, field_name, aliases)
+        documents.append(doc)
+
+    for zh_id, data in corpus.syndromes.items():
+        doc = DiagnosisDocument(zh_id, data.get("name", ""), KIND_SYNDROME)
+        clinical = data.get("clinical_manifestations", "")
+        if clinical:
+            for symptom in dict.fromkeys(parse_clinical_manifestations(clinical)):
+                doc.add_term(symptom, "clinical", aliases)
+        documents.append(doc)
+
+    return documents
+
+
+def build_aliases(corpus: Corpus) -> Dict[str, str]:
+    """症狀別名 → 正式名稱（查詢時統一為索引中使用的名稱）"""
+    aliases: Dict[str, str] = {}
+    for data in corpus.symptoms.values():
+        name = data.get("name")
+        if not name:
+            continue
+        for alias in data.get("alias", []):
+            aliases.setdefault(normalize_symptom(alias), name)
+    return aliases
+
+
+class DiagnosisEngine:
+    """
+    BM25 倒排索引
+    查詢詞的詞頻恆為 1，因此每個 (詞, 文件) 的分數貢獻與查詢無關，
+    建構時即預先算好；查詢時只需累加命中詞的倒排串列並以堆積取前 k 名
+    """
+
+    def __init__(self, documents: List[DiagnosisDocument], aliases: Optional[Dict[str, str]] = None,
+                 k1: float = DEFAULT_K1, b: float = DEFAULT_B):
+        self.ids = [doc.id for doc in documents]
+        self.names = [doc.name for doc in documents]
+        self.kinds = [doc.kind for doc in documents]
+        self.doc_terms: List[Tuple[str, ...]] = [tuple(doc.terms) for doc in documents]
+        self.aliases = aliases or {}
+        self.k1 = k1
+        self.b = b
+
+        total = len(documents)
+        lengths = [sum(doc.terms.values()) for doc in documents]
+        avg_length = (sum(lengths) / total) if total else 0.0
+
+        doc_freq: Dict[str, int] = {}
+        for doc in documents:
+            for term in doc.terms:
+                doc_freq[term] = doc_freq.get(term, 0) + 1
+
+        self.postings: Dict[str, Tuple[array, array]] = {}
+        for doc_no, doc in enumerate(documents):
+            norm = k1 * (1 - b + b * lengths[doc_no] / avg_length) if avg_length else k1
+            for term, tf in doc.terms.items():
+                df = doc_freq[term]
+                idf = math.log(1 + (total - df + 0.5) / (df + 0.5))
+                impact = idf * tf * (k1 + 1) / (tf + norm)
+                posting = self.postings.get(term)
+                if posting is None:
+                    posting = self.postings[term] = (array('i'), array('d'))
+                posting[0].append(doc_no)
+                posting[1].append(impact)
+
+    @classmethod
+    def from_corpus(cls, corpus: Corpus, **kwargs) -> "DiagnosisEngine":
+        return cls(build_documents(corpus), build_aliases(corpus), **kwargs)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def query_terms(self, symptoms: Iterable[str]) -> List[str]:
+        """正規化查詢症狀並套用別名，去除重複"""
+        terms = []
+        for symptom in symptoms:
+            term = normalize_symptom(symptom)
+            term = self.aliases.get(term, term)
+            if term and term not in terms:
+                terms.append(term)
+        return terms
+
+    def score(self, terms: List[str]) -> Dict[int, float]:
+        """累加各查詢詞的分數貢獻：文件序號 → 分數"""
+        scores: Dict[int, float] = {}
+        get = scores.get
+        for term in terms:
+            posting = self.postings.get(term)
+            if posting is None:
+                continue
+            for doc_no, impact in zip(*posting):
+                scores[doc_no] = get(doc_no, 0.0) + impact
+        return scores
+
+    def search(self, symptoms: Iterable[str], k: int = 10,
+               kinds: Optional[Iterable[str]] = None) -> List[DiagnosisHit]:
+        """回傳分數最高的 k 個證型/證候（同分時依建立順序）"""
+        terms = self.query_terms(symptoms)
+        scores = self.score(terms)
+
+        items: Iterable[Tuple[int, float]] = scores.items()
+        if kinds is not None:
+            allowed = set(kinds)
+            items = [(doc_no, s) for doc_no, s in items if self.kinds[doc_no] in allowed]
+
+        top = heapq.nlargest(k, items, key=lambda item: (item[1], -item[0]))
+        return [self.hit(doc_no, s, terms) for doc_no, s in top]
+
+    def hit(self, doc_no: int, score: float, terms: List[str]) -> DiagnosisHit:
+        """組出單筆檢索結果（含命中的查詢症狀）"""
+        doc_terms = set(self.doc_terms[doc_no])
+        return DiagnosisHit(
+            id=self.ids[doc_no],
+            name=self.names[doc_no],
+            kind=self.kinds[doc_no],
+            score=round(score, 4),
+            matched=[t for t in terms if t in doc_terms]
+        )
+
+
+def replicate_documents(documents: List[DiagnosisDocument], count: int) -> List[DiagnosisDocument]:
+    """循環複製文件至指定數量（效能測試用）"""
+    replicated = list(documents)
+    i = 0
+    while len(replicated) < count:
+        doc = documents[i % len(documents)]
+        replicated.append(DiagnosisDocument(f"{doc.id}_{i:06d}", doc.name, doc.kind, dict(doc.terms)))
+        i += 1
+    return replicated
+
+
+def main():
+    """主函數"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="依一組症狀（含舌象、脈象）排序可能的證型與證候")
+    parser.add_argument(
+        "symptoms",
+        nargs="+",
+        help="觀察到的症狀，如：神疲乏力 自汗 舌淡苔白 脈虛弱"
+    )
+    parser.add_argument(
+        "--data-dir",
+        default="data",
+        help="資料目錄路徑 (預設: data)"
+    )
+    parser.add_argument(
+        "-k", "--top",
+        type=int,
+        default=10,
+        help="回傳筆數 (預設: 10)"
+    )
+    parser.add_argument(
+        "--kind",
+        choices=[KIND_ZHENGXING, KIND_SYNDROME],
+        help="只回傳證型或證候"
+    )
+    parser.add_argument(
+        "--scale",
+        type=int,
+        help="效能測試：將文件循環複製至指定數量後計時查詢"
+    )
+    add_jobs_arguments(parser)
+    add_cache_arguments(parser)
+
+    args = parser.parse_args()
+
+    # 確定資料目錄
+    script_dir = Path(__file__).parent
+    data_dir = script_dir.parent / args.data_dir
+
+    if not data_dir.exists():
+        print(f"錯誤: 資料目錄不存在: {data_dir}")
+        return 1
+
+    cache = snapshot_cache_for(data_dir, args.no_cache, args.rebuild_cache)
+    corpus = load_corpus(data_dir, ["zhengxing", "syndromes", "symptoms"], args.jobs, args.pool, cache)
+
+    documents = build_documents(corpus)
+    if args.scale:
+        documents = replicate_documents(documents, args.scale)
+
+    build_start = time.perf_counter()
+    engine = DiagnosisEngine(documents, build_aliases(corpus))
+    build_elapsed = time.perf_counter() - build_start
+
+    kinds = [args.kind] if args.kind else None
+    query_start = time.perf_counter()
+    hits = engine.search(args.symptoms, args.top, kinds)
+    query_elapsed = time.perf_counter() - query_start
+
+    print(f"索引文件: {len(engine)} 筆，建構 {build_elapsed * 1000:.1f} ms，查詢 {query_elapsed * 1000:.2f} ms")
+    print(f"查詢症狀: {'、'.join(engine.query_terms(args.symptoms))}\n")
+
+    if not hits:
+        print("沒有找到符合的證型或證候")
+        return 0
+
+    for rank, hit in enumerate(hits, 1):
+        kind = "證型" if hit.kind == KIND_ZHENGXING else "證候"
+        print(f"{rank:>3}. [{kind}] {hit.name} ({hit.id})  分數 {hit.score:.3f}")
+        print(f"     命中: {'、'.join(hit.matched)}")
+
+    return 0
+
+
+if __name__ == "__main__":
+    exit(main())
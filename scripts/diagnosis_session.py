@@ -0,0 +1,424 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+漸進式鑑別診斷會談
+共用一份唯讀的所見索引（症狀、舌象、脈象、證素 → 證型/證候位元集合），
+每個會談只保存候選位元集合與已記錄的所見序號；
+每加入一個「有」或「無」的所見，只以該所見的位元集合縮小候選，不重新對整個語料計分
+"""
+
+import math
+from pathlib import Path
+from typing import Dict, List, Any, Iterable, Optional, Tuple
+from dataclasses import dataclass
+
+from corpus import Corpus, load_corpus, add_jobs_arguments, add_cache_arguments, snapshot_cache_for
+from extract_symptoms import parse_clinical_manifestations
+from diagnosis_engine import normalize_symptom, build_aliases, resolve_symptom_names, KIND_ZHENGXING, KIND_SYNDROME
+from syndrome_bitsets import iter_bits
+from symptom_cooccurrence import split_gain
+
+
+# 所見類型
+FINDING_SYMPTOM = "symptom"
+FINDING_TONGUE = "tongue"
+FINDING_PULSE = "pulse"
+FINDING_ZHENGSU = "zhengsu"
+
+FINDING_LABELS = {
+    FINDING_SYMPTOM: "症狀",
+    FINDING_TONGUE: "舌象",
+    FINDING_PULSE: "脈象",
+    FINDING_ZHENGSU: "證素",
+}
+
+# 主症命中的計分權重（與 diagnosis_engine 的 FIELD_WEIGHTS 一致）
+MAIN_WEIGHT = 2.0
+
+# 證型主症的欄位名稱（部分證型檔案使用 primary）
+MAIN_FIELDS = ["main", "primary"]
+
+
+def finding_kind(text: str) -> str:
+    """依文字判斷所見類型"""
+    if text.startswith(("舌", "苔")):
+        return FINDING_TONGUE
+    if text.startswith("脈"):
+        return FINDING_PULSE
+    return FINDING_SYMPTOM
+
+
+@dataclass
+class RankedCandidate:
+    """排序後的候選證型/證候"""
+    id: str
+    name: str
+    kind: str
+    score: float
+    matched: List[str]
+
+
+@dataclass
+class DecidingFeature:
+    """能切分目前候選的所見（present 個候選有此所見）"""
+    key: str
+    kind: str
+    gain: float
+    present: int
+    absent: int
+
+
+class SessionIndex:
+    """
+    所見索引（建立一次，由所有會談共用）
+    欄位為證型與證候（ID 有重複，故以序號區分）；每個所見一列位元集合
+    """
+
+    def __init__(self, corpus: Corpus):
+        self.columns: List[Dict[str, str]] = []
+        self.comparison_texts: List[str] = []
+        for kind, entities in [(KIND_ZHENGXING, corpus.zhengxing), (KIND_SYNDROME, corpus.syndromes)]:
+            for entity_id, data in entities.items():
+                self.columns.append({"id": entity_id, "name": data.get("name", ""), "kind": kind})
+                differential = data.get("differential") or {}
+                self.comparison_texts.append(differential.get("type_comparison", "") or data.get("differential_analysis", "") or "")
+        self.all_mask = (1 << len(self.columns)) - 1
+
+        self.aliases = build_aliases(corpus)
+        symptom_names = resolve_symptom_names(corpus)
+
+        self.keys: List[str] = []
+        self.kinds: List[str] = []
+        self.ordinals: Dict[str, int] = {}
+        self.rows: List[int] = []
+        self.main_rows: Dict[int, int] = {}
+
+        for column, data in enumerate(self._entities(corpus)):
+            bit = 1 << column
+            if self.columns[column]["kind"] == KIND_ZHENGXING:
+                symptoms = data.get("symptoms", {})
+                for field_name in MAIN_FIELDS + ["secondary"]:
+                    for symptom in symptoms.get(field_name, []):
+                        # 與臨床表現的拆分規則一致，略過混入症狀清單的長段敘述
+                        if isinstance(symptom, str) and (symptom in symptom_names or 2 <= len(symptom) <= 8):
+                            ordinal = self._add(symptom_names.get(symptom, symptom), bit)
+                            if ordinal is not None and field_name in MAIN_FIELDS:
+                                self.main_rows[ordinal] = self.main_rows.get(ordinal, 0) | bit
+                for field_name in ["tongue", "pulse"]:
+                    value = symptoms.get(field_name)
+                    if isinstance(value, str):
+                        for part in parse_clinical_manifestations(value):
+                            self._add(part, bit)
+            else:
+                for symptom in parse_clinical_manifestations(data.get("clinical_manifestations", "")):
+                    self._add(symptom, bit)
+
+            composition = data.get("zhengsu_composition") or {}
+            for role in ["location", "nature"]:
+                for zhengsu_id in composition.get(role, []):
+                    self._add_key(f"{FINDING_ZHENGSU}:{zhengsu_id}", FINDING_ZHENGSU, bit)
+
+        # 所見權重：出現於越少證型/證候者越具鑑別力
+        total = len(self.columns)
+        self.weights = [
+            math.log(1 + (total - df + 0.5) / (df + 0.5))
+            for df in (row.bit_count() for row in self.rows)
+        ]
+
+    def _entities(self, corpus: Corpus) -> Iterable[Dict[str, Any]]:
+        yield from corpus.zhengxing.values()
+        yield from corpus.syndromes.values()
+
+    def _add(self, text: str, bit: int) -> Optional[int]:
+        key = self.normalize(text)
+        if not key:
+            return None
+        return self._add_key(key, finding_kind(key), bit)
+
+    def _add_key(self, key: str, kind: str, bit: int) -> int:
+        ordinal = self.ordinals.get(key)
+        if ordinal is None:
+            ordinal = self.ordinals[key] = len(self.keys)
+            self.keys.append(key)
+            self.kinds.append(kind)
+            self.rows.append(0)
+        self.rows[ordinal] |= bit
+        return ordinal
+
+    def normalize(self, text: str) -> str:
+        """正規化所見文字並套用症狀別名"""
+        text = normalize_symptom(text)
+        return self.aliases.get(text, text)
+
+    def lookup(self, finding: str) -> Optional[int]:
+        """所見文字（或 zhengsu:<ID>）→ 序號"""
+        ordinal = self.ordinals.get(finding)
+        if ordinal is None:
+            ordinal = self.ordinals.get(self.normalize(finding))
+        return ordinal
+
+    def session(self) -> "DiagnosisSession":
+        return DiagnosisSession(self)
+
+
+class DiagnosisSession:
+    """
+    單一病人的會談狀態
+    只保存候選位元集合與所見序號（tuple），數千個會談可同時存在於同一行程
+    """
+
+    __slots__ = ("index", "candidates", "present", "absent", "unmatched")
+
+    def __init__(self, index: SessionIndex):
+        self.index = index
+        self.candidates = index.all_mask
+        self.present: Tuple[int, ...] = ()
+        self.absent: Tuple[int, ...] = ()
+        # 無法縮小候選（會使候選為空）或索引中沒有的所見
+        self.unmatched: Tuple[str, ...] = ()
+
+    def add(self, finding: str, present: bool = True) -> bool:
+        """
+        記錄一個所見（present=False 表示病人否認）
+        候選以該所見的位元集合縮小；若會使候選為空則只記錄為無法解釋的所見。回傳是否縮小了候選
+        """
+        ordinal = self.index.lookup(finding)
+        if ordinal is None or ordinal in self.present or ordinal in self.absent:
+            if ordinal is None:
+                self.unmatched += (finding,)
+            return False
+
+        row = self.index.rows[ordinal]
+        narrowed = self.candidates & row if present else self.candidates & ~row
+        if not narrowed:
+            self.unmatched += (self.index.keys[ordinal],)
+            return False
+
+        changed = narrowed != self.candidates
+        self.candidates = narrowed
+        if present:
+            self.present += (ordinal,)
+        else:
+            self.absent += (ordinal,)
+        return changed
+
+    def negate(self, finding: str) -> bool:
+        """記錄病人否認的所見"""
+        return self.add(finding, present=False)
+
+    def add_zhengsu(self, zhengsu_id: str, present: bool = True) -> bool:
+        """以證素限定（或排除）候選"""
+        return self.add(f"{FINDING_ZHENGSU}:{zhengsu_id}", present)
+
+    def reset(self):
+        self.candidates = self.index.all_mask
+        self.present = ()
+        self.absent = ()
+        self.unmatched = ()
+
+    def __len__(self) -> int:
+        return self.candidates.bit_count()
+
+    def ranked_columns(self, k: int = 10) -> List[Tuple[int, float]]:
+        """
+        候選排序：只對目前的候選累加已確認所見的權重（主症加倍）
+        已確認的所見都是以交集縮小候選而來，因此排序主要由主症與否區分
+        返回: [(欄位序號, 分數)]
+        """
+        index = self.index
+        scores: Dict[int, float] = {column: 0.0 for column in iter_bits(self.candidates)}
+        for ordinal in self.present:
+            weight = index.weights[ordinal]
+            main = index.main_rows.get(ordinal, 0)
+            for column in iter_bits(index.rows[ordinal] & self.candidates):
+                scores[column] += weight * (MAIN_WEIGHT if main >> column & 1 else 1.0)
+        return sorted(scores.items(), key=lambda item: (-item[1], item[0]))[:k]
+
+    def ranked(self, k: int = 10) -> List[RankedCandidate]:
+        """排名前 k 的候選（含已確認的所見）"""
+        index = self.index
+        matched = [index.keys[ordinal] for ordinal in self.present]
+        return [
+            RankedCandidate(
+                id=index.columns[column]["id"],
+                name=index.columns[column]["name"],
+                kind=index.columns[column]["kind"],
+                score=round(score, 4),
+                matched=matched
+            )
+            for column, score in self.ranked_columns(k)
+        ]
+
+    def deciding_features(self, k: int = 5, kinds: Optional[Iterable[str]] = None) -> List[DecidingFeature]:
+        """最能切分目前候選的所見（資訊增益由大至小，不含已記錄者）"""
+        index = self.index
+        total = self.candidates.bit_count()
+        if total <= 1:
+            return []
+
+        allowed = set(kinds) if kinds is not None else None
+        recorded = set(self.present) | set(self.absent)
+        scored: List[Tuple[float, int, int]] = []
+        for ordinal, row in enumerate(index.rows):
+            if ordinal in recorded or (allowed is not None and index.kinds[ordinal] not in allowed):
+                continue
+            present = (row & self.candidates).bit_count()
+            gain = split_gain(total, present)
+            if gain > 0:
+                scored.append((gain, ordinal, present))
+
+        # 同分時優先建議較常見（較容易被問到）的所見
+        scored.sort(key=lambda item: (-item[0], -index.rows[item[1]].bit_count(), item[1]))
+        return [
+            DecidingFeature(index.keys[ordinal], index.kinds[ordinal], round(gain, 4), present, total - present)
+            for gain, ordinal, present in scored[:k]
+        ]
+
+    def comparisons(self, k: int = 3) -> List[Dict[str, Any]]:
+        """
+        排名前 k 的候選的類證比較文字（證候 differential.type_comparison，證型 differential_analysis），
+        並列出文中提及的其他候選
+        """
+        index = self.index
+        candidate_columns = list(iter_bits(self.candidates))
+        results = []
+        for column, _ in self.ranked_columns(k):
+            text = index.comparison_texts[column]
+            if not text:
+                continue
+            mentioned = [
+                index.columns[other]["name"] for other in candidate_columns
+                if other != column and index.columns[other]["name"]
+                and index.columns[other]["name"].rstrip("證") in text
+            ]
+            results.append({
+                "id": index.columns[column]["id"],
+                "name": index.columns[column]["name"],
+                "type_comparison": text,
+                "mentions_candidates": mentioned
+            })
+        return results
+
+
+def print_session(session: DiagnosisSession, top: int):
+    """輸出目前候選、鑑別所見與類證比較"""
+    print(f"\n候選: {len(session)} 個")
+    for rank, candidate in enumerate(session.ranked(top), 1):
+        kind = "證型" if candidate.kind == KIND_ZHENGXING else "證候"
+        print(f"{rank:>3}. [{kind}] {candidate.name} ({candidate.id})  分數 {candidate.score:.3f}")
+
+    if session.unmatched:
+        print(f"未能縮小候選的所見: {'、'.join(session.unmatched)}")
+
+    features = session.deciding_features(5)
+    if features:
+        print("\n鑑別所見（建議追問）:")
+        for feature in features:
+            print(f"  [{FINDING_LABELS[feature.kind]}] {feature.key}  "
+                  f"資訊增益 {feature.gain:.3f}（有: {feature.present}，無: {feature.absent}）")
+
+    for comparison in session.comparisons(1):
+        mentioned = f"（提及候選: {'、'.join(comparison['mentions_candidates'])}）" if comparison["mentions_candidates"] else ""
+        print(f"\n{comparison['name']} 類證比較{mentioned}:")
+        print(f"  {comparison['type_comparison'][:300]}")
+
+
+def interactive_mode(index: SessionIndex, top: int):
+    """互動模式：+所見 表示有、-所見 表示無、z:證素ID 限定證素、reset 重新開始"""
+    session = index.session()
+    print("輸入所見：+症狀（有）、-症狀（無）、z:證素ID、reset、q 離開")
+    while True:
+        try:
+            line = input("\n所見> ").strip()
+        except (EOFError, KeyboardInterrupt):
+            print()
+            break
+        if not line:
+            continue
+        if line in ("q", "quit", "exit"):
+            break
+        if line == "reset":
+            session.reset()
+        elif line.startswith("z:"):
+            session.add_zhengsu(line[2:])
+        elif line.startswith("-"):
+            session.negate(line[1:])
+        else:
+            session.add(line.lstrip("+"))
+        print_session(session, top)
+
+
+def main():
+    """主函數"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="漸進式鑑別診斷：逐一加入有/無的症狀、舌象、脈象與證素")
+    parser.add_argument(
+        "findings",
+        nargs="*",
+        help="有的所見，如：神疲乏力 舌淡 脈虛弱"
+    )
+    parser.add_argument(
+        "--data-dir",
+        default="data",
+        help="資料目錄路徑 (預設: data)"
+    )
+    parser.add_argument(
+        "-x", "--absent",
+        nargs="+",
+        default=[],
+        help="病人否認的所見"
+    )
+    parser.add_argument(
+        "-z", "--zhengsu",
+        nargs="+",
+        default=[],
+        help="限定的證素 ID"
+    )
+    parser.add_argument(
+        "-k", "--top",
+        type=int,
+        default=10,
+        help="顯示的候選數 (預設: 10)"
+    )
+    parser.add_argument(
+        "-i", "--interactive",
+        action="store_true",
+        help="互動模式"
+    )
+    add_jobs_arguments(parser)
+    add_cache_arguments(parser)
+
+    args = parser.parse_args()
+
+    # 確定資料目錄
+    script_dir = Path(__file__).parent
+    data_dir = script_dir.parent / args.data_dir
+
+    if not data_dir.exists():
+        print(f"錯誤: 資料目錄不存在: {data_dir}")
+        return 1
+
+    cache = snapshot_cache_for(data_dir, args.no_cache, args.rebuild_cache)
+    corpus = load_corpus(data_dir, ["zhengxing", "syndromes", "symptoms"], args.jobs, args.pool, cache)
+    index = SessionIndex(corpus)
+    print(f"所見索引: {len(index.keys)} 個所見，{len(index.columns)} 個證型/證候")
+
+    if args.interactive:
+        interactive_mode(index, args.top)
+        return 0
+
+    session = index.session()
+    for zhengsu_id in args.zhengsu:
+        session.add_zhengsu(zhengsu_id)
+    for finding in args.findings:
+        session.add(finding)
+    for finding in args.absent:
+        session.negate(finding)
+
+    print_session(session, args.top)
+    return 0
+
+
+if __name__ == "__main__":
+    exit(main())
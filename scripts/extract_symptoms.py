@@ -3,7 +3,7 @@
 """
 症狀提取腳本
 從證型和證候資料中提取症狀，建立反向索引
-輸出: data/indexes/symptom_index.json
+輸出: data/indexes/symptom_index.json, data/indexes/symptom_ngrams.json（症狀模糊比對用）
 """
 
 import json
@@ -14,6 +14,14 @@ from typing import Dict, List, Set, Any, Optional
 from datetime import datetime
 from collections import defaultdict
 
+from corpus import (
+    Corpus, EntityMap, ensure_corpus, load_corpus,
+    add_jobs_arguments, add_cache_arguments, snapshot_cache_for
+)
+from index_shards import SHARD_MODES, split_entries, leading_char, write_shards
+from symptom_matcher import write_symptom_matcher, MATCHER_NAME
+from keyword_matcher import KeywordAutomaton
+
 
 # 症狀分類
 SYMPTOM_CATEGORIES = {
@@ -29,38 +37,20 @@ SYMPTOM_CATEGORIES = {
 }
 
 
+# 分類關鍵字自動機（依分類順序，命中多個分類時取最前者）
+SYMPTOM_CATEGORY_MATCHER = KeywordAutomaton.from_groups(SYMPTOM_CATEGORIES)
+
+
 def categorize_symptom(symptom: str) -> str:
     """根據症狀名稱判斷分類"""
-    for category, keywords in SYMPTOM_CATEGORIES.items():
-        if category == "其他":
-            continue
-        for keyword in keywords:
-            if keyword in symptom:
-                return category
-    return "其他"
+    return SYMPTOM_CATEGORY_MATCHER.first(symptom, "其他")
 
 
-def extract_symptoms_from_zhengxing(data_dir: Path) -> Dict[str, List[Dict]]:
+def extract_symptoms_from_zhengxing(zhengxing_data: EntityMap) -> Dict[str, List[Dict]]:
     """從證型資料中提取症狀"""
     symptom_map: Dict[str, List[Dict]] = defaultdict(list)
 
-    zhengxing_dir = data_dir / "zhengxing"
-    if not zhengxing_dir.exists():
-        print(f"警告: 證型目錄不存在: {zhengxing_dir}")
-        return symptom_map
-
-    for f in zhengxing_dir.glob("*.json"):
-        if f.name.startswith("_"):
-            continue
-
-        try:
-            with open(f, 'r', encoding='utf-8') as fp:
-                data = json.load(fp)
-        except (json.JSONDecodeError, Exception) as e:
-            print(f"警告: 無法讀取 {f}: {e}")
-            continue
-
-        zx_id = data.get("id", "")
+    for zx_id, data in zhengxing_data.items():
         zx_name = data.get("name", "")
         symptoms = data.get("symptoms", {})
 
@@ -87,33 +77,17 @@ def extract_symptoms_from_zhengxing(data_dir: Path) -> Dict[str, List[Dict]]:
     return symptom_map
 
 
-def extract_symptoms_from_zhenghou(data_dir: Path) -> Dict[str, List[Dict]]:
+def extract_symptoms_from_zhenghou(syndrome_data: EntityMap) -> Dict[str, List[Dict]]:
     """從證候資料中提取症狀"""
     symptom_map: Dict[str, List[Dict]] = defaultdict(list)
 
-    syndromes_dir = data_dir / "zhenghou" / "syndromes"
-    if not syndromes_dir.exists():
-        print(f"警告: 證候目錄不存在: {syndromes_dir}")
-        return symptom_map
-
-    for f in syndromes_dir.glob("*.json"):
-        if f.name.startswith("_"):
-            continue
-
-        try:
-            with open(f, 'r', encoding='utf-8') as fp:
-                data = json.load(fp)
-        except (json.JSONDecodeError, Exception) as e:
-            print(f"警告: 無法讀取 {f}: {e}")
-            continue
-
-        zh_id = data.get("id", "")
+    for zh_id, data in syndrome_data.items():
         zh_name = data.get("name", "")
 
         # 從 clinical_manifestations 提取症狀
         clinical = data.get("clinical_manifestations", "")
         if clinical:
-            symptoms = _parse_clinical_manifestations(clinical)
+            symptoms = parse_clinical_manifestations(clinical)
             for symptom in symptoms:
                 symptom_map[symptom].append({
                     "id": zh_id,
@@ -149,7 +123,7 @@ def _build_differentiation_hint(data: Dict) -> str:
     return "、".join(hints[:4]) if hints else ""
 
 
-def _parse_clinical_manifestations(text: str) -> List[str]:
+def parse_clinical_manifestations(text: str) -> List[str]:
     """從臨床表現文字中提取症狀"""
     symptoms = []
 
@@ -165,13 +139,15 @@ def _parse_clinical_manifestations(text: str) -> List[str]:
     return symptoms
 
 
-def build_symptom_index(data_dir: Path) -> Dict:
+def build_symptom_index(data_dir: Path, corpus: Optional[Corpus] = None) -> Dict:
     """建立完整的症狀索引"""
+    corpus = ensure_corpus(data_dir, corpus, ["zhengxing", "syndromes"])
+
     print("正在從證型提取症狀...")
-    zhengxing_symptoms = extract_symptoms_from_zhengxing(data_dir)
+    zhengxing_symptoms = extract_symptoms_from_zhengxing(corpus.zhengxing)
 
     print("正在從證候提取症狀...")
-    zhenghou_symptoms = extract_symptoms_from_zhenghou(data_dir)
+    zhenghou_symptoms = extract_symptoms_from_zhenghou(corpus.syndromes)
 
     # 合併症狀
     all_symptoms: Dict[str, Dict] = {}
@@ -228,6 +204,42 @@ def build_symptom_index(data_dir: Path) -> Dict:
     return index
 
 
+def build_symptom_index_with_matcher(data_dir: Path, corpus: Optional[Corpus] = None,
+                                     output_dir: Optional[Path] = None) -> Dict:
+    """建立症狀索引，並在輸出目錄一併寫入症狀 n-gram 模糊比對索引"""
+    corpus = ensure_corpus(data_dir, corpus, ["zhengxing", "syndromes", "symptoms"])
+    index = build_symptom_index(data_dir, corpus)
+
+    print("正在建立症狀 n-gram 索引...")
+    output_dir = Path(output_dir) if output_dir else Path(data_dir) / "indexes"
+    index["statistics"]["matcher"] = write_symptom_matcher(index, corpus, output_dir)
+    return index
+
+
+def shard_symptom_index(index: Dict, shard_by: str) -> Dict[str, Dict]:
+    """將症狀索引依症狀分類或首字拆成多個同結構的分片"""
+    symptoms = index["symptoms"]
+    if shard_by == "category":
+        key_fn = lambda symptom: symptoms[symptom]["category"]
+    else:
+        key_fn = leading_char
+
+    shards: Dict[str, Dict] = {}
+    for shard_key, entries in split_entries(symptoms, key_fn).items():
+        shards[shard_key] = {
+            "version": index["version"],
+            "generated_at": index["generated_at"],
+            "description": index["description"],
+            "shard": shard_key,
+            "symptoms": entries,
+            "categories": sorted({entry["category"] for entry in entries.values()}),
+            "statistics": {
+                "total_symptoms": len(entries)
+            }
+        }
+    return shards
+
+
 def main():
     """主函數"""
     import argparse
@@ -243,6 +255,13 @@ def main():
         default="data/indexes/symptom_index.json",
         help="輸出檔案路徑"
     )
+    parser.add_argument(
+        "--shard-by",
+        choices=SHARD_MODES,
+        help="另將索引依症狀分類 (category) 或首字 (char) 分片輸出至與輸出檔同名的目錄（尚無頁面讀取，預設不輸出）"
+    )
+    add_jobs_arguments(parser)
+    add_cache_arguments(parser)
 
     args = parser.parse_args()
 
@@ -259,7 +278,9 @@ def main():
     output_path.parent.mkdir(parents=True, exist_ok=True)
 
     # 建立索引
-    index = build_symptom_index(data_dir)
+    cache = snapshot_cache_for(data_dir, args.no_cache, args.rebuild_cache)
+    corpus = load_corpus(data_dir, ["zhengxing", "syndromes", "symptoms"], args.jobs, args.pool, cache)
+    index = build_symptom_index_with_matcher(data_dir, corpus, output_path.parent)
 
     # 寫入檔案
     with open(output_path, 'w', encoding='utf-8') as f:
@@ -268,6 +289,17 @@ def main():
     print(f"\n✅ 症狀索引已生成: {output_path}")
     print(f"   總症狀數: {index['statistics']['total_symptoms']}")
     print(f"   含主症關聯: {index['statistics']['symptoms_with_main_relevance']}")
+    print(f"   模糊比對索引: {output_path.parent / MATCHER_NAME}"
+          f"（{index['statistics']['matcher']['total_phrases']} 個片語）")
+
+    if args.shard_by:
+        shard_dir = output_path.with_suffix("")
+        manifest = write_shards(
+            shard_dir, shard_symptom_index(index, args.shard_by), args.shard_by,
+            "症狀索引分片對照表：分片鍵 → 分片檔"
+        )
+        print(f"\n✅ 症狀索引分片已生成: {shard_dir}")
+        print(f"   分片數: {len(manifest['shards'])}")
 
     return 0
 
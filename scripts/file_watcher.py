@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+資料目錄監看模組
+監看各實體目錄的 JSON 檔案變更；Linux 上優先使用 inotify，否則退回定時輪詢。
+連續存檔會經過防抖動合併為一次變更，回傳每個目錄中新增/修改與刪除的檔案
+"""
+
+import os
+import select
+import time
+from pathlib import Path
+from typing import Dict, List, Tuple, Optional
+from dataclasses import dataclass, field
+
+from corpus import entity_files
+
+
+# 檔名 → (大小, 修改時間)
+DirState = Dict[str, Tuple[int, int]]
+
+# inotify 事件：寫入完成、移入/移出（編輯器的原子存檔）、建立、刪除
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+
+WATCH_MASK = IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+
+
+@dataclass
+class FileChanges:
+    """單一目錄的檔案變更"""
+    changed: List[Path] = field(default_factory=list)   # 新增或內容變更
+    removed: List[str] = field(default_factory=list)    # 已刪除的檔名
+
+
+def scan_dir(directory: Path) -> DirState:
+    """記錄目錄下資料檔案的大小與修改時間"""
+    state: DirState = {}
+    for f in entity_files(directory):
+        try:
+            st = f.stat()
+        except FileNotFoundError:
+            # 列出後、取狀態前被刪除
+            continue
+        state[f.name] = (st.st_size, st.st_mtime_ns)
+    return state
+
+
+def diff_states(directory: Path, before: DirState, after: DirState) -> FileChanges:
+    """比較兩次掃描結果"""
+    changes = FileChanges()
+    for name, stat in sorted(after.items()):
+        if before.get(name) != stat:
+            changes.changed.append(directory / name)
+    changes.removed = sorted(name for name in before if name not in after)
+    return changes
+
+
+class PollingBackend:
+    """定時輪詢：每隔 interval 秒掃描一次目錄"""
+
+    name = "polling"
+
+    def __init__(self, dirs: List[Path], interval: float = 1.0):
+        self.dirs = dirs
+        self.interval = interval
+        self._states = [scan_dir(d) for d in dirs]
+
+    def wait(self, timeout: Optional[float]) -> bool:
+        """等待至有檔案變動或逾時；有變動時回傳 True"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            remaining = None if deadline is None else deadline - time.monotonic()
+            if remaining is not None and remaining <= 0:
+                return False
+            time.sleep(self.interval if remaining is None else min(self.interval, remaining))
+
+            states = [scan_dir(d) for d in self.dirs]
+            if states != self._states:
+                self._states = states
+                return True
+
+    def close(self):
+        pass
+
+
+class InotifyBackend:
+    """以 inotify 接收目錄事件（僅 Linux）"""
+
+    name = "inotify"
+
+    def __init__(self, dirs: List[Path]):
+        import ctypes
+        import ctypes.util
+
+        self._libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        self._fd = self._libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 失敗")
+
+        for d in dirs:
+            wd = self._libc.inotify_add_watch(self._fd, os.fsencode(str(d)), WATCH_MASK)
+            if wd < 0:
+                errno = ctypes.get_errno()
+                os.close(self._fd)
+                raise OSError(errno, f"無法監看目錄: {d}")
+
+    def wait(self, timeout: Optional[float]) -> bool:
+        """等待至有事件或逾時；有事件時讀空佇列並回傳 True"""
+        ready, _, _ = select.select([self._fd], [], [], timeout)
+        if not ready:
+            return False
+        while True:
+            try:
+                if not os.read(self._fd, 1 << 16):
+                    break
+            except BlockingIOError:
+                break
+        return True
+
+    def close(self):
+        os.close(self._fd)
+
+
+class DirectoryWatcher:
+    """
+    監看一組具名目錄
+    後端只負責「有東西變了」的通知，實際變更一律以前後掃描結果比對得出，
+    因此兩種後端的結果一致，且只改修改時間而大小不變的存檔也能偵測
+    """
+
+    def __init__(self, dirs: Dict[str, Path], debounce: float = 0.5,
+                 poll_interval: float = 1.0, polling: bool = False):
+        self.dirs = {key: Path(d) for key, d in dirs.items()}
+        self.debounce = debounce
+        self._states = {key: scan_dir(d) for key, d in self.dirs.items()}
+
+        existing = [d for d in self.dirs.values() if d.exists()]
+        self.backend = None
+        if not polling:
+            try:
+                self.backend = InotifyBackend(existing)
+            except (OSError, AttributeError):
+                # 非 Linux 或 inotify 資源不足時改用輪詢
+                self.backend = None
+        if self.backend is None:
+            self.backend = PollingBackend(existing, poll_interval)
+
+    def wait_for_changes(self) -> Dict[str, FileChanges]:
+        """阻塞直到有實際的檔案變更；一連串的存檔在靜止 debounce 秒後合併回傳"""
+        while True:
+            self.backend.wait(None)
+            while self.backend.wait(self.debounce):
+                pass
+
+            changes = self.collect_changes()
+            if changes:
+                return changes
+
+    def collect_changes(self) -> Dict[str, FileChanges]:
+        """重新掃描並回傳自上次掃描以來有變更的目錄"""
+        changes: Dict[str, FileChanges] = {}
+        for key, d in self.dirs.items():
+            state = scan_dir(d)
+            diff = diff_states(d, self._states[key], state)
+            self._states[key] = state
+            if diff.changed or diff.removed:
+                changes[key] = diff
+        return changes
+
+    def close(self):
+        self.backend.close()
@@ -0,0 +1,309 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+方劑 × 證候適配矩陣
+方劑以 calculated_weights 的病位與病性權重、證候以證素組成（病位 + 病性）表示為同一組證素上的向量，
+兩者的餘弦相似度以一次稀疏矩陣乘積整批算出，量化為 uint8（0–255）後以 base64 存放：
+「此證候適用哪些方劑」為取一欄、「此方劑可治哪些證候」為取一列，查詢時不需重新計算
+輸出: data/indexes/formula_affinity.json
+"""
+
+import base64
+import heapq
+import json
+import time
+from pathlib import Path
+from typing import Dict, List, Any, Optional, Tuple
+from datetime import datetime
+
+from corpus import Corpus, ensure_corpus, load_corpus, add_jobs_arguments, add_cache_arguments, snapshot_cache_for
+from case_matcher import SparseMatrix
+from formula_weights import FormulaWeightEngine, SECTION_LOCATION, SECTION_NATURE
+
+
+AFFINITY_VERSION = 1
+AFFINITY_NAME = "formula_affinity.json"
+
+# 量化刻度：相似度 s 存為 round(s × 255)，誤差不超過 1/510
+QUANT_SCALE = 255
+
+DEFAULT_TOP = 10
+
+# 方劑權重來源
+SOURCE_COMPUTED = "computed"
+SOURCE_FILE = "file"
+
+
+def formula_vectors(engine: FormulaWeightEngine) -> Tuple[List[str], List[Dict[str, float]], Dict[str, str]]:
+    """
+    方劑的證素權重向量（病位 + 病性）
+    組成中的中藥都有資料時採用計算結果，否則沿用方劑檔中的 calculated_weights（無則用不完整的計算結果）
+    返回: (方劑 ID, 向量, 方劑 ID → 權重來源)
+    """
+    ids: List[str] = []
+    vectors: List[Dict[str, float]] = []
+    sources: Dict[str, str] = {}
+    for formula_id in engine.formula_ids:
+        formula = engine.formulas.get(formula_id)
+        if formula is None:
+            continue
+        weights = engine.weights.get(formula_id, {})
+        sources[formula_id] = SOURCE_COMPUTED
+        if engine.missing.get(formula_id) and formula.get("calculated_weights"):
+            weights = formula["calculated_weights"]
+            sources[formula_id] = SOURCE_FILE
+
+        vector: Dict[str, float] = {}
+        for section in [SECTION_LOCATION, SECTION_NATURE]:
+            for zhengsu_id, value in (weights.get(section) or {}).items():
+                if value > 0:
+                    vector[zhengsu_id] = vector.get(zhengsu_id, 0.0) + value
+        ids.append(formula_id)
+        vectors.append(vector)
+    return ids, vectors, sources
+
+
+def syndrome_vector(data: Dict[str, Any]) -> Dict[str, float]:
+    """證候的二元證素向量"""
+    composition = data.get("zhengsu_composition") or {}
+    return {zhengsu_id: 1.0 for role in ["location", "nature"] for zhengsu_id in composition.get(role, [])}
+
+
+def affinity_matrix(formulas: List[Dict[str, float]], syndromes: List[Dict[str, float]]) -> bytearray:
+    """
+    方劑 × 證候的量化餘弦相似度（列優先，第 f 列第 s 欄位於 f × 證候數 + s）
+    兩側向量先正規化，再以方劑矩陣 × 證候矩陣ᵀ 算出所有非零的組合
+    """
+    columns: Dict[str, int] = {}
+    for vector in formulas + syndromes:
+        for zhengsu_id in vector:
+            columns.setdefault(zhengsu_id, len(columns))
+
+    def to_matrix(vectors: List[Dict[str, float]]) -> SparseMatrix:
+        matrix = SparseMatrix.from_rows(
+            ({columns[zhengsu_id]: value for zhengsu_id, value in vector.items()} for vector in vectors),
+            len(columns)
+        )
+        matrix.normalize_rows()
+        return matrix
+
+    product = to_matrix(formulas).multiply(to_matrix(syndromes).transpose())
+    width = len(syndromes)
+    matrix = bytearray(len(formulas) * width)
+    for f in range(len(product)):
+        indices, data = product.row(f)
+        for s, score in zip(indices, data):
+            matrix[f * width + s] = min(QUANT_SCALE, round(score * QUANT_SCALE))
+    return matrix
+
+
+class FormulaAffinity:
+    """方劑 × 證候適配矩陣（uint8 量化，列為方劑、欄為證候）"""
+
+    def __init__(self, formulas: List[str], syndromes: List[str], matrix: bytes,
+                 formula_names: Dict[str, str], syndrome_names: Dict[str, str],
+                 sources: Optional[Dict[str, str]] = None):
+        if len(matrix) != len(formulas) * len(syndromes):
+            raise ValueError("適配矩陣大小與方劑、證候數不符")
+        self.formulas = formulas
+        self.syndromes = syndromes
+        self.matrix = bytes(matrix)
+        self.formula_names = formula_names
+        self.syndrome_names = syndrome_names
+        self.sources = sources or {}
+        self.formula_positions = {formula_id: i for i, formula_id in enumerate(formulas)}
+        self.syndrome_positions = {syndrome_id: i for i, syndrome_id in enumerate(syndromes)}
+
+    @classmethod
+    def from_corpus(cls, corpus: Corpus, engine: Optional[FormulaWeightEngine] = None) -> "FormulaAffinity":
+        engine = engine or FormulaWeightEngine.from_corpus(corpus)
+        formula_ids, formula_vecs, sources = formula_vectors(engine)
+
+        # 依證候編號排序（與位元集合索引、相似證候索引的序號一致）
+        syndrome_ids = sorted(
+            corpus.syndromes,
+            key=lambda zh_id: (corpus.syndromes[zh_id].get("number") or 0, zh_id)
+        )
+        syndrome_vecs = [syndrome_vector(corpus.syndromes[zh_id]) for zh_id in syndrome_ids]
+
+        return cls(
+            formula_ids,
+            syndrome_ids,
+            affinity_matrix(formula_vecs, syndrome_vecs),
+            {formula_id: engine.formulas[formula_id].get("name", "") for formula_id in formula_ids},
+            {zh_id: corpus.syndromes[zh_id].get("name", "") for zh_id in syndrome_ids},
+            sources
+        )
+
+    @classmethod
+    def from_json(cls, data: Dict[str, Any]) -> "FormulaAffinity":
+        if data.get("version") != AFFINITY_VERSION:
+            raise ValueError(f"不支援的方劑適配矩陣版本: {data.get('version')}")
+        return cls(
+            data["formulas"],
+            data["syndromes"],
+            base64.b64decode(data["matrix"]),
+            data.get("formula_names", {}),
+            data.get("syndrome_names", {}),
+            data.get("sources", {})
+        )
+
+    @classmethod
+    def load(cls, path: Path) -> "FormulaAffinity":
+        with open(path, 'r', encoding='utf-8') as f:
+            return cls.from_json(json.load(f))
+
+    def score(self, formula_id: str, syndrome_id: str) -> float:
+        """單一方劑與證候的適配度（未知 ID 為 0）"""
+        f = self.formula_positions.get(formula_id)
+        s = self.syndrome_positions.get(syndrome_id)
+        if f is None or s is None:
+            return 0.0
+        return self.matrix[f * len(self.syndromes) + s] / QUANT_SCALE
+
+    @staticmethod
+    def _top(values: bytes, ids: List[str], k: Optional[int], min_score: float) -> List[Tuple[str, float]]:
+        """取適配度最高的項目（同分時序號小者優先，不含 0 與低於 min_score 者）"""
+        threshold = max(1, round(min_score * QUANT_SCALE))
+        candidates = [i for i, value in enumerate(values) if value >= threshold]
+        key = lambda i: (values[i], -i)
+        top = heapq.nlargest(k, candidates, key=key) if k is not None else sorted(candidates, key=key, reverse=True)
+        return [(ids[i], values[i] / QUANT_SCALE) for i in top]
+
+    def syndromes_for(self, formula_id: str, k: Optional[int] = DEFAULT_TOP,
+                      min_score: float = 0.0) -> List[Tuple[str, float]]:
+        """方劑可治的證候（矩陣的一列）"""
+        f = self.formula_positions.get(formula_id)
+        if f is None:
+            return []
+        width = len(self.syndromes)
+        return self._top(self.matrix[f * width:(f + 1) * width], self.syndromes, k, min_score)
+
+    def formulas_for(self, syndrome_id: str, k: Optional[int] = DEFAULT_TOP,
+                     min_score: float = 0.0) -> List[Tuple[str, float]]:
+        """適用於證候的方劑（矩陣的一欄）"""
+        s = self.syndrome_positions.get(syndrome_id)
+        if s is None:
+            return []
+        return self._top(self.matrix[s::len(self.syndromes)], self.formulas, k, min_score)
+
+    def to_json(self) -> Dict[str, Any]:
+        return {
+            "version": AFFINITY_VERSION,
+            "generated_at": datetime.now().strftime("%Y-%m-%d"),
+            "description": "方劑 × 證候適配度（證素向量的餘弦相似度）：matrix 為 base64 的 uint8 陣列，"
+                           "第 f 個方劑與第 s 個證候位於 f × 證候數 + s，適配度 = 值 / scale",
+            "scale": QUANT_SCALE,
+            "formulas": self.formulas,
+            "formula_names": self.formula_names,
+            "sources": self.sources,
+            "syndromes": self.syndromes,
+            "syndrome_names": self.syndrome_names,
+            "matrix": base64.b64encode(self.matrix).decode("ascii"),
+            "statistics": {
+                "total_formulas": len(self.formulas),
+                "total_syndromes": len(self.syndromes),
+                "nonzero": sum(1 for value in self.matrix if value),
+                "matrix_bytes": len(self.matrix)
+            }
+        }
+
+
+def build_formula_affinity(data_dir: Path, corpus: Optional[Corpus] = None) -> Dict:
+    """建立方劑 × 證候適配矩陣"""
+    corpus = ensure_corpus(data_dir, corpus, ["zhengsu", "herbs", "formulas", "syndromes"])
+    print("正在計算方劑 × 證候適配矩陣...")
+    return FormulaAffinity.from_corpus(corpus).to_json()
+
+
+def main():
+    """主函數"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="查詢方劑與證候的適配度")
+    parser.add_argument(
+        "ids",
+        nargs="*",
+        help="方劑 ID（如：mahuang_tang）或證候 ID（如：feiqixu）；不指定時只輸出統計"
+    )
+    parser.add_argument(
+        "--data-dir",
+        default="data",
+        help="資料目錄路徑 (預設: data)"
+    )
+    parser.add_argument(
+        "-k", "--top",
+        type=int,
+        default=DEFAULT_TOP,
+        help=f"每個查詢回傳筆數 (預設: {DEFAULT_TOP})"
+    )
+    parser.add_argument(
+        "--min-score",
+        type=float,
+        default=0.0,
+        help="最低適配度 (預設: 0)"
+    )
+    parser.add_argument(
+        "--index",
+        help="直接讀取已建立的適配矩陣（如：data/indexes/formula_affinity.json），不重新計算"
+    )
+    parser.add_argument(
+        "--output",
+        help="將適配矩陣 JSON 輸出至指定路徑（如：data/indexes/formula_affinity.json）"
+    )
+    add_jobs_arguments(parser)
+    add_cache_arguments(parser)
+
+    args = parser.parse_args()
+
+    # 確定資料目錄
+    script_dir = Path(__file__).parent
+    data_dir = script_dir.parent / args.data_dir
+
+    if not data_dir.exists():
+        print(f"錯誤: 資料目錄不存在: {data_dir}")
+        return 1
+
+    start = time.perf_counter()
+    if args.index:
+        index_path = script_dir.parent / args.index
+        if not index_path.exists():
+            print(f"錯誤: 找不到適配矩陣: {index_path}")
+            return 1
+        affinity = FormulaAffinity.load(index_path)
+    else:
+        cache = snapshot_cache_for(data_dir, args.no_cache, args.rebuild_cache)
+        corpus = load_corpus(data_dir, ["zhengsu", "herbs", "formulas", "syndromes"], args.jobs, args.pool, cache)
+        affinity = FormulaAffinity.from_corpus(corpus)
+    elapsed = time.perf_counter() - start
+    print(f"方劑適配矩陣: {len(affinity.formulas)} 個方劑 × {len(affinity.syndromes)} 個證候，"
+          f"{len(affinity.matrix)} 位元組，{elapsed * 1000:.1f} ms")
+
+    if args.output:
+        output_path = script_dir.parent / args.output
+        output_path.parent.mkdir(parents=True, exist_ok=True)
+        data = affinity.to_json()
+        with open(output_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, separators=(",", ":"))
+        print(f"✅ 方劑適配矩陣已生成: {output_path}")
+        print(f"   非零組合: {data['statistics']['nonzero']}")
+        return 0
+
+    for entity_id in args.ids:
+        if entity_id in affinity.formula_positions:
+            source = "方劑檔權重" if affinity.sources.get(entity_id) == SOURCE_FILE else "計算權重"
+            print(f"\n{affinity.formula_names.get(entity_id, entity_id)}（{entity_id}，{source}）可治證候:")
+            for syndrome_id, score in affinity.syndromes_for(entity_id, args.top, args.min_score):
+                print(f"  {score:.3f}  {affinity.syndrome_names.get(syndrome_id, syndrome_id)}（{syndrome_id}）")
+        elif entity_id in affinity.syndrome_positions:
+            print(f"\n{affinity.syndrome_names.get(entity_id, entity_id)}（{entity_id}）適用方劑:")
+            for formula_id, score in affinity.formulas_for(entity_id, args.top, args.min_score):
+                print(f"  {score:.3f}  {affinity.formula_names.get(formula_id, formula_id)}（{formula_id}）")
+        else:
+            print(f"\n❌ 找不到方劑或證候: {entity_id}")
+
+    return 0
+
+
+if __name__ == "__main__":
+    exit(main())
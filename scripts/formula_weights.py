@@ -0,0 +1,535 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+方劑證素權重計算
+依 data/formulas/_schema.json 的權重計算說明，由方劑組成推算 calculated_weights：
+  藥物貢獻 = 強度係數 × 角色係數（君臣佐使）× 劑量係數
+每味藥的貢獻加到其各功效的治法與證素（病位 / 病性），歸經另以較低係數加到對應的病位（引經藥全額）
+
+中藥表示為「中藥 × 特徵（治法、病位、病性）」的稀疏矩陣，每味藥占兩列（功效列、歸經列），
+方劑組成表示為「方劑 × 中藥列」的係數矩陣，所有方劑的權重即一次稀疏矩陣乘積；
+單一中藥檔變更時只重算該藥的列與含該藥的方劑
+"""
+
+import json
+import re
+import time
+from pathlib import Path
+from typing import Dict, List, Any, Iterable, Optional, Set, Tuple
+
+from corpus import Corpus, ENTITY_DIRS, load_corpus, update_entity_files, add_jobs_arguments, add_cache_arguments, snapshot_cache_for
+from case_matcher import SparseMatrix
+
+
+# 權重區塊
+SECTION_TREATMENT = "treatment"
+SECTION_LOCATION = "location"
+SECTION_NATURE = "nature"
+SECTIONS = [SECTION_TREATMENT, SECTION_LOCATION, SECTION_NATURE]
+
+# 權重計算說明（data/formulas/_schema.json）
+INTENSITY_FACTORS = {"強": 1.5, "中": 1.0, "弱": 0.5}
+ROLE_FACTORS = {"君": 2.0, "臣": 1.5, "佐": 1.0, "使": 0.5}
+
+# 歸經對病位的係數：一般藥物的歸經只是輔助，引經藥（is_guide）引領全方至該經，全額計入
+MERIDIAN_FACTOR = 0.5
+GUIDE_MERIDIAN_FACTOR = 1.0
+
+# 權重寫入方劑時的小數位數；比對既有權重時的容許誤差
+WEIGHT_DIGITS = 2
+WEIGHT_TOLERANCE = 0.01
+
+DOSAGE_GUIDE = "引經"
+
+RANGE_PATTERN = re.compile(r'(\d+(?:\.\d+)?)\s*[-~～–]\s*(\d+(?:\.\d+)?)\s*g')
+AMOUNT_PATTERN = re.compile(r'(\d+(?:\.\d+)?)\s*g')
+
+# 方劑權重：區塊 → 鍵 → 權重
+Weights = Dict[str, Dict[str, float]]
+
+
+def parse_grams(text: Optional[str]) -> Optional[Tuple[float, float]]:
+    """解析劑量（如 9g、2-9g）為 (下限, 上限) 克數；無法解析時回傳 None"""
+    if not text:
+        return None
+    match = RANGE_PATTERN.search(text)
+    if match:
+        return float(match.group(1)), float(match.group(2))
+    match = AMOUNT_PATTERN.search(text)
+    if match:
+        grams = float(match.group(1))
+        return grams, grams
+    return None
+
+
+def dosage_factor(herb: Dict[str, Any], amount: Optional[str]) -> float:
+    """
+    劑量係數：引經藥與最佳劑量比較，其他藥物與標準常用劑量範圍比較；
+    劑量無法解析時視為常用量（1.0）
+    """
+    grams = parse_grams(amount)
+    if grams is None:
+        return 1.0
+    grams = grams[1]
+
+    if herb.get("dosage_type") == DOSAGE_GUIDE:
+        optimal = parse_grams(herb.get("optimal_dosage"))
+        if optimal is not None:
+            if grams > optimal[1] * 2:
+                return 0.7
+            if grams < optimal[0] * 0.5:
+                return 0.5
+            return 1.0
+
+    standard = parse_grams(herb.get("standard_dosage") or herb.get("dosage"))
+    if standard is None:
+        return 1.0
+    low, high = standard
+    if grams > high * 2:
+        return 2.0
+    if grams > high * 1.5:
+        return 1.5
+    if grams < low * 0.5:
+        return 0.5
+    return 1.0
+
+
+def round_weights(weights: Weights) -> Weights:
+    """四捨五入並依權重由高至低排列（同分依鍵排序）"""
+    return {
+        section: {
+            key: round(value, WEIGHT_DIGITS)
+            for key, value in sorted(weights.get(section, {}).items(), key=lambda item: (-item[1], item[0]))
+            if round(value, WEIGHT_DIGITS)
+        }
+        for section in SECTIONS
+    }
+
+
+def weights_differ(a: Optional[Weights], b: Optional[Weights]) -> bool:
+    """兩組權重是否有超出容許誤差的差異"""
+    a = a or {}
+    b = b or {}
+    for section in SECTIONS:
+        left, right = a.get(section) or {}, b.get(section) or {}
+        for key in set(left) | set(right):
+            if abs(left.get(key, 0.0) - right.get(key, 0.0)) > WEIGHT_TOLERANCE:
+                return True
+    return False
+
+
+class FormulaWeightEngine:
+    """
+    方劑權重計算器
+    中藥第 h 個位置對應中藥矩陣的第 2h 列（功效）與第 2h + 1 列（歸經）；
+    係數矩陣第 f 列為方劑 f 在各中藥列的係數（角色 × 劑量，歸經列再乘歸經係數）
+    """
+
+    def __init__(self, zhengsu: Dict[str, Dict[str, Any]], herbs: Dict[str, Dict[str, Any]],
+                 formulas: Dict[str, Dict[str, Any]]):
+        self.sections: Dict[str, str] = {}
+        self.meridians: Dict[str, str] = {}
+        for zhengsu_id, data in zhengsu.items():
+            is_location = data.get("category") == "病位"
+            self.sections[zhengsu_id] = SECTION_LOCATION if is_location else SECTION_NATURE
+            if is_location and data.get("name"):
+                self.meridians[data["name"]] = zhengsu_id
+
+        # 特徵欄：(區塊, 鍵)
+        self.features: List[Tuple[str, str]] = []
+        self.columns: Dict[Tuple[str, str], int] = {}
+
+        # 中藥位置（刪除的中藥保留空位，使既有係數的欄序號不變）
+        self.herbs: Dict[str, Dict[str, Any]] = {}
+        self.herb_ids: List[str] = []
+        self.herb_positions: Dict[str, int] = {}
+        self.herb_names: Dict[str, str] = {}
+        self.herb_rows: List[Dict[int, float]] = []
+
+        self.formulas: Dict[str, Dict[str, Any]] = {}
+        self.formula_ids: List[str] = []
+        self.formula_positions: Dict[str, int] = {}
+        self.coefficient_rows: List[Dict[int, float]] = []
+        self.missing: Dict[str, List[str]] = {}
+        # 組成中的中藥 ID 與名稱 → 方劑 ID（中藥檔新增、刪除或改名時據此找出受影響的方劑）
+        self.references: Dict[str, Set[str]] = {}
+        self.weights: Dict[str, Weights] = {}
+
+        for herb_id, herb in herbs.items():
+            self.set_herb(herb_id, herb)
+        for formula_id, formula in formulas.items():
+            self.set_formula(formula_id, formula)
+        self.recompute()
+
+    @classmethod
+    def from_corpus(cls, corpus: Corpus) -> "FormulaWeightEngine":
+        return cls(corpus.zhengsu, corpus.herbs, corpus.formulas)
+
+    def column(self, section: str, key: str) -> int:
+        feature = (section, key)
+        col = self.columns.get(feature)
+        if col is None:
+            col = self.columns[feature] = len(self.features)
+            self.features.append(feature)
+        return col
+
+    def zhengsu_section(self, zhengsu_id: str) -> str:
+        """證素所屬區塊；未收錄的證素視為病性"""
+        return self.sections.get(zhengsu_id, SECTION_NATURE)
+
+    def herb_vectors(self, herb: Dict[str, Any]) -> Tuple[Dict[int, float], Dict[int, float]]:
+        """中藥的功效列與歸經列（已乘強度係數）"""
+        intensity = INTENSITY_FACTORS.get(herb.get("intensity"), 1.0)
+        functions: Dict[int, float] = {}
+        for function in herb.get("functions") or []:
+            treatment = function.get("treatment")
+            if treatment:
+                col = self.column(SECTION_TREATMENT, treatment)
+                functions[col] = functions.get(col, 0.0) + intensity
+            for zhengsu_id in function.get("zhengsu") or []:
+                col = self.column(self.zhengsu_section(zhengsu_id), zhengsu_id)
+                functions[col] = functions.get(col, 0.0) + intensity
+
+        meridians: Dict[int, float] = {}
+        for meridian in (herb.get("properties") or {}).get("meridians") or []:
+            zhengsu_id = self.meridians.get(meridian)
+            if zhengsu_id:
+                meridians[self.column(SECTION_LOCATION, zhengsu_id)] = intensity
+        return functions, meridians
+
+    def set_herb(self, herb_id: str, herb: Optional[Dict[str, Any]]):
+        """新增、更新或刪除（herb 為 None）中藥的矩陣列"""
+        position = self.herb_positions.get(herb_id)
+        if position is None:
+            if herb is None:
+                return
+            position = self.herb_positions[herb_id] = len(self.herb_ids)
+            self.herb_ids.append(herb_id)
+            self.herb_rows.extend([{}, {}])
+
+        old = self.herbs.pop(herb_id, None)
+        if old is not None and self.herb_names.get(old.get("name")) == herb_id:
+            del self.herb_names[old["name"]]
+
+        if herb is None:
+            self.herb_rows[2 * position] = {}
+            self.herb_rows[2 * position + 1] = {}
+            return
+        self.herbs[herb_id] = herb
+        if herb.get("name"):
+            self.herb_names.setdefault(herb["name"], herb_id)
+        self.herb_rows[2 * position], self.herb_rows[2 * position + 1] = self.herb_vectors(herb)
+
+    def resolve_herb(self, item: Dict[str, Any]) -> Optional[str]:
+        """組成項目對應的中藥 ID：先比對 ID，再比對名稱（部分中藥檔的 ID 與方劑引用的不同）"""
+        herb_id = item.get("herb_id")
+        if herb_id in self.herbs:
+            return herb_id
+        return self.herb_names.get(item.get("name"))
+
+    def set_formula(self, formula_id: str, formula: Optional[Dict[str, Any]]):
+        """新增、更新或刪除（formula 為 None）方劑的係數列"""
+        old = self.formulas.pop(formula_id, None)
+        for item in (old or {}).get("composition") or []:
+            for key in [item.get("herb_id"), item.get("name")]:
+                self.references.get(key, set()).discard(formula_id)
+
+        position = self.formula_positions.get(formula_id)
+        if position is None:
+            if formula is None:
+                return
+            position = self.formula_positions[formula_id] = len(self.formula_ids)
+            self.formula_ids.append(formula_id)
+            self.coefficient_rows.append({})
+
+        if formula is None:
+            self.coefficient_rows[position] = {}
+            self.missing.pop(formula_id, None)
+            self.weights.pop(formula_id, None)
+            return
+
+        self.formulas[formula_id] = formula
+        row: Dict[int, float] = {}
+        missing: List[str] = []
+        for item in formula.get("composition") or []:
+            for key in [item.get("herb_id"), item.get("name")]:
+                if key:
+                    self.references.setdefault(key, set()).add(formula_id)
+
+            herb_id = self.resolve_herb(item)
+            if herb_id is None:
+                missing.append(item.get("name") or item.get("herb_id", ""))
+                continue
+            coefficient = ROLE_FACTORS.get(item.get("role"), 1.0) * dosage_factor(self.herbs[herb_id], item.get("amount"))
+            meridian = GUIDE_MERIDIAN_FACTOR if item.get("is_guide") else MERIDIAN_FACTOR
+            position_h = self.herb_positions[herb_id]
+            row[2 * position_h] = row.get(2 * position_h, 0.0) + coefficient
+            row[2 * position_h + 1] = row.get(2 * position_h + 1, 0.0) + coefficient * meridian
+        self.coefficient_rows[position] = row
+        self.missing[formula_id] = missing
+
+    def herb_matrix(self) -> SparseMatrix:
+        return SparseMatrix.from_rows(self.herb_rows, len(self.features))
+
+    def coefficient_matrix(self) -> SparseMatrix:
+        return SparseMatrix.from_rows(self.coefficient_rows, len(self.herb_rows))
+
+    def row_weights(self, row: Dict[int, float]) -> Weights:
+        weights: Weights = {section: {} for section in SECTIONS}
+        for col, value in row.items():
+            section, key = self.features[col]
+            weights[section][key] = value
+        return round_weights(weights)
+
+    def recompute(self, formula_ids: Optional[Iterable[str]] = None) -> List[str]:
+        """
+        重算方劑權重（formula_ids 為 None 時為全部方劑，以一次矩陣乘積計算），
+        回傳權重有變更的方劑 ID
+        """
+        coefficients = self.coefficient_matrix()
+        herbs = self.herb_matrix()
+        if formula_ids is None:
+            positions = range(len(self.formula_ids))
+            product = coefficients.multiply(herbs)
+            rows = [dict(zip(*product.row(f))) for f in positions]
+        else:
+            positions = [self.formula_positions[f] for f in formula_ids if f in self.formulas]
+            rows = [coefficients.row_product(f, herbs) for f in positions]
+
+        changed = []
+        for f, row in zip(positions, rows):
+            formula_id = self.formula_ids[f]
+            if formula_id not in self.formulas:
+                continue
+            weights = self.row_weights(row)
+            if weights != self.weights.get(formula_id):
+                self.weights[formula_id] = weights
+                changed.append(formula_id)
+        return changed
+
+    def affected_formulas(self, keys: Iterable[str]) -> List[str]:
+        """組成引用任一中藥 ID 或名稱的方劑"""
+        affected: Set[str] = set()
+        for key in keys:
+            affected |= self.references.get(key, set())
+        return sorted(affected, key=lambda formula_id: self.formula_positions[formula_id])
+
+    def update_herbs(self, herbs: Dict[str, Dict[str, Any]]) -> List[str]:
+        """
+        以最新的中藥資料更新：只重建有變更的中藥列，並只重算引用這些中藥的方劑
+        回傳權重有變更的方劑 ID
+        """
+        keys: Set[str] = set()
+        for herb_id in set(self.herbs) | set(herbs):
+            old, new = self.herbs.get(herb_id), herbs.get(herb_id)
+            if old == new:
+                continue
+            for herb in [old, new]:
+                if herb is not None:
+                    keys.add(herb_id)
+                    if herb.get("name"):
+                        keys.add(herb["name"])
+            self.set_herb(herb_id, new)
+
+        affected = self.affected_formulas(keys)
+        # 中藥新增、刪除或改名可能改變組成項目對應的中藥，重建這些方劑的係數列
+        for formula_id in affected:
+            self.set_formula(formula_id, self.formulas[formula_id])
+        return self.recompute(affected)
+
+    def update_formulas(self, formulas: Dict[str, Dict[str, Any]]) -> List[str]:
+        """以最新的方劑資料更新，只重算有變更的方劑；回傳權重有變更的方劑 ID"""
+        updated = []
+        for formula_id in set(self.formulas) | set(formulas):
+            old, new = self.formulas.get(formula_id), formulas.get(formula_id)
+            if old == new:
+                continue
+            # 只有權重本身被改寫（如 --write 寫回）時不需重算
+            if old is not None and new is not None and old.get("composition") == new.get("composition"):
+                self.formulas[formula_id] = new
+                continue
+            self.set_formula(formula_id, new)
+            if new is not None:
+                updated.append(formula_id)
+        return self.recompute(updated)
+
+    def stale_formulas(self) -> List[str]:
+        """檔案中的 calculated_weights 與計算結果不一致的方劑"""
+        return [
+            formula_id for formula_id in self.formula_ids
+            if formula_id in self.formulas
+            and weights_differ(self.formulas[formula_id].get("calculated_weights"), self.weights.get(formula_id))
+        ]
+
+
+def formula_file_names(corpus: Corpus) -> Dict[str, str]:
+    """方劑 ID → 檔名"""
+    return {
+        data["id"]: file_name
+        for file_name, (data, error) in corpus.file_records.get("formulas", {}).items()
+        if not error and isinstance(data, dict) and "id" in data
+    }
+
+
+def write_formula_weights(corpus: Corpus, engine: FormulaWeightEngine, formula_ids: Iterable[str]) -> List[str]:
+    """
+    將計算結果寫回方劑檔的 calculated_weights（只寫入與檔案內容不同者），回傳寫入的方劑 ID
+    組成中有缺少資料的中藥時不寫回，避免以不完整的結果覆蓋人工維護的權重
+    """
+    file_names = formula_file_names(corpus)
+    formulas_dir = corpus.data_dir / ENTITY_DIRS["formulas"]
+    written = []
+    for formula_id in formula_ids:
+        formula = engine.formulas.get(formula_id)
+        weights = engine.weights.get(formula_id)
+        if formula is None or weights is None or formula_id not in file_names or engine.missing.get(formula_id):
+            continue
+        if not weights_differ(formula.get("calculated_weights"), weights) and formula.get("calculated_weights"):
+            continue
+        updated = dict(formula)
+        updated["calculated_weights"] = weights
+        with open(formulas_dir / file_names[formula_id], 'w', encoding='utf-8') as f:
+            json.dump(updated, f, ensure_ascii=False, indent=2)
+            f.write("\n")
+        written.append(formula_id)
+    return written
+
+
+def format_weights(weights: Weights) -> str:
+    return "；".join(
+        f"{section}: " + "、".join(f"{key} {value:g}" for key, value in weights.get(section, {}).items())
+        for section in SECTIONS if weights.get(section)
+    )
+
+
+def print_formula(engine: FormulaWeightEngine, formula_id: str):
+    formula = engine.formulas[formula_id]
+    weights = engine.weights.get(formula_id, {})
+    stale = weights_differ(formula.get("calculated_weights"), weights)
+    print(f"\n{formula.get('name', formula_id)}（{formula_id}）{'⚠️  檔案中的權重已過期' if stale else '✅'}")
+    print(f"  計算: {format_weights(weights) or '無'}")
+    if stale and formula.get("calculated_weights"):
+        print(f"  檔案: {format_weights(formula['calculated_weights'])}")
+    if engine.missing.get(formula_id):
+        print(f"  缺少中藥資料: {'、'.join(engine.missing[formula_id])}")
+
+
+def watch_herbs(data_dir: Path, corpus: Corpus, engine: FormulaWeightEngine, write: bool, args) -> int:
+    """監看中藥與方劑目錄，變更時只重算受影響的方劑"""
+    from file_watcher import DirectoryWatcher
+
+    watcher = DirectoryWatcher(
+        {name: data_dir / ENTITY_DIRS[name] for name in ["herbs", "formulas"]},
+        polling=args.polling
+    )
+    print(f"\n👀 監看中 ({watcher.backend.name})：{ENTITY_DIRS['herbs']}, {ENTITY_DIRS['formulas']}")
+    print("按 Ctrl+C 結束")
+    try:
+        while True:
+            changes = watcher.wait_for_changes()
+            start = time.perf_counter()
+            changed: List[str] = []
+            for name, change in changes.items():
+                update_entity_files(corpus, name, change.changed, change.removed, args.jobs, args.pool)
+                if name == "herbs":
+                    changed += engine.update_herbs(corpus.herbs)
+                else:
+                    changed += engine.update_formulas(corpus.formulas)
+            changed = list(dict.fromkeys(changed))
+            elapsed = time.perf_counter() - start
+
+            print(f"\n重算 {len(changed)} 個方劑的權重（{elapsed * 1000:.1f} ms）")
+            for formula_id in changed:
+                print_formula(engine, formula_id)
+            if write and changed:
+                written = write_formula_weights(corpus, engine, changed)
+                print(f"✅ 已寫回 {len(written)} 個方劑檔")
+    except KeyboardInterrupt:
+        print("\n已停止監看")
+    finally:
+        watcher.close()
+    return 0
+
+
+def main():
+    """主函數"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="由方劑組成計算證素權重（calculated_weights）")
+    parser.add_argument(
+        "formulas",
+        nargs="*",
+        help="方劑 ID（如：mahuang_tang）；不指定時處理所有方劑"
+    )
+    parser.add_argument(
+        "--data-dir",
+        default="data",
+        help="資料目錄路徑 (預設: data)"
+    )
+    parser.add_argument(
+        "--check",
+        action="store_true",
+        help="檢查方劑檔中的權重是否與計算結果一致，不一致時以非零狀態結束"
+    )
+    parser.add_argument(
+        "--write",
+        action="store_true",
+        help="將計算結果寫回方劑檔的 calculated_weights"
+    )
+    parser.add_argument(
+        "--watch",
+        action="store_true",
+        help="監看中藥與方劑目錄，變更時只重算受影響的方劑"
+    )
+    parser.add_argument(
+        "--polling",
+        action="store_true",
+        help="監看模式強制使用輪詢（不使用 inotify）"
+    )
+    add_jobs_arguments(parser)
+    add_cache_arguments(parser)
+
+    args = parser.parse_args()
+
+    # 確定資料目錄
+    script_dir = Path(__file__).parent
+    data_dir = script_dir.parent / args.data_dir
+
+    if not data_dir.exists():
+        print(f"錯誤: 資料目錄不存在: {data_dir}")
+        return 1
+
+    cache = snapshot_cache_for(data_dir, args.no_cache, args.rebuild_cache)
+    corpus = load_corpus(data_dir, ["zhengsu", "herbs", "formulas"], args.jobs, args.pool, cache)
+
+    start = time.perf_counter()
+    engine = FormulaWeightEngine.from_corpus(corpus)
+    elapsed = time.perf_counter() - start
+    print(f"方劑權重: {len(engine.formulas)} 個方劑 × {len(engine.herbs)} 味中藥，"
+          f"{len(engine.features)} 個特徵，{elapsed * 1000:.1f} ms")
+
+    formula_ids = args.formulas or engine.formula_ids
+    unknown = [formula_id for formula_id in formula_ids if formula_id not in engine.formulas]
+    for formula_id in unknown:
+        print(f"\n❌ 找不到方劑: {formula_id}")
+    formula_ids = [formula_id for formula_id in formula_ids if formula_id in engine.formulas]
+
+    for formula_id in formula_ids:
+        print_formula(engine, formula_id)
+
+    if args.write:
+        written = write_formula_weights(corpus, engine, formula_ids)
+        print(f"\n✅ 已寫回 {len(written)} 個方劑檔")
+
+    if args.watch:
+        return watch_herbs(data_dir, corpus, engine, args.write, args)
+
+    stale = [formula_id for formula_id in engine.stale_formulas() if formula_id in formula_ids]
+    if args.check and stale and not args.write:
+        print(f"\n⚠️  權重已過期的方劑: {'、'.join(stale)}")
+        return 1
+    return 0 if not unknown else 1
+
+
+if __name__ == "__main__":
+    exit(main())
@@ -9,11 +9,17 @@
 4. evolution_graph.json - 演變關係圖（從現有資料增強）
 """
 
+import argparse
 import json
 import os
 import re
 from collections import defaultdict
 from datetime import datetime
+from pathlib import Path
+
+from corpus import read_json_files, add_jobs_arguments
+from index_shards import SHARD_MODES, group_keys, leading_char, write_shards
+from keyword_matcher import KeywordAutomaton
 
 # 路徑設定
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -60,19 +66,18 @@ def load_zhengsu_names():
     ZHENGSU_NAMES.update(extra_mappings)
 
 
-def load_all_syndromes():
-    """載入所有證候資料"""
+def load_all_syndromes(jobs=1, pool='thread'):
+    """載入所有證候資料（依檔名排序，平行讀取時順序不變）"""
+    filenames = sorted(f for f in os.listdir(SYNDROMES_DIR) if f.endswith('.json'))
+    paths = [Path(SYNDROMES_DIR) / filename for filename in filenames]
+
     syndromes = []
-    for filename in os.listdir(SYNDROMES_DIR):
-        if filename.endswith('.json'):
-            filepath = os.path.join(SYNDROMES_DIR, filename)
-            try:
-                with open(filepath, 'r', encoding='utf-8') as f:
-                    data = json.load(f)
-                    data['_filename'] = filename.replace('.json', '')
-                    syndromes.append(data)
-            except Exception as e:
-                print(f"Error loading {filename}: {e}")
+    for filepath, data, error in read_json_files(paths, jobs, pool):
+        if error:
+            print(f"Error loading {filepath.name}: {error}")
+            continue
+        data['_filename'] = filepath.stem
+        syndromes.append(data)
     return syndromes
 
 
@@ -81,128 +86,82 @@ def get_zhengsu_name(zs_id):
     return ZHENGSU_NAMES.get(zs_id, zs_id)
 
 
+# 各大類的子分類規則：依序檢查，名稱含任一關鍵字即歸入該子分類
+SUBCATEGORY_RULES = {
+    '基礎證候': ([
+        ('氣病系列', ['氣虛', '氣陷', '氣脫', '氣滯', '氣逆', '氣閉', '氣厥']),
+        ('血病系列', ['血虛', '血脫', '血瘀', '血熱', '血燥', '血寒']),
+        ('陰陽系列', ['陰虛', '陽虛', '亡陰', '亡陽', '失神']),
+        ('外邪系列', ['風證', '寒證', '暑證', '濕證', '燥證', '火熱', '邪毒']),
+        ('六經系列', ['太陽', '陽明', '少陽', '太陰', '少陰', '厥陰']),
+        ('衛氣營血系列', ['衛分', '氣分', '營分', '血分', '痰證']),
+        ('精津系列', ['精脫', '津虧']),
+    ], '其他基礎'),
+    '臟腑證候': ([
+        ('心系', ['心氣', '心血', '心陰', '心陽', '心火', '心脈', '痰迷心', '痰火擾心', '水氣凌心']),
+        ('肝系', ['肝氣', '肝血', '肝陰', '肝陽', '肝火', '肝風', '肝鬱', '肝經', '寒滯肝']),
+        ('脾系', ['脾氣', '脾陽', '脾陰', '脾虛', '脾不', '濕困脾', '寒濕困', '脾胃']),
+        ('肺系', ['肺氣', '肺陰', '肺陽', '肺熱', '風寒犯肺', '風熱犯肺', '燥邪犯肺', '痰熱壅肺', '痰濕阻肺', '飲停於肺']),
+        ('腎系', ['腎氣', '腎陰', '腎陽', '腎精', '腎虛', '腎不']),
+        ('腑系', ['胃', '膽', '大腸', '小腸', '膀胱', '三焦']),
+        ('臟腑兼證', ['心脾', '心肺', '心腎', '心肝', '肝脾', '肝腎', '肺脾', '肺腎', '脾腎', '肝膽', '脾胃']),
+    ], '其他臟腑'),
+    '傷寒證候': ([
+        ('太陽病類', ['太陽']),
+        ('陽明病類', ['陽明']),
+        ('少陽病類', ['少陽']),
+        ('太陰病類', ['太陰']),
+        ('少陰病類', ['少陰']),
+        ('厥陰病類', ['厥陰']),
+    ], '其他傷寒'),
+    '溫病證候': ([
+        ('衛分類', ['衛', '表']),
+        ('氣分類', ['氣分', '氣營']),
+        ('營分類', ['營']),
+        ('血分類', ['血']),
+    ], '其他溫病'),
+    '專科證候': ([
+        ('婦科', ['胞宮', '衝任', '月經', '帶下', '崩漏', '經', '產', '妊']),
+        ('兒科', ['兒', '小兒', '疳']),
+        ('眼科', ['目', '眼', '瞳', '視', '翳', '內障', '外障', '青盲', '雀目']),
+        ('耳科', ['耳', '聾', '鳴']),
+        ('鼻科', ['鼻', '鼽', '嚏']),
+        ('咽喉科', ['咽', '喉', '嗓']),
+        ('口齒科', ['齒', '牙', '口', '舌', '唇']),
+        ('外科', ['瘡', '癰', '疽', '疔', '癤', '瘍', '瘻', '痔', '蟲']),
+        ('皮膚科', ['癢', '疹', '斑', '皮', '瘡']),
+    ], '其他專科'),
+    '全身證候': ([
+        ('氣虛類', ['氣虛', '氣陷']),
+        ('血虛類', ['血虛']),
+        ('陰虛類', ['陰虛']),
+        ('陽虛類', ['陽虛']),
+        ('氣滯類', ['氣滯', '氣鬱']),
+        ('血瘀類', ['血瘀', '瘀血']),
+        ('痰證類', ['痰']),
+        ('濕證類', ['濕']),
+        ('寒證類', ['寒']),
+        ('熱證類', ['熱', '火']),
+    ], '其他全身'),
+}
+
+# 子分類關鍵字自動機：大類 → (自動機, 預設子分類)
+SUBCATEGORY_MATCHERS = {
+    category: (KeywordAutomaton((keyword, sub) for sub, keywords in rules for keyword in keywords), default)
+    for category, (rules, default) in SUBCATEGORY_RULES.items()
+}
+
+
 def classify_syndrome(syndrome):
     """根據證候名稱和內容進一步分類"""
     name = syndrome.get('name', '')
     category = syndrome.get('category', '')
 
-    # 基礎證候子分類
-    if category == '基礎證候':
-        if any(x in name for x in ['氣虛', '氣陷', '氣脫', '氣滯', '氣逆', '氣閉', '氣厥']):
-            return '氣病系列'
-        elif any(x in name for x in ['血虛', '血脫', '血瘀', '血熱', '血燥', '血寒']):
-            return '血病系列'
-        elif any(x in name for x in ['陰虛', '陽虛', '亡陰', '亡陽', '失神']):
-            return '陰陽系列'
-        elif any(x in name for x in ['風證', '寒證', '暑證', '濕證', '燥證', '火熱', '邪毒']):
-            return '外邪系列'
-        elif any(x in name for x in ['太陽', '陽明', '少陽', '太陰', '少陰', '厥陰']):
-            return '六經系列'
-        elif any(x in name for x in ['衛分', '氣分', '營分', '血分', '痰證']):
-            return '衛氣營血系列'
-        elif any(x in name for x in ['精脫', '津虧']):
-            return '精津系列'
-        else:
-            return '其他基礎'
-
-    # 臟腑證候子分類
-    elif category == '臟腑證候':
-        if any(x in name for x in ['心氣', '心血', '心陰', '心陽', '心火', '心脈', '痰迷心', '痰火擾心', '水氣凌心']):
-            return '心系'
-        elif any(x in name for x in ['肝氣', '肝血', '肝陰', '肝陽', '肝火', '肝風', '肝鬱', '肝經', '寒滯肝']):
-            return '肝系'
-        elif any(x in name for x in ['脾氣', '脾陽', '脾陰', '脾虛', '脾不', '濕困脾', '寒濕困', '脾胃']):
-            return '脾系'
-        elif any(x in name for x in ['肺氣', '肺陰', '肺陽', '肺熱', '風寒犯肺', '風熱犯肺', '燥邪犯肺', '痰熱壅肺', '痰濕阻肺', '飲停於肺']):
-            return '肺系'
-        elif any(x in name for x in ['腎氣', '腎陰', '腎陽', '腎精', '腎虛', '腎不']):
-            return '腎系'
-        elif any(x in name for x in ['胃', '膽', '大腸', '小腸', '膀胱', '三焦']):
-            return '腑系'
-        elif any(x in name for x in ['心脾', '心肺', '心腎', '心肝', '肝脾', '肝腎', '肺脾', '肺腎', '脾腎', '肝膽', '脾胃']):
-            return '臟腑兼證'
-        else:
-            return '其他臟腑'
-
-    # 傷寒證候子分類
-    elif category == '傷寒證候':
-        if '太陽' in name:
-            return '太陽病類'
-        elif '陽明' in name:
-            return '陽明病類'
-        elif '少陽' in name:
-            return '少陽病類'
-        elif '太陰' in name:
-            return '太陰病類'
-        elif '少陰' in name:
-            return '少陰病類'
-        elif '厥陰' in name:
-            return '厥陰病類'
-        else:
-            return '其他傷寒'
-
-    # 溫病證候子分類
-    elif category == '溫病證候':
-        if '衛' in name or '表' in name:
-            return '衛分類'
-        elif '氣分' in name or '氣營' in name:
-            return '氣分類'
-        elif '營' in name:
-            return '營分類'
-        elif '血' in name:
-            return '血分類'
-        else:
-            return '其他溫病'
-
-    # 專科證候子分類
-    elif category == '專科證候':
-        if any(x in name for x in ['胞宮', '衝任', '月經', '帶下', '崩漏', '經', '產', '妊']):
-            return '婦科'
-        elif any(x in name for x in ['兒', '小兒', '疳']):
-            return '兒科'
-        elif any(x in name for x in ['目', '眼', '瞳', '視', '翳', '內障', '外障', '青盲', '雀目']):
-            return '眼科'
-        elif any(x in name for x in ['耳', '聾', '鳴']):
-            return '耳科'
-        elif any(x in name for x in ['鼻', '鼽', '嚏']):
-            return '鼻科'
-        elif any(x in name for x in ['咽', '喉', '嗓']):
-            return '咽喉科'
-        elif any(x in name for x in ['齒', '牙', '口', '舌', '唇']):
-            return '口齒科'
-        elif any(x in name for x in ['瘡', '癰', '疽', '疔', '癤', '瘍', '瘻', '痔', '蟲']):
-            return '外科'
-        elif any(x in name for x in ['癢', '疹', '斑', '皮', '瘡']):
-            return '皮膚科'
-        else:
-            return '其他專科'
-
-    # 全身證候子分類
-    elif category == '全身證候':
-        if '氣虛' in name or '氣陷' in name:
-            return '氣虛類'
-        elif '血虛' in name:
-            return '血虛類'
-        elif '陰虛' in name:
-            return '陰虛類'
-        elif '陽虛' in name:
-            return '陽虛類'
-        elif '氣滯' in name or '氣鬱' in name:
-            return '氣滯類'
-        elif '血瘀' in name or '瘀血' in name:
-            return '血瘀類'
-        elif '痰' in name:
-            return '痰證類'
-        elif '濕' in name:
-            return '濕證類'
-        elif '寒' in name:
-            return '寒證類'
-        elif '熱' in name or '火' in name:
-            return '熱證類'
-        else:
-            return '其他全身'
-
-    return '未分類'
+    if category not in SUBCATEGORY_MATCHERS:
+        return '未分類'
+
+    matcher, default = SUBCATEGORY_MATCHERS[category]
+    return matcher.first(name, default)
 
 
 def generate_syndrome_index(syndromes):
@@ -343,26 +302,24 @@ def extract_symptoms(text):
     return list(set(symptoms))
 
 
-def categorize_symptom(symptom):
-    """將症狀分類到八大類之一"""
-    # 定義分類規則
-    categories = {
-        '頭面五官': ['頭', '目', '眼', '耳', '鼻', '口', '舌', '咽', '喉', '面', '齒', '牙', '唇', '視', '聽', '嗅'],
-        '胸脅腹部': ['胸', '心', '脅', '腹', '脘', '胃', '肋', '乳'],
-        '腰背四肢': ['腰', '背', '肢', '臂', '腿', '膝', '足', '手', '指', '筋', '骨', '關節'],
-        '二便': ['便', '尿', '小便', '大便', '溺', '利'],
-        '寒熱汗出': ['寒', '熱', '汗', '發熱', '惡寒', '潮熱', '盜汗', '自汗', '冷', '溫'],
-        '神志精神': ['神', '志', '眠', '夢', '悸', '怔', '煩', '驚', '恐', '怒', '憂', '思', '悲', '喜', '恍惚', '健忘', '失眠', '嗜睡'],
-        '飲食口味': ['食', '飲', '渴', '口', '納', '味', '嘔', '吐', '噁', '呃', '噫', '吞'],
-        '婦科': ['經', '帶', '孕', '產', '乳', '胞', '崩', '漏', '月']
-    }
+# 症狀八大類的分類規則：依序檢查，症狀含任一關鍵字即歸入該類
+SYMPTOM_CATEGORY_RULES = {
+    '頭面五官': ['頭', '目', '眼', '耳', '鼻', '口', '舌', '咽', '喉', '面', '齒', '牙', '唇', '視', '聽', '嗅'],
+    '胸脅腹部': ['胸', '心', '脅', '腹', '脘', '胃', '肋', '乳'],
+    '腰背四肢': ['腰', '背', '肢', '臂', '腿', '膝', '足', '手', '指', '筋', '骨', '關節'],
+    '二便': ['便', '尿', '小便', '大便', '溺', '利'],
+    '寒熱汗出': ['寒', '熱', '汗', '發熱', '惡寒', '潮熱', '盜汗', '自汗', '冷', '溫'],
+    '神志精神': ['神', '志', '眠', '夢', '悸', '怔', '煩', '驚', '恐', '怒', '憂', '思', '悲', '喜', '恍惚', '健忘', '失眠', '嗜睡'],
+    '飲食口味': ['食', '飲', '渴', '口', '納', '味', '嘔', '吐', '噁', '呃', '噫', '吞'],
+    '婦科': ['經', '帶', '孕', '產', '乳', '胞', '崩', '漏', '月']
+}
 
-    for cat_name, keywords in categories.items():
-        for keyword in keywords:
-            if keyword in symptom:
-                return cat_name
+SYMPTOM_CATEGORY_MATCHER = KeywordAutomaton.from_groups(SYMPTOM_CATEGORY_RULES)
 
-    return '其他'
+
+def categorize_symptom(symptom):
+    """將症狀分類到八大類之一"""
+    return SYMPTOM_CATEGORY_MATCHER.first(symptom, '其他')
 
 
 def generate_symptom_categories(syndromes):
@@ -424,10 +381,21 @@ def generate_symptom_categories(syndromes):
     return result
 
 
-def generate_symptom_to_syndrome(syndromes):
-    """生成症狀到證型的反向索引"""
-    print("生成症狀反查索引...")
+def intern(table, lookup, value):
+    """將字串放入共用表，回傳其位置（相同字串只存一次）"""
+    if value not in lookup:
+        lookup[value] = len(table)
+        table.append(value)
+    return lookup[value]
 
+
+def collect_symptom_refs(syndromes):
+    """
+    收集症狀 → 證候的對應
+    回傳 (證候資訊表, 症狀 → 證候資訊表位置列表)；內容相同的證候資訊視為同一筆（與 v2 的去重規則一致）
+    """
+    syndrome_rows = []
+    syndrome_lookup = {}
     symptom_index = defaultdict(list)
 
     for syn in syndromes:
@@ -442,20 +410,105 @@ def generate_symptom_to_syndrome(syndromes):
         location_names = [get_zhengsu_name(loc) for loc in location]
         nature_names = [get_zhengsu_name(nat) for nat in nature]
 
-        syn_info = {
-            'id': syn.get('id', syn.get('_filename', '')),
-            'name': syn.get('name', ''),
-            'category': syn.get('category', ''),
-            'location': location_names,
-            'nature': nature_names
-        }
+        syn_info = (
+            syn.get('id', syn.get('_filename', '')),
+            syn.get('name', ''),
+            syn.get('category', ''),
+            tuple(location_names),
+            tuple(nature_names)
+        )
 
         for symptom in symptoms:
+            ref = intern(syndrome_rows, syndrome_lookup, syn_info)
             # 避免重複
-            if syn_info not in symptom_index[symptom]:
-                symptom_index[symptom].append(syn_info)
+            if ref not in symptom_index[symptom]:
+                symptom_index[symptom].append(ref)
 
-    # 建構輸出結構
+    return syndrome_rows, symptom_index
+
+
+def generate_symptom_to_syndrome(syndromes, legacy=False):
+    """
+    生成症狀到證型的反向索引
+    預設輸出 v3 精簡格式：證候資訊只在證候表中出現一次，各症狀以整數位置引用證候，
+    證素名稱與分類名稱亦以共用表去重；legacy=True 時輸出舊版 v2 格式（每個症狀內嵌完整證候資訊）
+    """
+    print("生成症狀反查索引...")
+
+    syndrome_rows, symptom_index = collect_symptom_refs(syndromes)
+    if legacy:
+        return build_symptom_to_syndrome_v2(syndrome_rows, symptom_index)
+    return build_symptom_to_syndrome_v3(syndrome_rows, symptom_index)
+
+
+def generate_symptom_to_syndrome_shards(syndromes, shard_by, legacy=False):
+    """
+    生成分片的症狀反查索引：依症狀分類或首字分組，每組各自編碼為完整的索引文件
+    （v3 分片各有自己的證候表，可獨立解讀）
+    """
+    print(f"生成症狀反查索引分片（依{'分類' if shard_by == 'category' else '首字'}）...")
+
+    syndrome_rows, symptom_index = collect_symptom_refs(syndromes)
+    key_fn = categorize_symptom if shard_by == 'category' else leading_char
+    build = build_symptom_to_syndrome_v2 if legacy else build_symptom_to_syndrome_v3
+
+    return {
+        shard_key: build(syndrome_rows, {symptom: symptom_index[symptom] for symptom in symptoms})
+        for shard_key, symptoms in group_keys(symptom_index, key_fn).items()
+    }
+
+
+def build_symptom_to_syndrome_v3(syndrome_rows, symptom_index):
+    """以證候表與整數引用組出 v3 精簡格式"""
+    # 只保留被引用的證候，並依首次引用順序重新編號
+    zhengsu_names, zhengsu_lookup = [], {}
+    syndrome_categories, syndrome_category_lookup = [], {}
+    symptom_categories, symptom_category_lookup = [], {}
+    syndromes_table, remap = [], {}
+
+    result = {
+        'version': '3.0',
+        'generated_at': datetime.now().strftime('%Y-%m-%d'),
+        'description': '症狀到證型的反向索引（精簡格式），支援首頁症狀反查功能',
+        'syndrome_fields': ['id', 'name', 'category', 'location', 'nature'],
+        'symptom_fields': ['category', 'related_syndromes'],
+        'zhengsu_names': zhengsu_names,
+        'syndrome_categories': syndrome_categories,
+        'symptom_categories': symptom_categories,
+        'syndromes': syndromes_table,
+        'symptoms': {}
+    }
+
+    total_mappings = 0
+    for symptom, refs in sorted(symptom_index.items()):
+        compact_refs = []
+        for ref in refs:
+            if ref not in remap:
+                syn_id, name, category, location_names, nature_names = syndrome_rows[ref]
+                remap[ref] = len(syndromes_table)
+                syndromes_table.append([
+                    syn_id,
+                    name,
+                    intern(syndrome_categories, syndrome_category_lookup, category),
+                    [intern(zhengsu_names, zhengsu_lookup, n) for n in location_names],
+                    [intern(zhengsu_names, zhengsu_lookup, n) for n in nature_names]
+                ])
+            compact_refs.append(remap[ref])
+
+        result['symptoms'][symptom] = [
+            intern(symptom_categories, symptom_category_lookup, categorize_symptom(symptom)),
+            compact_refs
+        ]
+        total_mappings += len(compact_refs)
+
+    result['total_symptoms'] = len(result['symptoms'])
+    result['total_mappings'] = total_mappings
+
+    return result
+
+
+def build_symptom_to_syndrome_v2(syndrome_rows, symptom_index):
+    """以證候表與整數引用組出舊版 v2 格式"""
     result = {
         'version': '2.0',
         'generated_at': datetime.now().strftime('%Y-%m-%d'),
@@ -463,8 +516,18 @@ def generate_symptom_to_syndrome(syndromes):
         'symptoms': {}
     }
 
-    for symptom, syn_list in sorted(symptom_index.items()):
-        if len(syn_list) >= 1:  # 至少關聯1個證候
+    for symptom, refs in sorted(symptom_index.items()):
+        if len(refs) >= 1:  # 至少關聯1個證候
+            syn_list = []
+            for ref in refs:
+                syn_id, name, category, location_names, nature_names = syndrome_rows[ref]
+                syn_list.append({
+                    'id': syn_id,
+                    'name': name,
+                    'category': category,
+                    'location': list(location_names),
+                    'nature': list(nature_names)
+                })
             result['symptoms'][symptom] = {
                 'display_name': symptom,
                 'category': categorize_symptom(symptom),
@@ -548,6 +611,20 @@ def generate_evolution_graph(syndromes):
 
 def main():
     """主函數"""
+    parser = argparse.ArgumentParser(description='生成首頁索引資料')
+    parser.add_argument(
+        '--legacy-symptom-index',
+        action='store_true',
+        help='symptom_to_syndrome.json 輸出舊版 v2 格式（每個症狀內嵌完整證候資訊）'
+    )
+    parser.add_argument(
+        '--shard-by',
+        choices=SHARD_MODES,
+        help='另將症狀反查索引依症狀分類 (category) 或首字 (char) 分片輸出至 symptom_to_syndrome/（尚無頁面讀取，預設不輸出）'
+    )
+    add_jobs_arguments(parser)
+    args = parser.parse_args()
+
     print("=" * 60)
     print("首頁索引資料生成腳本")
     print("=" * 60)
@@ -560,13 +637,13 @@ def main():
     print(f"載入 {len(ZHENGSU_NAMES)} 個證素名稱映射")
 
     # 載入所有證候
-    syndromes = load_all_syndromes()
+    syndromes = load_all_syndromes(args.jobs, args.pool)
     print(f"載入 {len(syndromes)} 個證候資料")
 
     # 生成各個索引
     syndrome_index = generate_syndrome_index(syndromes)
     symptom_categories = generate_symptom_categories(syndromes)
-    symptom_to_syndrome = generate_symptom_to_syndrome(syndromes)
+    symptom_to_syndrome = generate_symptom_to_syndrome(syndromes, args.legacy_symptom_index)
     evolution_graph = generate_evolution_graph(syndromes)
 
     # 輸出檔案
@@ -584,7 +661,11 @@ def main():
     for filename, data in outputs:
         filepath = os.path.join(OUTPUT_DIR, filename)
         with open(filepath, 'w', encoding='utf-8') as f:
-            json.dump(data, f, ensure_ascii=False, indent=2)
+            if data.get('version') == '3.0':
+                # 精簡格式供瀏覽器下載，不加縮排
+                json.dump(data, f, ensure_ascii=False, separators=(',', ':'))
+            else:
+                json.dump(data, f, ensure_ascii=False, indent=2)
 
         # 統計資訊
         if filename == 'syndrome_index.json':
@@ -610,6 +691,20 @@ def main():
             print(f"  - 總邊數: {data['statistics']['total_edges']}")
             print(f"  - 危重節點: {data['statistics']['critical_nodes']}")
 
+    if args.shard_by:
+        shards = generate_symptom_to_syndrome_shards(syndromes, args.shard_by, args.legacy_symptom_index)
+        shard_dir = Path(OUTPUT_DIR) / 'symptom_to_syndrome'
+        manifest = write_shards(
+            shard_dir, shards, args.shard_by,
+            '症狀反查索引分片對照表：分片鍵 → 分片檔',
+            compact=not args.legacy_symptom_index
+        )
+        largest = max((s['bytes'] for s in manifest['shards'].values()), default=0)
+        print("\nsymptom_to_syndrome/manifest.json:")
+        print(f"  - 分片數: {len(manifest['shards'])}")
+        print(f"  - 總症狀數: {manifest['total_symptoms']}")
+        print(f"  - 最大分片: {largest / 1024:.1f} KB")
+
     print("\n" + "=" * 60)
     print("生成完成！")
     print("=" * 60)
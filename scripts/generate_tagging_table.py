@@ -3,10 +3,13 @@
 生成證型-證素對照表 (zhengsu_tagging_table.md)
 """
 
+import argparse
 import json
 from pathlib import Path
 from collections import defaultdict
 
+from corpus import entity_files, read_json_files, add_jobs_arguments
+
 # 路徑設定
 DATA_DIR = Path(__file__).parent.parent / "data"
 SYNDROMES_DIR = DATA_DIR / "zhenghou" / "syndromes"
@@ -45,18 +48,13 @@ def load_zhengsu_names():
     return location_names, nature_names
 
 
-def load_all_syndromes():
+def load_all_syndromes(jobs=1, pool="thread"):
     """載入所有證候資料"""
-    syndromes = []
-    for filepath in SYNDROMES_DIR.glob("*.json"):
-        if filepath.name.startswith("_"):
-            continue
-        try:
-            with open(filepath, "r", encoding="utf-8") as f:
-                data = json.load(f)
-                syndromes.append(data)
-        except Exception:
-            pass
+    paths = entity_files(SYNDROMES_DIR)
+    syndromes = [
+        data for _, data, error in read_json_files(paths, jobs, pool)
+        if not error
+    ]
 
     # 按編號排序
     syndromes.sort(key=lambda x: x.get("number", 9999))
@@ -71,10 +69,10 @@ def format_zhengsu_list(ids, name_map):
     return ", ".join(sorted(names))
 
 
-def generate_table():
+def generate_table(jobs=1, pool="thread"):
     """產生對照表"""
     location_names, nature_names = load_zhengsu_names()
-    syndromes = load_all_syndromes()
+    syndromes = load_all_syndromes(jobs, pool)
 
     # 按分類分組
     by_category = defaultdict(list)
@@ -152,7 +150,11 @@ def generate_table():
 
 def main():
     """主函數"""
-    content = generate_table()
+    parser = argparse.ArgumentParser(description="生成證型-證素對照表")
+    add_jobs_arguments(parser)
+    args = parser.parse_args()
+
+    content = generate_table(args.jobs, args.pool)
 
     # 確保目錄存在
     ANALYSIS_DIR.mkdir(parents=True, exist_ok=True)
@@ -0,0 +1,377 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+依目標證素組合搜尋中藥組合
+每味中藥的證素涵蓋（各功效 functions[].zhengsu 的聯集）預先編碼為整數位元集合，
+以集束搜尋（beam search）逐味加入中藥，尋找 3–12 味、涵蓋目標證素最完整且多餘證素最少的組合；
+禁忌證素（contraindications）或注意事項（cautions）提及目標證素的中藥不納入候選
+
+目標證素涵蓋相同的中藥只保留多餘證素最少的前幾味，候選數受目標證素數限制而不隨藥庫成長，
+2,000 味的藥庫仍可在一秒內回傳結果
+"""
+
+import heapq
+import time
+from pathlib import Path
+from typing import Dict, List, Any, Iterable, Optional, Set, Tuple
+from dataclasses import dataclass
+
+from corpus import Corpus, load_corpus, add_jobs_arguments, add_cache_arguments, snapshot_cache_for
+
+
+DEFAULT_MIN_HERBS = 3
+DEFAULT_MAX_HERBS = 12
+DEFAULT_BEAM_WIDTH = 64
+DEFAULT_TOP = 5
+
+# 每種目標證素涵蓋保留的中藥數
+DEFAULT_PER_COVERAGE = 8
+
+# 計分：目標涵蓋率（0–1）減去每個多餘證素與每味中藥的扣分
+OFF_TARGET_PENALTY = 0.05
+HERB_PENALTY = 0.01
+
+# 注意事項中以證素名稱比對時，單字名稱（如「寒」「火」）容易誤中，不納入
+MIN_CAUTION_NAME_LENGTH = 2
+
+
+@dataclass
+class HerbCombination:
+    """中藥組合：herbs 依加入順序排列"""
+    herbs: List[str]
+    score: float
+    coverage: float
+    covered: List[str]
+    missing: List[str]
+    off_target: List[str]
+
+
+def herb_zhengsu(herb: Dict[str, Any]) -> Set[str]:
+    """中藥各功效的證素聯集"""
+    return {zhengsu_id for function in herb.get("functions") or [] for zhengsu_id in function.get("zhengsu") or []}
+
+
+class HerbLibrary:
+    """
+    中藥證素涵蓋位元集合
+    zhengsu[i] 為第 i 個位元的證素；coverage[h] 為第 h 味中藥的涵蓋，cautions[h] 為其禁忌證素
+    """
+
+    def __init__(self, herbs: Dict[str, Dict[str, Any]], zhengsu: Dict[str, Dict[str, Any]]):
+        self.zhengsu: List[str] = list(zhengsu)
+        self.bits: Dict[str, int] = {}
+        for zhengsu_id in self.zhengsu:
+            self.bits[zhengsu_id] = 1 << len(self.bits)
+        self.zhengsu_names = {zhengsu_id: data.get("name", zhengsu_id) for zhengsu_id, data in zhengsu.items()}
+        caution_names = [
+            (name, zhengsu_id) for zhengsu_id, name in self.zhengsu_names.items()
+            if len(name) >= MIN_CAUTION_NAME_LENGTH
+        ]
+
+        # 只收有功效證素的中藥（無 functions 的舊結構中藥無法計算涵蓋）
+        self.herb_ids: List[str] = []
+        self.names: List[str] = []
+        self.coverage: List[int] = []
+        self.cautions: List[int] = []
+        self.caution_texts: List[List[str]] = []
+        for herb_id, herb in herbs.items():
+            covered = herb_zhengsu(herb)
+            if not covered:
+                continue
+            texts = herb.get("cautions") or []
+            avoided = set(herb.get("contraindications") or [])
+            avoided.update(zhengsu_id for name, zhengsu_id in caution_names if any(name in text for text in texts))
+
+            self.herb_ids.append(herb_id)
+            self.names.append(herb.get("name", herb_id))
+            self.coverage.append(self.encode(covered))
+            self.cautions.append(self.encode(avoided))
+            self.caution_texts.append(texts)
+
+    @classmethod
+    def from_corpus(cls, corpus: Corpus) -> "HerbLibrary":
+        return cls(corpus.herbs, corpus.zhengsu)
+
+    def __len__(self) -> int:
+        return len(self.herb_ids)
+
+    def encode(self, zhengsu_ids: Iterable[str]) -> int:
+        """證素 ID → 位元集合（未收錄的證素給予新位元）；建立藥庫時使用，查詢請用 lookup"""
+        mask = 0
+        for zhengsu_id in zhengsu_ids:
+            bit = self.bits.get(zhengsu_id)
+            if bit is None:
+                bit = self.bits[zhengsu_id] = 1 << len(self.zhengsu)
+                self.zhengsu.append(zhengsu_id)
+            mask |= bit
+        return mask
+
+    def lookup(self, zhengsu_ids: Iterable[str]) -> Tuple[int, List[str]]:
+        """證素 ID → (位元集合, 藥庫中沒有的證素)；查詢用，不改動位元配置"""
+        mask = 0
+        unknown = []
+        for zhengsu_id in zhengsu_ids:
+            bit = self.bits.get(zhengsu_id)
+            if bit is None:
+                unknown.append(zhengsu_id)
+            else:
+                mask |= bit
+        return mask, unknown
+
+    def decode(self, mask: int) -> List[str]:
+        return [zhengsu_id for zhengsu_id, bit in self.bits.items() if mask & bit]
+
+    def excluded(self, target: int, avoid: Iterable[str] = ()) -> Dict[int, str]:
+        """
+        不納入候選的中藥（序號 → 原因）：
+        禁忌證素或注意事項提及目標證素者，以及注意事項含 avoid 關鍵詞（如「孕婦」）者
+        """
+        avoid = list(avoid)
+        reasons: Dict[int, str] = {}
+        for h in range(len(self.herb_ids)):
+            conflict = self.cautions[h] & target
+            if conflict:
+                names = "、".join(self.zhengsu_names.get(z, z) for z in self.decode(conflict))
+                reasons[h] = f"禁忌/慎用: {names}"
+                continue
+            hits = [keyword for keyword in avoid if any(keyword in text for text in self.caution_texts[h])]
+            if hits:
+                reasons[h] = f"注意事項: {'、'.join(hits)}"
+        return reasons
+
+    def candidates(self, target: int, excluded: Iterable[int], per_coverage: int = DEFAULT_PER_COVERAGE) -> List[int]:
+        """
+        涵蓋任一目標證素的候選中藥
+        目標涵蓋相同者只保留多餘證素最少的 per_coverage 味（同數依序號）
+        """
+        excluded = set(excluded)
+        groups: Dict[int, List[Tuple[int, int]]] = {}
+        for h, mask in enumerate(self.coverage):
+            if h in excluded or not mask & target:
+                continue
+            groups.setdefault(mask & target, []).append(((mask & ~target).bit_count(), h))
+        return sorted(h for group in groups.values() for _, h in heapq.nsmallest(per_coverage, group))
+
+    def search(self, target_ids: Iterable[str], min_herbs: int = DEFAULT_MIN_HERBS,
+               max_herbs: int = DEFAULT_MAX_HERBS, beam_width: int = DEFAULT_BEAM_WIDTH,
+               top: int = DEFAULT_TOP, avoid: Iterable[str] = (),
+               weights: Optional[Dict[str, float]] = None) -> List[HerbCombination]:
+        """
+        搜尋涵蓋目標證素的中藥組合（min_herbs–max_herbs 味），回傳分數最高的 top 組
+        weights 為各目標證素的權重（預設皆為 1）；組合以中藥序號位元集合去除重複
+        藥庫中沒有的目標證素無從涵蓋：仍計入涵蓋率的分母，並列於 missing
+        """
+        target_ids = list(dict.fromkeys(target_ids))
+        target, unknown = self.lookup(target_ids)
+        if not target:
+            return []
+        weights = weights or {}
+        bit_weights = [(self.bits[z], weights.get(z, 1.0)) for z in self.decode(target)]
+        total_weight = sum(weights.get(z, 1.0) for z in target_ids) or 1.0
+
+        def evaluate(mask: int, size: int) -> Tuple[float, float]:
+            covered = sum(weight for bit, weight in bit_weights if mask & bit) / total_weight
+            off = (mask & ~target).bit_count()
+            return covered - OFF_TARGET_PENALTY * off - HERB_PENALTY * size, covered
+
+        pool = self.candidates(target, self.excluded(target, avoid))
+        if len(pool) < min_herbs:
+            return []
+
+        # 狀態：(分數, 已選中藥的序號位元集合, 涵蓋, 依加入順序的中藥)
+        beam: List[Tuple[float, int, int, Tuple[int, ...]]] = [(0.0, 0, 0, ())]
+        finished: Dict[int, Tuple[float, int, Tuple[int, ...]]] = {}
+        for size in range(1, max_herbs + 1):
+            expanded: Dict[int, Tuple[float, int, int, Tuple[int, ...]]] = {}
+            for _, chosen, mask, herbs in beam:
+                for h in pool:
+                    bit = 1 << h
+                    if chosen & bit:
+                        continue
+                    # 已達最少味數後，只加入能補上目標證素的中藥（其他中藥只會增加扣分）
+                    if size > min_herbs and not self.coverage[h] & target & ~mask:
+                        continue
+                    key = chosen | bit
+                    if key in expanded:
+                        continue
+                    new_mask = mask | self.coverage[h]
+                    score, _ = evaluate(new_mask, size)
+                    expanded[key] = (score, key, new_mask, herbs + (h,))
+            if not expanded:
+                break
+
+            beam = heapq.nlargest(beam_width, expanded.values(), key=lambda state: (state[0], -state[1]))
+            if size >= min_herbs:
+                for score, key, mask, herbs in beam:
+                    finished[key] = (score, mask, herbs)
+
+        ranked = heapq.nlargest(top, finished.items(), key=lambda item: (item[1][0], -item[0]))
+        results = []
+        for _, (score, mask, herbs) in ranked:
+            _, coverage = evaluate(mask, len(herbs))
+            results.append(HerbCombination(
+                herbs=[self.herb_ids[h] for h in herbs],
+                score=round(score, 4),
+                coverage=round(coverage, 4),
+                covered=self.decode(mask & target),
+                missing=self.decode(target & ~mask) + unknown,
+                off_target=self.decode(mask & ~target)
+            ))
+        return results
+
+
+def syndrome_target(corpus: Corpus, syndrome_id: str) -> Optional[List[str]]:
+    """證候或證型的證素組成（病位 + 病性）；找不到時回傳 None"""
+    for entities in [corpus.syndromes, corpus.zhengxing]:
+        if syndrome_id in entities:
+            composition = entities[syndrome_id].get("zhengsu_composition") or {}
+            return list(dict.fromkeys(
+                zhengsu_id for role in ["location", "nature"] for zhengsu_id in composition.get(role, [])
+            ))
+    return None
+
+
+def synthetic_herbs(herbs: Dict[str, Dict[str, Any]], zhengsu: List[str], count: int,
+                    seed: int = 0) -> Dict[str, Dict[str, Any]]:
+    """產生指定數量的模擬中藥（效能測試用）：保留既有中藥，其餘隨機給予 1–3 個功效、每個 2–3 個證素"""
+    import random
+
+    rng = random.Random(seed)
+    library = dict(herbs)
+    for i in range(len(library), count):
+        functions = [{"zhengsu": rng.sample(zhengsu, rng.randint(2, 3))} for _ in range(rng.randint(1, 3))]
+        library[f"synthetic_{i}"] = {
+            "name": f"模擬藥{i}",
+            "functions": functions,
+            "contraindications": rng.sample(zhengsu, rng.randint(0, 2))
+        }
+    return library
+
+
+def main():
+    """主函數"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="依目標證素組合搜尋中藥組合")
+    parser.add_argument(
+        "target",
+        nargs="+",
+        help="證候/證型 ID（如：feiqixu，取其證素組成）或證素 ID（如：pi qi_xu）"
+    )
+    parser.add_argument(
+        "--data-dir",
+        default="data",
+        help="資料目錄路徑 (預設: data)"
+    )
+    parser.add_argument(
+        "--min-herbs",
+        type=int,
+        default=DEFAULT_MIN_HERBS,
+        help=f"最少味數 (預設: {DEFAULT_MIN_HERBS})"
+    )
+    parser.add_argument(
+        "--max-herbs",
+        type=int,
+        default=DEFAULT_MAX_HERBS,
+        help=f"最多味數 (預設: {DEFAULT_MAX_HERBS})"
+    )
+    parser.add_argument(
+        "--beam",
+        type=int,
+        default=DEFAULT_BEAM_WIDTH,
+        help=f"集束寬度 (預設: {DEFAULT_BEAM_WIDTH})"
+    )
+    parser.add_argument(
+        "-k", "--top",
+        type=int,
+        default=DEFAULT_TOP,
+        help=f"回傳組合數 (預設: {DEFAULT_TOP})"
+    )
+    parser.add_argument(
+        "--avoid",
+        action="append",
+        default=[],
+        help="排除注意事項含此關鍵詞的中藥（可重複，如：--avoid 孕婦）"
+    )
+    parser.add_argument(
+        "--scale",
+        type=int,
+        help="效能測試：以模擬中藥補足至指定味數後計時"
+    )
+    add_jobs_arguments(parser)
+    add_cache_arguments(parser)
+
+    args = parser.parse_args()
+
+    # 確定資料目錄
+    script_dir = Path(__file__).parent
+    data_dir = script_dir.parent / args.data_dir
+
+    if not data_dir.exists():
+        print(f"錯誤: 資料目錄不存在: {data_dir}")
+        return 1
+
+    if not 1 <= args.min_herbs <= args.max_herbs:
+        print("錯誤: 味數範圍不正確（須 1 ≤ --min-herbs ≤ --max-herbs）")
+        return 1
+
+    cache = snapshot_cache_for(data_dir, args.no_cache, args.rebuild_cache)
+    corpus = load_corpus(data_dir, ["zhengsu", "herbs", "zhengxing", "syndromes"], args.jobs, args.pool, cache)
+
+    target: List[str] = []
+    for item in args.target:
+        if item in corpus.zhengsu:
+            target.append(item)
+            continue
+        composition = syndrome_target(corpus, item)
+        if composition is None:
+            print(f"❌ 找不到證候、證型或證素: {item}")
+            return 1
+        target.extend(composition)
+    target = list(dict.fromkeys(target))
+    if not target:
+        print("❌ 目標沒有證素組成")
+        return 1
+
+    herbs = corpus.herbs
+    if args.scale:
+        herbs = synthetic_herbs(herbs, list(corpus.zhengsu), args.scale)
+
+    start = time.perf_counter()
+    library = HerbLibrary(herbs, corpus.zhengsu)
+    built = time.perf_counter()
+    results = library.search(target, args.min_herbs, args.max_herbs, args.beam, args.top, args.avoid)
+    elapsed = time.perf_counter() - built
+
+    names = library.zhengsu_names
+    print(f"目標證素: {'、'.join(names.get(z, z) for z in target)}")
+    print(f"藥庫 {len(library)} 味（建立 {(built - start) * 1000:.1f} ms），搜尋 {elapsed * 1000:.1f} ms")
+
+    target_mask, unknown = library.lookup(target)
+    if unknown:
+        print(f"⚠️  藥庫中沒有的證素（無中藥可涵蓋，計為未涵蓋）: {'、'.join(names.get(z, z) for z in unknown)}")
+
+    excluded = library.excluded(target_mask, args.avoid)
+    if excluded and not args.scale:
+        print("\n排除的中藥:")
+        for h, reason in excluded.items():
+            print(f"  {library.names[h]}（{library.herb_ids[h]}）{reason}")
+
+    if not results:
+        print(f"\n⚠️  找不到 {args.min_herbs} 味以上涵蓋目標證素的組合")
+        return 0
+
+    herb_names = dict(zip(library.herb_ids, library.names))
+    for i, combination in enumerate(results, 1):
+        print(f"\n{i}. {'、'.join(herb_names[h] for h in combination.herbs)}"
+              f"  分數 {combination.score:.3f}  涵蓋 {combination.coverage:.0%}")
+        if combination.missing:
+            print(f"   未涵蓋: {'、'.join(names.get(z, z) for z in combination.missing)}")
+        if combination.off_target:
+            print(f"   多餘證素: {'、'.join(names.get(z, z) for z in combination.off_target)}")
+
+    return 0
+
+
+if __name__ == "__main__":
+    exit(main())
@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+索引分片模組
+將以症狀為鍵的索引依症狀分類或首字拆成多個分片檔，並輸出對照分片的 manifest.json，
+讓前端只下載查詢所需的分片
+目前尚無頁面讀取分片（首頁的症狀反查模組仍是預留版面），分片只在指定 --shard-by 時輸出，
+不屬於預設建構
+"""
+
+import json
+from pathlib import Path
+from typing import Dict, Any, Callable, Iterable, TypeVar
+
+# 分片方式：依症狀分類 / 依症狀首字
+SHARD_MODES = ["category", "char"]
+
+MANIFEST_NAME = "manifest.json"
+SHARD_PREFIX = "shard-"
+MANIFEST_VERSION = 1
+
+T = TypeVar("T")
+
+
+def leading_char(symptom: str) -> str:
+    """症狀首字（依首字分片的鍵）"""
+    return symptom[:1]
+
+
+def group_keys(keys: Iterable[str], key_fn: Callable[[str], str]) -> Dict[str, list]:
+    """依分片鍵分組，保留各組內的原始順序；分組依分片鍵排序"""
+    groups: Dict[str, list] = {}
+    for key in keys:
+        groups.setdefault(key_fn(key), []).append(key)
+    return dict(sorted(groups.items()))
+
+
+def split_entries(entries: Dict[str, T], key_fn: Callable[[str], str]) -> Dict[str, Dict[str, T]]:
+    """依分片鍵拆分以症狀為鍵的字典"""
+    return {
+        shard_key: {key: entries[key] for key in keys}
+        for shard_key, keys in group_keys(entries, key_fn).items()
+    }
+
+
+def write_shards(shard_dir: Path, shards: Dict[str, Dict[str, Any]], shard_by: str,
+                 description: str, compact: bool = False) -> Dict[str, Any]:
+    """
+    寫入分片與 manifest
+    每個分片都是與完整索引同結構的文件（只含該分片的症狀）；
+    分片檔以序號命名，避免中文檔名在網址中需要編碼。寫入前清除上次殘留的分片
+    """
+    shard_dir.mkdir(parents=True, exist_ok=True)
+    for old in shard_dir.glob(f"{SHARD_PREFIX}*.json"):
+        old.unlink()
+
+    dump_kwargs: Dict[str, Any] = (
+        {"separators": (",", ":")} if compact else {"indent": 2}
+    )
+
+    manifest: Dict[str, Any] = {
+        "version": MANIFEST_VERSION,
+        "description": description,
+        "shard_by": shard_by,
+        "shards": {},
+        "total_symptoms": 0
+    }
+
+    for i, (shard_key, doc) in enumerate(shards.items()):
+        filename = f"{SHARD_PREFIX}{i:03d}.json"
+        path = shard_dir / filename
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(doc, f, ensure_ascii=False, **dump_kwargs)
+
+        count = len(doc.get("symptoms", {}))
+        manifest["shards"][shard_key] = {
+            "file": filename,
+            "symptoms": count,
+            "bytes": path.stat().st_size
+        }
+        manifest["total_symptoms"] += count
+
+    with open(shard_dir / MANIFEST_NAME, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+
+    return manifest
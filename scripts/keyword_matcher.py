@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+多關鍵字比對模組
+以 Aho-Corasick 自動機一次掃描文字，找出所有命中的關鍵字與位置；
+供證素標註、證候子分類、症狀分類等以關鍵字表判斷的腳本共用。
+
+每個關鍵字帶有一個值（如證素 ID、分類名稱）與優先序（建立時的順序），
+並提供各腳本原本逐一比對時的語意：
+- first: 依優先序第一個命中的值（分類表「依序檢查，命中即返回」）
+- values_in: 所有命中的值，依各值最先的優先序排列（依字典順序收集 ID）
+- longest_first: 由長至短比對，已命中的片段不再被較短的關鍵字重複使用
+"""
+
+from typing import Dict, List, Tuple, Any, Iterable, Iterator
+from dataclasses import dataclass
+
+
+@dataclass
+class KeywordHit:
+    """命中的關鍵字：text[start:end] == keyword"""
+    start: int
+    end: int
+    keyword: str
+    value: Any
+    priority: int
+
+
+class KeywordAutomaton:
+    """Aho-Corasick 自動機（建立一次，可重複比對）"""
+
+    def __init__(self, patterns: Iterable[Tuple[str, Any]]):
+        self.keywords: List[str] = []
+        self.values: List[Any] = []
+        # 狀態轉移、失敗連結、各狀態結束的關鍵字（含沿失敗連結可達者，依優先序排列）
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._out: List[Tuple[int, ...]] = [()]
+
+        for keyword, value in patterns:
+            if not keyword:
+                continue
+            self._add(keyword, len(self.keywords))
+            self.keywords.append(keyword)
+            self.values.append(value)
+
+        self._link()
+
+        # 由長至短的處理順序（同長度保留原順序）
+        self._length_rank = {
+            idx: rank for rank, idx in enumerate(
+                sorted(range(len(self.keywords)), key=lambda i: -len(self.keywords[i]))
+            )
+        }
+
+    @classmethod
+    def from_groups(cls, groups: Dict[Any, Iterable[str]]) -> "KeywordAutomaton":
+        """由「值 → 關鍵字清單」建立，優先序依字典順序再依清單順序"""
+        return cls((keyword, value) for value, keywords in groups.items() for keyword in keywords)
+
+    @classmethod
+    def from_mapping(cls, mapping: Dict[str, Any]) -> "KeywordAutomaton":
+        """由「關鍵字 → 值」建立"""
+        return cls(mapping.items())
+
+    def __len__(self) -> int:
+        return len(self.keywords)
+
+    def _add(self, keyword: str, idx: int):
+        state = 0
+        for char in keyword:
+            nxt = self._goto[state].get(char)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto[state][char] = nxt
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append(())
+            state = nxt
+        self._out[state] += (idx,)
+
+    def _link(self):
+        """以廣度優先建立失敗連結，並合併失敗狀態的輸出"""
+        queue = list(self._goto[0].values())
+        for state in queue:
+            for char, nxt in self._goto[state].items():
+                fail = self._fail[state]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[nxt] = self._goto[fail].get(char, 0)
+                self._out[nxt] = tuple(sorted(self._out[nxt] + self._out[self._fail[nxt]]))
+                queue.append(nxt)
+
+    def _scan(self, text: str) -> Iterator[Tuple[int, int]]:
+        """逐字掃描，產生 (結束位置, 關鍵字序號)"""
+        goto, fail, out = self._goto, self._fail, self._out
+        state = 0
+        for pos, char in enumerate(text):
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            for idx in out[state]:
+                yield pos + 1, idx
+
+    def find_all(self, text: str) -> List[KeywordHit]:
+        """所有命中（含重疊），依結束位置排列"""
+        return [
+            KeywordHit(end - len(self.keywords[idx]), end, self.keywords[idx], self.values[idx], idx)
+            for end, idx in self._scan(text)
+        ]
+
+    def contains(self, text: str) -> bool:
+        """是否命中任一關鍵字"""
+        return next(self._scan(text), None) is not None
+
+    def first(self, text: str, default: Any = None) -> Any:
+        """優先序最高的命中值；無命中時回傳 default"""
+        best = min((idx for _, idx in self._scan(text)), default=None)
+        return default if best is None else self.values[best]
+
+    def values_in(self, text: str) -> List[Any]:
+        """所有命中的值（去除重複），依各值最先的優先序排列"""
+        best: Dict[Any, int] = {}
+        for _, idx in self._scan(text):
+            value = self.values[idx]
+            if value not in best or idx < best[value]:
+                best[value] = idx
+        return sorted(best, key=best.__getitem__)
+
+    def longest_first(self, text: str) -> List[KeywordHit]:
+        """
+        由長至短處理關鍵字：每個關鍵字取最左邊、且未與先前採用片段重疊的出現位置
+        （等同於依長度遞減逐一以 `keyword in text` 檢查，命中後以占位符取代第一次出現）
+        """
+        occurrences: Dict[int, List[int]] = {}
+        for end, idx in self._scan(text):
+            occurrences.setdefault(idx, []).append(end - len(self.keywords[idx]))
+
+        taken: List[Tuple[int, int]] = []
+        hits: List[KeywordHit] = []
+        for idx in sorted(occurrences, key=self._length_rank.__getitem__):
+            length = len(self.keywords[idx])
+            for start in occurrences[idx]:
+                end = start + length
+                if all(end <= s or start >= e for s, e in taken):
+                    taken.append((start, end))
+                    hits.append(KeywordHit(start, end, self.keywords[idx], self.values[idx], idx))
+                    break
+        return hits
+
@@ -0,0 +1,368 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+症狀共現與追問建議
+以與症狀索引相同的來源（證型主症/次症、證候臨床表現）建立：
+- 症狀 × 證型/證候 的關聯矩陣（每個症狀一個位元集合，位元對應證型/證候序號）
+- 症狀 × 症狀 的稀疏共現矩陣（CSR：indptr / indices / counts，計數為兩者同時出現的證型/證候數，
+  各陣列以小端序 uint32 的 base64 存放）
+兩者皆由位元集合的 AND 與位元計數整批算出並存檔；
+互動問診時依已確認/已排除的症狀篩出候選，建議能最均勻切分候選的下一個症狀（資訊增益最大）
+輸出: data/indexes/symptom_cooccurrence.json
+"""
+
+import base64
+import json
+import math
+import sys
+import time
+from array import array
+from pathlib import Path
+from typing import Dict, List, Any, Iterable, Optional, Tuple
+from datetime import datetime
+from dataclasses import dataclass
+
+from corpus import Corpus, ensure_corpus, load_corpus, add_jobs_arguments, add_cache_arguments, snapshot_cache_for
+from extract_symptoms import extract_symptoms_from_zhengxing, extract_symptoms_from_zhenghou
+from syndrome_bitsets import encode_bitset, decode_bitset, iter_bits
+from symptom_matcher import SymptomMatcher, MATCHER_NAME
+
+
+COOCCURRENCE_VERSION = 1
+COOCCURRENCE_NAME = "symptom_cooccurrence.json"
+
+KIND_ZHENGXING = "zhengxing"
+KIND_SYNDROME = "syndrome"
+
+
+def encode_uint32_array(values: List[int]) -> str:
+    """整數陣列 → base64（小端序 uint32）"""
+    packed = array('I', values)
+    if sys.byteorder != "little":
+        packed.byteswap()
+    return base64.b64encode(packed.tobytes()).decode("ascii")
+
+
+def decode_uint32_array(text: str) -> array:
+    """base64（小端序 uint32）→ 整數陣列"""
+    packed = array('I')
+    packed.frombytes(base64.b64decode(text))
+    if sys.byteorder != "little":
+        packed.byteswap()
+    return packed
+
+
+@dataclass
+class QuestionSuggestion:
+    """追問建議：詢問該症狀後，候選中有 present 個會留下（有此症狀）、absent 個會留下（無此症狀）"""
+    symptom: str
+    gain: float
+    present: int
+    absent: int
+
+
+def build_incidence(corpus: Corpus) -> Tuple[List[Dict[str, str]], Dict[str, int]]:
+    """
+    建立症狀 × 證型/證候 關聯矩陣
+    證型與證候的 ID 有重複（如 shi、feng），因此以 (類型, ID) 區分欄位
+    返回: (欄位清單, 症狀 → 位元集合)
+    """
+    columns: List[Dict[str, str]] = []
+    ordinals: Dict[Tuple[str, str], int] = {}
+    for kind, entities in [(KIND_ZHENGXING, corpus.zhengxing), (KIND_SYNDROME, corpus.syndromes)]:
+        for entity_id, data in entities.items():
+            ordinals[(kind, entity_id)] = len(columns)
+            columns.append({"id": entity_id, "name": data.get("name", ""), "kind": kind})
+
+    rows: Dict[str, int] = {}
+    sources = [
+        (KIND_ZHENGXING, extract_symptoms_from_zhengxing(corpus.zhengxing)),
+        (KIND_SYNDROME, extract_symptoms_from_zhenghou(corpus.syndromes))
+    ]
+    for kind, symptom_map in sources:
+        for symptom, related in symptom_map.items():
+            row = rows.get(symptom, 0)
+            for entry in related:
+                row |= 1 << ordinals[(kind, entry["id"])]
+            rows[symptom] = row
+
+    return columns, dict(sorted(rows.items()))
+
+
+def build_cooccurrence(rows: List[int], column_count: int) -> Tuple[List[int], List[int], List[int]]:
+    """
+    由關聯矩陣計算稀疏共現矩陣（CSR，含對角線 = 各症狀出現次數）
+    只對同時出現在某一證型/證候的症狀對計算 AND 與位元計數
+    """
+    # 轉置：欄位 → 含該欄位的症狀序號
+    column_rows: List[List[int]] = [[] for _ in range(column_count)]
+    for r, row in enumerate(rows):
+        for c in iter_bits(row):
+            column_rows[c].append(r)
+
+    indptr = [0]
+    indices: List[int] = []
+    counts: List[int] = []
+    for r, row in enumerate(rows):
+        neighbours = set()
+        for c in iter_bits(row):
+            neighbours.update(column_rows[c])
+        for other in sorted(neighbours):
+            indices.append(other)
+            counts.append((row & rows[other]).bit_count())
+        indptr.append(len(indices))
+
+    return indptr, indices, counts
+
+
+def build_symptom_cooccurrence(data_dir: Path, corpus: Optional[Corpus] = None) -> Dict:
+    """建立症狀關聯與共現矩陣"""
+    corpus = ensure_corpus(data_dir, corpus, ["zhengxing", "syndromes"])
+
+    print("正在建立症狀 × 證型/證候關聯矩陣...")
+    columns, row_map = build_incidence(corpus)
+    symptoms = list(row_map)
+    rows = list(row_map.values())
+
+    print("正在計算症狀共現矩陣...")
+    indptr, indices, counts = build_cooccurrence(rows, len(columns))
+
+    return {
+        "version": COOCCURRENCE_VERSION,
+        "generated_at": datetime.now().strftime("%Y-%m-%d"),
+        "description": "症狀 × 證型/證候關聯矩陣（base64 位元集合，第 i 位元對應 columns[i]）與症狀共現矩陣（CSR）",
+        "columns": columns,
+        "symptoms": symptoms,
+        "incidence": [encode_bitset(row, len(columns)) for row in rows],
+        "cooccurrence": {
+            "indptr": encode_uint32_array(indptr),
+            "indices": encode_uint32_array(indices),
+            "counts": encode_uint32_array(counts)
+        },
+        "statistics": {
+            "total_symptoms": len(symptoms),
+            "total_columns": len(columns),
+            "cooccurrence_nonzero": len(indices)
+        }
+    }
+
+
+def split_gain(total: int, present: int) -> float:
+    """候選均勻分布時，詢問後依有/無切分的資訊增益（位元）"""
+    absent = total - present
+    if total <= 1 or present == 0 or absent == 0:
+        return 0.0
+    return (
+        math.log2(total)
+        - present / total * math.log2(present)
+        - absent / total * math.log2(absent)
+    )
+
+
+class SymptomCooccurrence:
+    """
+    已存檔的關聯與共現矩陣
+    候選 = 符合最多已確認症狀、且不含已排除症狀的證型/證候；
+    只評估與已確認症狀共現過的症狀，依資訊增益排序追問建議
+    """
+
+    def __init__(self, data: Dict[str, Any]):
+        if data.get("version") != COOCCURRENCE_VERSION:
+            raise ValueError(f"不支援的共現矩陣版本: {data.get('version')}")
+        self.columns: List[Dict[str, str]] = data["columns"]
+        self.symptoms: List[str] = data["symptoms"]
+        self.ordinals = {symptom: i for i, symptom in enumerate(self.symptoms)}
+        self.rows = [decode_bitset(text) for text in data["incidence"]]
+        self.all_mask = (1 << len(self.columns)) - 1
+
+        cooccurrence = data["cooccurrence"]
+        self.indptr = decode_uint32_array(cooccurrence["indptr"])
+        self.indices = decode_uint32_array(cooccurrence["indices"])
+        self.counts = decode_uint32_array(cooccurrence["counts"])
+
+    @classmethod
+    def load(cls, path: Path) -> "SymptomCooccurrence":
+        with open(path, 'r', encoding='utf-8') as f:
+            return cls(json.load(f))
+
+    def __len__(self) -> int:
+        return len(self.symptoms)
+
+    def row(self, symptom: str) -> int:
+        ordinal = self.ordinals.get(symptom)
+        return self.rows[ordinal] if ordinal is not None else 0
+
+    def cooccurring(self, symptom: str) -> Dict[str, int]:
+        """與指定症狀共現的症狀 → 共同出現的證型/證候數（不含自身）"""
+        ordinal = self.ordinals.get(symptom)
+        if ordinal is None:
+            return {}
+        start, end = self.indptr[ordinal], self.indptr[ordinal + 1]
+        return {
+            self.symptoms[other]: count
+            for other, count in zip(self.indices[start:end], self.counts[start:end])
+            if other != ordinal
+        }
+
+    def candidates(self, confirmed: List[str], denied: Iterable[str] = ()) -> int:
+        """
+        候選證型/證候的位元集合
+        自由文字症狀很少完全一致，因此取符合已確認症狀最多者，而非要求全部符合
+        """
+        excluded = 0
+        for symptom in denied:
+            excluded |= self.row(symptom)
+        remaining = self.all_mask & ~excluded
+
+        rows = [row for row in (self.row(symptom) & remaining for symptom in confirmed) if row]
+        if not rows:
+            return 0 if confirmed else remaining
+
+        # at_least[k]：至少符合 k 個已確認症狀的集合；逐一加入症狀後取最高的非空層
+        at_least = [remaining]
+        for row in rows:
+            top = at_least[-1] & row
+            for k in range(len(at_least) - 1, 0, -1):
+                at_least[k] |= at_least[k - 1] & row
+            if top:
+                at_least.append(top)
+        return at_least[-1]
+
+    def suggest(self, confirmed: List[str], denied: Iterable[str] = (), k: int = 5) -> List[QuestionSuggestion]:
+        """建議下一個要詢問的症狀（資訊增益由大至小）"""
+        candidates = self.candidates(confirmed, denied)
+        total = candidates.bit_count()
+        if total <= 1:
+            return []
+
+        asked = {self.ordinals[s] for s in list(confirmed) + list(denied) if s in self.ordinals}
+        if confirmed:
+            pool = set()
+            for symptom in confirmed:
+                ordinal = self.ordinals.get(symptom)
+                if ordinal is not None:
+                    pool.update(self.indices[self.indptr[ordinal]:self.indptr[ordinal + 1]])
+        else:
+            pool = range(len(self.symptoms))
+
+        scored: List[Tuple[float, int, int]] = []
+        for ordinal in pool:
+            if ordinal in asked:
+                continue
+            present = (self.rows[ordinal] & candidates).bit_count()
+            gain = split_gain(total, present)
+            if gain > 0:
+                scored.append((gain, ordinal, present))
+
+        scored.sort(key=lambda item: (-item[0], item[1]))
+        return [
+            QuestionSuggestion(self.symptoms[ordinal], round(gain, 4), present, total - present)
+            for gain, ordinal, present in scored[:k]
+        ]
+
+    def describe(self, mask: int) -> List[Dict[str, str]]:
+        """位元集合 → 證型/證候清單"""
+        return [self.columns[i] for i in iter_bits(mask)]
+
+
+def main():
+    """主函數"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="依已確認/已排除的症狀建議下一個追問的症狀")
+    parser.add_argument(
+        "confirmed",
+        nargs="*",
+        help="已確認的症狀，如：神疲乏力 自汗"
+    )
+    parser.add_argument(
+        "--data-dir",
+        default="data",
+        help="資料目錄路徑 (預設: data)"
+    )
+    parser.add_argument(
+        "-x", "--denied",
+        nargs="+",
+        default=[],
+        help="已排除（病人否認）的症狀"
+    )
+    parser.add_argument(
+        "-k", "--top",
+        type=int,
+        default=5,
+        help="建議筆數 (預設: 5)"
+    )
+    parser.add_argument(
+        "--rebuild",
+        action="store_true",
+        help="重新計算並存檔關聯與共現矩陣"
+    )
+    add_jobs_arguments(parser)
+    add_cache_arguments(parser)
+
+    args = parser.parse_args()
+
+    # 確定資料目錄
+    script_dir = Path(__file__).parent
+    data_dir = script_dir.parent / args.data_dir
+    indexes_dir = data_dir / "indexes"
+    matrix_path = indexes_dir / COOCCURRENCE_NAME
+
+    if not data_dir.exists():
+        print(f"錯誤: 資料目錄不存在: {data_dir}")
+        return 1
+
+    if args.rebuild or not matrix_path.exists():
+        cache = snapshot_cache_for(data_dir, args.no_cache, args.rebuild_cache)
+        corpus = load_corpus(data_dir, ["zhengxing", "syndromes"], args.jobs, args.pool, cache)
+        data = build_symptom_cooccurrence(data_dir, corpus)
+        indexes_dir.mkdir(parents=True, exist_ok=True)
+        with open(matrix_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+        print(f"✅ 共現矩陣已生成: {matrix_path}")
+        print(f"   症狀: {data['statistics']['total_symptoms']}，"
+              f"證型/證候: {data['statistics']['total_columns']}，"
+              f"共現非零項: {data['statistics']['cooccurrence_nonzero']}\n")
+
+    matrix = SymptomCooccurrence.load(matrix_path)
+
+    # 輸入不是索引中的症狀時，以模糊比對對應到最相近的症狀
+    matcher_path = indexes_dir / MATCHER_NAME
+    matcher = SymptomMatcher.load(matcher_path) if matcher_path.exists() else None
+
+    def resolve(symptoms: List[str]) -> List[str]:
+        resolved = []
+        for symptom in symptoms:
+            key = symptom if symptom in matrix.ordinals or not matcher else matcher.resolve(symptom)
+            if key and key != symptom:
+                print(f"  「{symptom}」→「{key}」")
+            resolved.append(key or symptom)
+        return resolved
+
+    confirmed = resolve(args.confirmed)
+    denied = resolve(args.denied)
+
+    start = time.perf_counter()
+    candidates = matrix.candidates(confirmed, denied)
+    suggestions = matrix.suggest(confirmed, denied, args.top)
+    elapsed = time.perf_counter() - start
+
+    print(f"候選證型/證候: {candidates.bit_count()} 個（{elapsed * 1000:.2f} ms）")
+    for column in matrix.describe(candidates)[:10]:
+        kind = "證型" if column["kind"] == KIND_ZHENGXING else "證候"
+        print(f"  [{kind}] {column['name']} ({column['id']})")
+
+    if not suggestions:
+        print("\n沒有可進一步區分候選的症狀")
+        return 0
+
+    print("\n建議追問:")
+    for rank, suggestion in enumerate(suggestions, 1):
+        print(f"{rank:>3}. {suggestion.symptom}  資訊增益 {suggestion.gain:.3f} 位元"
+              f"（有: {suggestion.present}，無: {suggestion.absent}）")
+
+    return 0
+
+
+if __name__ == "__main__":
+    exit(main())
@@ -0,0 +1,240 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+症狀模糊比對
+以症狀索引中每個症狀片語的字元一元組/二元組/三元組建立倒排索引，依 n-gram 重疊度（Dice 係數）計分，
+使「乏力」「乏力神疲」等部分或顛倒的輸入也能對應到索引中的正式症狀
+輸出: data/indexes/symptom_ngrams.json（由 extract_symptoms.py 與症狀索引一併建立）
+"""
+
+import json
+import time
+from pathlib import Path
+from typing import Dict, List, Any, Iterable, Optional
+from dataclasses import dataclass
+
+from corpus import Corpus
+
+
+MATCHER_VERSION = 1
+MATCHER_NAME = "symptom_ngrams.json"
+
+# 單字 n-gram 讓中間夾字（面色白 / 面色晄白）與單字輸入也能命中，二、三元組則讓詞序相符者排前
+NGRAM_SIZES = (1, 2, 3)
+DEFAULT_MIN_SCORE = 0.2
+
+# 比對前去除的空白與標點
+STRIP_CHARS = " \t\r\n。．.，,；;、"
+
+
+def char_ngrams(text: str, sizes: Iterable[int] = NGRAM_SIZES) -> List[str]:
+    """字元 n-gram（去除重複，保留出現順序）"""
+    grams: Dict[str, None] = {}
+    for n in sizes:
+        for i in range(len(text) - n + 1):
+            grams[text[i:i + n]] = None
+    return list(grams)
+
+
+@dataclass
+class SymptomMatch:
+    """比對結果：key 為症狀索引中的鍵，text 為命中的片語（可能是別名）"""
+    key: str
+    text: str
+    score: float
+
+
+class SymptomMatcher:
+    """
+    n-gram 倒排索引
+    片語依關聯證型數由多至少排列，同分時較常見的症狀優先
+    """
+
+    def __init__(self, phrases: List[str], keys: List[str], sizes: Iterable[int] = NGRAM_SIZES,
+                 postings: Optional[Dict[str, List[int]]] = None):
+        self.phrases = phrases
+        self.keys = keys
+        self.sizes = tuple(sizes)
+        self.lookup = {phrase: i for i, phrase in enumerate(phrases)}
+        self.gram_counts = [len(char_ngrams(phrase, self.sizes)) for phrase in phrases]
+
+        if postings is None:
+            postings = {}
+            for i, phrase in enumerate(phrases):
+                for gram in char_ngrams(phrase, self.sizes):
+                    postings.setdefault(gram, []).append(i)
+        self.postings = postings
+
+    @classmethod
+    def from_symptom_index(cls, index: Dict, corpus: Optional[Corpus] = None) -> "SymptomMatcher":
+        """
+        由症狀索引建立
+        索引鍵為症狀 ID（如 symptom_qiduan）時，以症狀資料的名稱與別名作為比對片語
+        """
+        symptoms = index["symptoms"]
+        order = sorted(symptoms, key=lambda key: (-len(symptoms[key]["related_syndromes"]), key))
+        symptom_data = corpus.symptoms if corpus else {}
+
+        phrases: List[str] = []
+        keys: List[str] = []
+        seen = set()
+        for key in order:
+            data = symptom_data.get(key)
+            texts = [data.get("name", "")] + data.get("alias", []) if data else [key]
+            for text in texts:
+                text = text.strip(STRIP_CHARS)
+                if text and text not in seen:
+                    seen.add(text)
+                    phrases.append(text)
+                    keys.append(key)
+        return cls(phrases, keys)
+
+    @classmethod
+    def from_json(cls, data: Dict[str, Any]) -> "SymptomMatcher":
+        if data.get("version") != MATCHER_VERSION:
+            raise ValueError(f"不支援的症狀 n-gram 索引版本: {data.get('version')}")
+        phrases = data["phrases"]
+        keys = list(phrases)
+        for i, key in data.get("keys", {}).items():
+            keys[int(i)] = key
+        return cls(phrases, keys, data["ngram_sizes"], data["grams"])
+
+    @classmethod
+    def load(cls, path: Path) -> "SymptomMatcher":
+        with open(path, 'r', encoding='utf-8') as f:
+            return cls.from_json(json.load(f))
+
+    def __len__(self) -> int:
+        return len(self.phrases)
+
+    def match(self, query: str, k: int = 5, min_score: float = DEFAULT_MIN_SCORE) -> List[SymptomMatch]:
+        """回傳最相近的 k 個症狀（同一症狀的名稱與別名只取最高分）"""
+        query = query.strip(STRIP_CHARS)
+        if not query:
+            return []
+
+        exact = self.lookup.get(query)
+        scores: Dict[int, float] = {}
+        if exact is not None:
+            scores[exact] = 1.0
+
+        grams = char_ngrams(query, self.sizes)
+        if grams:
+            overlaps: Dict[int, int] = {}
+            get = overlaps.get
+            for gram in grams:
+                for i in self.postings.get(gram, ()):
+                    overlaps[i] = get(i, 0) + 1
+            for i, overlap in overlaps.items():
+                if i != exact:
+                    scores[i] = 2 * overlap / (len(grams) + self.gram_counts[i])
+        else:
+            # 短於最小 n 的輸入：以包含該輸入的片語計分
+            for i, phrase in enumerate(self.phrases):
+                if i != exact and query in phrase:
+                    scores[i] = len(query) / len(phrase)
+
+        ranked = sorted(
+            ((s, i) for i, s in scores.items() if s >= min_score),
+            key=lambda item: (-item[0], item[1])
+        )
+        results: List[SymptomMatch] = []
+        seen_keys = set()
+        for s, i in ranked:
+            key = self.keys[i]
+            if key in seen_keys:
+                continue
+            seen_keys.add(key)
+            results.append(SymptomMatch(key, self.phrases[i], round(s, 4)))
+            if len(results) == k:
+                break
+        return results
+
+    def resolve(self, query: str, min_score: float = DEFAULT_MIN_SCORE) -> Optional[str]:
+        """取最相近的症狀索引鍵"""
+        matches = self.match(query, 1, min_score)
+        return matches[0].key if matches else None
+
+    def to_json(self) -> Dict[str, Any]:
+        # 片語本身即為索引鍵時不另外記錄
+        keys = {str(i): key for i, key in enumerate(self.keys) if key != self.phrases[i]}
+        return {
+            "version": MATCHER_VERSION,
+            "description": "症狀片語的字元 n-gram 倒排索引：n-gram → 片語序號；keys 為片語與症狀索引鍵不同者",
+            "ngram_sizes": list(self.sizes),
+            "phrases": self.phrases,
+            "keys": keys,
+            "grams": self.postings,
+            "statistics": {
+                "total_phrases": len(self.phrases),
+                "total_grams": len(self.postings)
+            }
+        }
+
+
+def write_symptom_matcher(index: Dict, corpus: Optional[Corpus], output_dir: Path) -> Dict:
+    """建立症狀 n-gram 索引並以精簡格式寫入輸出目錄，回傳統計"""
+    matcher = SymptomMatcher.from_symptom_index(index, corpus)
+    data = matcher.to_json()
+    output_dir.mkdir(parents=True, exist_ok=True)
+    with open(output_dir / MATCHER_NAME, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False, separators=(",", ":"))
+    return data["statistics"]
+
+
+def main():
+    """主函數"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="以字元 n-gram 模糊比對症狀")
+    parser.add_argument(
+        "queries",
+        nargs="+",
+        help="輸入的症狀，如：乏力 神疲 面色白"
+    )
+    parser.add_argument(
+        "--index",
+        default=f"data/indexes/{MATCHER_NAME}",
+        help=f"n-gram 索引路徑 (預設: data/indexes/{MATCHER_NAME})"
+    )
+    parser.add_argument(
+        "-k", "--top",
+        type=int,
+        default=5,
+        help="每個輸入回傳的筆數 (預設: 5)"
+    )
+    parser.add_argument(
+        "--min-score",
+        type=float,
+        default=DEFAULT_MIN_SCORE,
+        help=f"最低相似度 (預設: {DEFAULT_MIN_SCORE})"
+    )
+
+    args = parser.parse_args()
+
+    script_dir = Path(__file__).parent
+    index_path = script_dir.parent / args.index
+    if not index_path.exists():
+        print(f"錯誤: 找不到 n-gram 索引: {index_path}")
+        print("請先執行 scripts/extract_symptoms.py")
+        return 1
+
+    matcher = SymptomMatcher.load(index_path)
+
+    for query in args.queries:
+        start = time.perf_counter()
+        matches = matcher.match(query, args.top, args.min_score)
+        elapsed = time.perf_counter() - start
+
+        print(f"\n「{query}」（{elapsed * 1000:.3f} ms）")
+        if not matches:
+            print("  沒有相近的症狀")
+        for match in matches:
+            alias = f" ← {match.text}" if match.text != match.key else ""
+            print(f"  {match.score:.3f}  {match.key}{alias}")
+
+    return 0
+
+
+if __name__ == "__main__":
+    exit(main())
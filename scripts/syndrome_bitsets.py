@@ -0,0 +1,265 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+證候位元集合索引
+為每個證素 ID 與每個症狀預先計算一個以證候序號為位元的集合（Python int），
+多條件篩選（同時含、任一含、排除）即成為整數的 AND/OR/NOT 運算；
+並將位元集合以 base64 序列化，供前端 js/zhenghou.js 做相同運算
+輸出: data/indexes/syndrome_bitsets.json
+"""
+
+import base64
+import json
+from pathlib import Path
+from typing import Dict, List, Any, Iterable, Iterator, Optional
+from datetime import datetime
+
+from corpus import Corpus, ensure_corpus, load_corpus, add_jobs_arguments, add_cache_arguments, snapshot_cache_for
+from extract_symptoms import parse_clinical_manifestations
+
+
+BITSETS_VERSION = 1
+
+# 位元集合的種類
+KIND_ZHENGSU = "zhengsu"
+KIND_SYMPTOMS = "symptoms"
+BITSET_KINDS = [KIND_ZHENGSU, KIND_SYMPTOMS]
+
+# 序列化時補齊至 32 位元字組，前端可直接以 Uint32 讀取
+WORD_BITS = 32
+
+
+def encode_bitset(mask: int, size: int) -> str:
+    """位元集合 → base64（小端序，第 i 個位元對應序號 i 的證候）"""
+    words = (size + WORD_BITS - 1) // WORD_BITS
+    return base64.b64encode(mask.to_bytes(words * WORD_BITS // 8, "little")).decode("ascii")
+
+
+def decode_bitset(text: str) -> int:
+    """base64 → 位元集合"""
+    return int.from_bytes(base64.b64decode(text), "little")
+
+
+def iter_bits(mask: int) -> Iterator[int]:
+    """依序列出位元集合中為 1 的序號"""
+    while mask:
+        low = mask & -mask
+        yield low.bit_length() - 1
+        mask ^= low
+
+
+class SyndromeBitsets:
+    """
+    證候位元集合
+    證候依編號排序後給予序號；masks[種類][鍵] 為含該證素/症狀的證候集合
+    """
+
+    def __init__(self, ids: List[str], masks: Dict[str, Dict[str, int]]):
+        self.ids = ids
+        self.ordinals = {syndrome_id: i for i, syndrome_id in enumerate(ids)}
+        self.masks = {kind: masks.get(kind, {}) for kind in BITSET_KINDS}
+        self.all_mask = (1 << len(ids)) - 1
+
+    @classmethod
+    def from_corpus(cls, corpus: Corpus) -> "SyndromeBitsets":
+        # 依證候編號排序（編號有重複，再以 ID 排序），與前端分類列表的順序一致
+        ids = sorted(
+            corpus.syndromes,
+            key=lambda zh_id: (corpus.syndromes[zh_id].get("number") or 0, zh_id)
+        )
+        masks: Dict[str, Dict[str, int]] = {kind: {} for kind in BITSET_KINDS}
+
+        for ordinal, zh_id in enumerate(ids):
+            data = corpus.syndromes[zh_id]
+            bit = 1 << ordinal
+
+            composition = data.get("zhengsu_composition", {})
+            for role in ["location", "nature"]:
+                for zhengsu_id in composition.get(role, []):
+                    masks[KIND_ZHENGSU][zhengsu_id] = masks[KIND_ZHENGSU].get(zhengsu_id, 0) | bit
+
+            clinical = data.get("clinical_manifestations", "")
+            if clinical:
+                for symptom in parse_clinical_manifestations(clinical):
+                    masks[KIND_SYMPTOMS][symptom] = masks[KIND_SYMPTOMS].get(symptom, 0) | bit
+
+        return cls(ids, masks)
+
+    @classmethod
+    def from_json(cls, data: Dict[str, Any]) -> "SyndromeBitsets":
+        if data.get("version") != BITSETS_VERSION:
+            raise ValueError(f"不支援的位元集合版本: {data.get('version')}")
+        masks = {
+            kind: {key: decode_bitset(text) for key, text in data.get(kind, {}).items()}
+            for kind in BITSET_KINDS
+        }
+        return cls(data["syndromes"], masks)
+
+    @classmethod
+    def load(cls, path: Path) -> "SyndromeBitsets":
+        with open(path, 'r', encoding='utf-8') as f:
+            return cls.from_json(json.load(f))
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def mask(self, kind: str, key: str) -> int:
+        """單一證素/症狀的證候集合（未知的鍵為空集合）"""
+        return self.masks[kind].get(key, 0)
+
+    def mask_of_ids(self, syndrome_ids: Iterable[str]) -> int:
+        """由證候 ID 清單建立集合（忽略未知 ID）"""
+        mask = 0
+        for syndrome_id in syndrome_ids:
+            ordinal = self.ordinals.get(syndrome_id)
+            if ordinal is not None:
+                mask |= 1 << ordinal
+        return mask
+
+    def select(self, kind: str, all_of: Iterable[str] = (), any_of: Iterable[str] = (),
+               none_of: Iterable[str] = (), within: Optional[int] = None) -> int:
+        """
+        篩選證候：同時含 all_of 的全部、至少含 any_of 之一、不含 none_of 的任何一個
+        within 可傳入前一次篩選的結果，以組合不同種類的條件
+        """
+        result = self.all_mask if within is None else within
+        for key in all_of:
+            result &= self.mask(kind, key)
+            if not result:
+                return 0
+
+        any_of = list(any_of)
+        if any_of:
+            union = 0
+            for key in any_of:
+                union |= self.mask(kind, key)
+            result &= union
+
+        for key in none_of:
+            result &= ~self.mask(kind, key)
+        return result
+
+    def to_ids(self, mask: int) -> List[str]:
+        """集合 → 證候 ID（依序號排序）"""
+        return [self.ids[i] for i in iter_bits(mask)]
+
+    @staticmethod
+    def count(mask: int) -> int:
+        return mask.bit_count()
+
+    def to_json(self) -> Dict[str, Any]:
+        size = len(self.ids)
+        data: Dict[str, Any] = {
+            "version": BITSETS_VERSION,
+            "generated_at": datetime.now().strftime("%Y-%m-%d"),
+            "description": "證素/症狀 → 證候位元集合（base64，小端序 32 位元字組，第 i 位元對應 syndromes[i]）",
+            "syndromes": self.ids,
+            "words": (size + WORD_BITS - 1) // WORD_BITS
+        }
+        for kind in BITSET_KINDS:
+            data[kind] = {
+                key: encode_bitset(mask, size)
+                for key, mask in sorted(self.masks[kind].items())
+            }
+        data["statistics"] = {
+            "total_syndromes": size,
+            "total_zhengsu": len(self.masks[KIND_ZHENGSU]),
+            "total_symptoms": len(self.masks[KIND_SYMPTOMS])
+        }
+        return data
+
+
+def build_syndrome_bitsets(data_dir: Path, corpus: Optional[Corpus] = None) -> Dict:
+    """建立證候位元集合索引"""
+    corpus = ensure_corpus(data_dir, corpus, ["syndromes"])
+    print("正在建立證候位元集合...")
+    return SyndromeBitsets.from_corpus(corpus).to_json()
+
+
+def main():
+    """主函數"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="以位元集合依證素與症狀篩選證候")
+    parser.add_argument(
+        "--data-dir",
+        default="data",
+        help="資料目錄路徑 (預設: data)"
+    )
+    parser.add_argument(
+        "-z", "--zhengsu",
+        nargs="+",
+        default=[],
+        help="須同時包含的證素 ID（如：fei qi_xu）"
+    )
+    parser.add_argument(
+        "--any-zhengsu",
+        nargs="+",
+        default=[],
+        help="至少包含其一的證素 ID"
+    )
+    parser.add_argument(
+        "--not-zhengsu",
+        nargs="+",
+        default=[],
+        help="排除的證素 ID"
+    )
+    parser.add_argument(
+        "-y", "--symptom",
+        nargs="+",
+        default=[],
+        help="須同時出現的症狀（如：神疲乏力 自汗）"
+    )
+    parser.add_argument(
+        "--not-symptom",
+        nargs="+",
+        default=[],
+        help="排除的症狀"
+    )
+    parser.add_argument(
+        "--output",
+        help="只輸出位元集合索引 JSON 至指定路徑（如：data/indexes/syndrome_bitsets.json）"
+    )
+    add_jobs_arguments(parser)
+    add_cache_arguments(parser)
+
+    args = parser.parse_args()
+
+    # 確定資料目錄
+    script_dir = Path(__file__).parent
+    data_dir = script_dir.parent / args.data_dir
+
+    if not data_dir.exists():
+        print(f"錯誤: 資料目錄不存在: {data_dir}")
+        return 1
+
+    cache = snapshot_cache_for(data_dir, args.no_cache, args.rebuild_cache)
+    corpus = load_corpus(data_dir, ["syndromes"], args.jobs, args.pool, cache)
+    bitsets = SyndromeBitsets.from_corpus(corpus)
+
+    if args.output:
+        output_path = script_dir.parent / args.output
+        output_path.parent.mkdir(parents=True, exist_ok=True)
+        data = bitsets.to_json()
+        with open(output_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+        print(f"✅ 位元集合索引已生成: {output_path}")
+        print(f"   證候: {data['statistics']['total_syndromes']}")
+        print(f"   證素: {data['statistics']['total_zhengsu']}")
+        print(f"   症狀: {data['statistics']['total_symptoms']}")
+        return 0
+
+    mask = bitsets.select(KIND_ZHENGSU, args.zhengsu, args.any_zhengsu, args.not_zhengsu)
+    mask = bitsets.select(KIND_SYMPTOMS, args.symptom, none_of=args.not_symptom, within=mask)
+
+    ids = bitsets.to_ids(mask)
+    print(f"符合條件的證候: {bitsets.count(mask)} / {len(bitsets)}")
+    for zh_id in ids:
+        data = corpus.syndromes[zh_id]
+        print(f"  {data.get('name', '')}（{zh_id}）")
+
+    return 0
+
+
+if __name__ == "__main__":
+    exit(main())
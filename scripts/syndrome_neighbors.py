@@ -0,0 +1,299 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+相似證候索引
+以證素組成（病位 + 病性）將每個證候表示為證素向量（二元或以 IDF 加權），
+預先計算每個證候的 k 個最近鄰（Jaccard 或餘弦相似度），
+前端詳情彈窗可直接顯示「相似證候」，腳本查詢相似證候只需 O(k)
+輸出: data/indexes/syndrome_neighbors.json
+
+證素組成相同的證候先歸為一塊，只在不同組成之間計算相似度，可擴充至數萬個證候
+"""
+
+import heapq
+import json
+import math
+import time
+from pathlib import Path
+from typing import Dict, List, Any, Optional, Tuple
+from datetime import datetime
+
+from corpus import Corpus, ensure_corpus, load_corpus, add_jobs_arguments, add_cache_arguments, snapshot_cache_for
+
+
+NEIGHBORS_VERSION = 1
+NEIGHBORS_NAME = "syndrome_neighbors.json"
+
+METRIC_JACCARD = "jaccard"
+METRIC_COSINE = "cosine"
+METRICS = [METRIC_JACCARD, METRIC_COSINE]
+
+DEFAULT_METRIC = METRIC_COSINE
+DEFAULT_K = 10
+
+# 相似度寫入索引時的小數位數
+SCORE_DIGITS = 4
+
+
+def zhengsu_vector(data: Dict[str, Any]) -> List[str]:
+    """證候的證素組成（病位在前，去除重複）"""
+    composition = data.get("zhengsu_composition") or {}
+    return list(dict.fromkeys(
+        zhengsu_id for role in ["location", "nature"] for zhengsu_id in composition.get(role, [])
+    ))
+
+
+def compute_neighbors(vectors: List[List[str]], k: int = DEFAULT_K, metric: str = DEFAULT_METRIC,
+                      weighted: bool = True) -> List[List[Tuple[int, float]]]:
+    """
+    計算每個向量的前 k 個最近鄰（序號, 相似度），同分時序號小者優先，不含自身與相似度為 0 者
+    weighted 時每個證素的權重為 IDF（越少證候共有的證素越能區分），否則為二元向量；
+    Jaccard 在加權時為加權 Jaccard（共有權重和 / 聯集權重和）
+
+    證素組成相同的證候歸為同一塊（彼此相似度為 1），只在各塊的代表向量之間以倒排串列累加共有權重，
+    再將前幾名的塊展開為其中的證候；證候數增加時計算量只隨不同組成的數量成長
+    """
+    if metric not in METRICS:
+        raise ValueError(f"未知的相似度: {metric}")
+
+    total = len(vectors)
+    blocks: Dict[Tuple[str, ...], List[int]] = {}
+    for i, vector in enumerate(vectors):
+        if vector:
+            blocks.setdefault(tuple(sorted(vector)), []).append(i)
+    keys = list(blocks)
+    members = [blocks[key] for key in keys]
+
+    postings: Dict[str, List[int]] = {}
+    doc_freq: Dict[str, int] = {}
+    for b, key in enumerate(keys):
+        for zhengsu_id in key:
+            postings.setdefault(zhengsu_id, []).append(b)
+            doc_freq[zhengsu_id] = doc_freq.get(zhengsu_id, 0) + len(members[b])
+
+    weights = {
+        zhengsu_id: math.log(1 + total / df) if weighted else 1.0
+        for zhengsu_id, df in doc_freq.items()
+    }
+    # 各塊的權重和（Jaccard）與平方和（餘弦）
+    sums = [sum(weights[z] for z in key) for key in keys]
+    squares = [sum(weights[z] * weights[z] for z in key) for key in keys]
+
+    neighbors: List[List[Tuple[int, float]]] = [[] for _ in range(total)]
+    shared = [0.0] * len(keys)
+    for b, key in enumerate(keys):
+        # 累加與其他塊共有的證素權重（內積）
+        touched: List[int] = []
+        for zhengsu_id in key:
+            w = weights[zhengsu_id]
+            w = w * w if metric == METRIC_COSINE else w
+            for other in postings[zhengsu_id]:
+                if other == b:
+                    continue
+                if not shared[other]:
+                    touched.append(other)
+                shared[other] += w
+
+        ranked = []
+        for other in touched:
+            if metric == METRIC_COSINE:
+                score = shared[other] / math.sqrt(squares[b] * squares[other])
+            else:
+                score = shared[other] / (sums[b] + sums[other] - shared[other])
+            # 去除累加順序造成的浮點誤差，使數學上同分者仍依序號排列
+            ranked.append((round(score, 12), other))
+            shared[other] = 0.0
+        ranked.sort(key=lambda item: (-item[0], members[item[1]][0]))
+
+        # 取足以湊滿 k 個證候的塊（與最後一塊同分者一併納入，以維持同分時的序號順序）
+        candidates = [(1.0, j) for j in members[b]]
+        count = len(members[b]) - 1
+        cutoff = None
+        for score, other in ranked:
+            if cutoff is not None and score < cutoff:
+                break
+            candidates.extend((score, j) for j in members[other])
+            count += len(members[other])
+            if count >= k and cutoff is None:
+                cutoff = score
+
+        for i in members[b]:
+            top = heapq.nsmallest(k + 1, candidates, key=lambda item: (-item[0], item[1]))
+            neighbors[i] = [(j, score) for score, j in top if j != i][:k]
+    return neighbors
+
+
+class SyndromeNeighbors:
+    """預先計算的相似證候（ID → [(相似證候 ID, 相似度)]，已依相似度排序）"""
+
+    def __init__(self, table: Dict[str, List[Tuple[str, float]]], names: Dict[str, str],
+                 metric: str = DEFAULT_METRIC, k: int = DEFAULT_K):
+        self.table = table
+        self.names = names
+        self.metric = metric
+        self.k = k
+
+    @classmethod
+    def from_corpus(cls, corpus: Corpus, k: int = DEFAULT_K, metric: str = DEFAULT_METRIC,
+                    weighted: bool = True) -> "SyndromeNeighbors":
+        # 依證候編號排序（與位元集合索引的序號一致），同分鄰居依此順序排列
+        ids = sorted(
+            corpus.syndromes,
+            key=lambda zh_id: (corpus.syndromes[zh_id].get("number") or 0, zh_id)
+        )
+        vectors = [zhengsu_vector(corpus.syndromes[zh_id]) for zh_id in ids]
+        rows = compute_neighbors(vectors, k, metric, weighted)
+        table = {
+            zh_id: [(ids[j], round(score, SCORE_DIGITS)) for j, score in row]
+            for zh_id, row in zip(ids, rows)
+        }
+        names = {zh_id: corpus.syndromes[zh_id].get("name", "") for zh_id in ids}
+        return cls(table, names, metric, k)
+
+    @classmethod
+    def from_json(cls, data: Dict[str, Any]) -> "SyndromeNeighbors":
+        if data.get("version") != NEIGHBORS_VERSION:
+            raise ValueError(f"不支援的相似證候索引版本: {data.get('version')}")
+        table = {zh_id: [tuple(pair) for pair in row] for zh_id, row in data["neighbors"].items()}
+        return cls(table, data.get("names", {}), data.get("metric", DEFAULT_METRIC), data.get("k", DEFAULT_K))
+
+    @classmethod
+    def load(cls, path: Path) -> "SyndromeNeighbors":
+        with open(path, 'r', encoding='utf-8') as f:
+            return cls.from_json(json.load(f))
+
+    def __len__(self) -> int:
+        return len(self.table)
+
+    def neighbors(self, syndrome_id: str, k: Optional[int] = None,
+                  min_score: float = 0.0) -> List[Tuple[str, float]]:
+        """相似證候（最多 k 個；未知 ID 回傳空清單）"""
+        row = self.table.get(syndrome_id, [])
+        if k is not None:
+            row = row[:k]
+        return [pair for pair in row if pair[1] >= min_score]
+
+    def to_json(self) -> Dict[str, Any]:
+        return {
+            "version": NEIGHBORS_VERSION,
+            "generated_at": datetime.now().strftime("%Y-%m-%d"),
+            "description": "依證素組成預先計算的相似證候：neighbors[證候 ID] = [[相似證候 ID, 相似度], ...]（相似度由高至低）",
+            "metric": self.metric,
+            "k": self.k,
+            "names": self.names,
+            "neighbors": {zh_id: [list(pair) for pair in row] for zh_id, row in self.table.items()},
+            "statistics": {
+                "total_syndromes": len(self.table),
+                "total_pairs": sum(len(row) for row in self.table.values()),
+                "without_neighbors": sum(1 for row in self.table.values() if not row)
+            }
+        }
+
+
+def build_syndrome_neighbors(data_dir: Path, corpus: Optional[Corpus] = None) -> Dict:
+    """建立相似證候索引"""
+    corpus = ensure_corpus(data_dir, corpus, ["syndromes"])
+    print("正在計算相似證候...")
+    return SyndromeNeighbors.from_corpus(corpus).to_json()
+
+
+def replicate_vectors(vectors: List[List[str]], count: int) -> List[List[str]]:
+    """循環複製證素向量至指定數量（效能測試用）"""
+    return [vectors[i % len(vectors)] for i in range(count)]
+
+
+def main():
+    """主函數"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="依證素組成查詢相似證候")
+    parser.add_argument(
+        "syndromes",
+        nargs="*",
+        help="證候 ID（如：feiqixu）；不指定時只輸出統計"
+    )
+    parser.add_argument(
+        "--data-dir",
+        default="data",
+        help="資料目錄路徑 (預設: data)"
+    )
+    parser.add_argument(
+        "-k", "--top",
+        type=int,
+        default=DEFAULT_K,
+        help=f"每個證候保留的相似證候數 (預設: {DEFAULT_K})"
+    )
+    parser.add_argument(
+        "--metric",
+        choices=METRICS,
+        default=DEFAULT_METRIC,
+        help=f"相似度 (預設: {DEFAULT_METRIC})"
+    )
+    parser.add_argument(
+        "--binary",
+        action="store_true",
+        help="以二元證素向量計算（預設以 IDF 加權）"
+    )
+    parser.add_argument(
+        "--scale",
+        type=int,
+        help="效能測試：將證素向量循環複製至指定數量後計時"
+    )
+    parser.add_argument(
+        "--output",
+        help="將相似證候索引 JSON 輸出至指定路徑（如：data/indexes/syndrome_neighbors.json）"
+    )
+    add_jobs_arguments(parser)
+    add_cache_arguments(parser)
+
+    args = parser.parse_args()
+
+    # 確定資料目錄
+    script_dir = Path(__file__).parent
+    data_dir = script_dir.parent / args.data_dir
+
+    if not data_dir.exists():
+        print(f"錯誤: 資料目錄不存在: {data_dir}")
+        return 1
+
+    cache = snapshot_cache_for(data_dir, args.no_cache, args.rebuild_cache)
+    corpus = load_corpus(data_dir, ["syndromes"], args.jobs, args.pool, cache)
+
+    if args.scale:
+        vectors = replicate_vectors([zhengsu_vector(data) for data in corpus.syndromes.values()], args.scale)
+        start = time.perf_counter()
+        rows = compute_neighbors(vectors, args.top, args.metric, not args.binary)
+        elapsed = time.perf_counter() - start
+        print(f"{len(vectors)} 個證素向量，{sum(len(row) for row in rows)} 組鄰居，{elapsed:.2f} 秒")
+        return 0
+
+    start = time.perf_counter()
+    neighbors = SyndromeNeighbors.from_corpus(corpus, args.top, args.metric, not args.binary)
+    elapsed = time.perf_counter() - start
+    print(f"相似證候: {len(neighbors)} 個證候，{elapsed * 1000:.1f} ms（{args.metric}，{'二元' if args.binary else 'IDF 加權'}）")
+
+    if args.output:
+        output_path = script_dir.parent / args.output
+        output_path.parent.mkdir(parents=True, exist_ok=True)
+        data = neighbors.to_json()
+        with open(output_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, separators=(",", ":"))
+        print(f"✅ 相似證候索引已生成: {output_path}")
+        print(f"   鄰居組數: {data['statistics']['total_pairs']}")
+        return 0
+
+    for zh_id in args.syndromes:
+        if zh_id not in corpus.syndromes:
+            print(f"\n❌ 找不到證候: {zh_id}")
+            continue
+        vector = zhengsu_vector(corpus.syndromes[zh_id])
+        print(f"\n{neighbors.names[zh_id]}（{zh_id}）證素: {'、'.join(vector) or '無'}")
+        for other_id, score in neighbors.neighbors(zh_id):
+            other = zhengsu_vector(corpus.syndromes[other_id])
+            print(f"  {score:.3f}  {neighbors.names[other_id]}（{other_id}）  {'、'.join(other)}")
+
+    return 0
+
+
+if __name__ == "__main__":
+    exit(main())
@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+證候詳情打包腳本
+將所有證候詳情文件串接為單一打包檔（每行一筆精簡 JSON），並輸出 ID → (位移, 長度) 對照表；
+前端可以 HTTP Range 請求單筆證候，或一次下載整包供離線使用
+輸出: data/indexes/syndromes.pack, data/indexes/syndromes_pack.json
+"""
+
+import json
+import mmap
+import os
+from pathlib import Path
+from typing import Dict, List, Any, Optional, Iterator
+from datetime import datetime
+
+from corpus import Corpus, ensure_corpus, load_corpus, add_jobs_arguments, add_cache_arguments, snapshot_cache_for
+
+
+PACK_VERSION = 1
+PACK_NAME = "syndromes.pack"
+TABLE_NAME = "syndromes_pack.json"
+
+
+def encode_document(data: Dict[str, Any]) -> bytes:
+    """將單筆證候編碼為一行精簡 JSON（不含換行）"""
+    return json.dumps(data, ensure_ascii=False, separators=(",", ":")).encode('utf-8')
+
+
+def build_syndrome_pack(data_dir: Path, corpus: Optional[Corpus] = None,
+                        output_dir: Optional[Path] = None) -> Dict:
+    """
+    建立證候打包檔，回傳位移對照表
+    打包檔先寫入暫存檔再替換；位移與長度以位元組計，不含每行結尾的換行
+    """
+    corpus = ensure_corpus(data_dir, corpus, ["syndromes"])
+    output_dir = Path(output_dir) if output_dir else Path(data_dir) / "indexes"
+    output_dir.mkdir(parents=True, exist_ok=True)
+
+    print("正在打包證候詳情...")
+    entries: Dict[str, List[int]] = {}
+    pack_path = output_dir / PACK_NAME
+    tmp_path = pack_path.with_suffix(".tmp")
+    offset = 0
+    with open(tmp_path, 'wb') as f:
+        for zh_id, data in corpus.syndromes.items():
+            blob = encode_document(data)
+            f.write(blob)
+            f.write(b"\n")
+            entries[zh_id] = [offset, len(blob)]
+            offset += len(blob) + 1
+    os.replace(tmp_path, pack_path)
+
+    return {
+        "version": PACK_VERSION,
+        "generated_at": datetime.now().strftime("%Y-%m-%d"),
+        "description": "證候詳情打包檔的位移對照表：ID → [位移, 長度]（位元組，UTF-8，每筆一行 JSON）",
+        "pack": PACK_NAME,
+        "format": "jsonl",
+        "total_bytes": offset,
+        "entries": entries,
+        "statistics": {
+            "total_syndromes": len(entries),
+            "total_bytes": offset
+        }
+    }
+
+
+class SyndromePack:
+    """
+    證候打包檔讀取器
+    以記憶體映射開啟打包檔，依對照表隨機存取單筆證候，只解析被讀取的那一筆
+    """
+
+    def __init__(self, table_path: Path):
+        table_path = Path(table_path)
+        with open(table_path, 'r', encoding='utf-8') as f:
+            table = json.load(f)
+        if table.get("version") != PACK_VERSION:
+            raise ValueError(f"不支援的打包檔版本: {table.get('version')}")
+
+        self.entries: Dict[str, List[int]] = table["entries"]
+        self.pack_path = table_path.parent / table["pack"]
+
+        self._file = open(self.pack_path, 'rb')
+        size = os.fstat(self._file.fileno()).st_size
+        if size != table["total_bytes"]:
+            self._file.close()
+            raise ValueError(f"打包檔與對照表不一致，請重新建構: {self.pack_path}")
+        # 空檔案無法映射
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if size else None
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def __contains__(self, syndrome_id: str) -> bool:
+        return syndrome_id in self.entries
+
+    def ids(self) -> Iterator[str]:
+        return iter(self.entries)
+
+    def raw(self, syndrome_id: str) -> Optional[bytes]:
+        """取得單筆證候的原始 JSON 位元組"""
+        entry = self.entries.get(syndrome_id)
+        if entry is None:
+            return None
+        offset, length = entry
+        return self._map[offset:offset + length]
+
+    def get(self, syndrome_id: str) -> Optional[Dict[str, Any]]:
+        """取得單筆證候"""
+        blob = self.raw(syndrome_id)
+        return json.loads(blob) if blob is not None else None
+
+    def close(self):
+        if self._map is not None:
+            self._map.close()
+        self._file.close()
+
+    def __enter__(self) -> "SyndromePack":
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def main():
+    """主函數"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="將證候詳情打包為單一檔案與位移對照表")
+    parser.add_argument(
+        "--data-dir",
+        default="data",
+        help="資料目錄路徑 (預設: data)"
+    )
+    parser.add_argument(
+        "--output-dir",
+        default="data/indexes",
+        help="輸出目錄"
+    )
+    add_jobs_arguments(parser)
+    add_cache_arguments(parser)
+
+    args = parser.parse_args()
+
+    # 確定資料目錄
+    script_dir = Path(__file__).parent
+    data_dir = script_dir.parent / args.data_dir
+    output_dir = script_dir.parent / args.output_dir
+
+    if not data_dir.exists():
+        print(f"錯誤: 資料目錄不存在: {data_dir}")
+        return 1
+
+    cache = snapshot_cache_for(data_dir, args.no_cache, args.rebuild_cache)
+    corpus = load_corpus(data_dir, ["syndromes"], args.jobs, args.pool, cache)
+    table = build_syndrome_pack(data_dir, corpus, output_dir)
+
+    table_path = output_dir / TABLE_NAME
+    with open(table_path, 'w', encoding='utf-8') as f:
+        json.dump(table, f, ensure_ascii=False, indent=2)
+
+    print(f"\n✅ 證候打包檔已生成: {output_dir / PACK_NAME}")
+    print(f"   對照表: {table_path}")
+    print(f"   證候數: {table['statistics']['total_syndromes']}")
+    print(f"   大小: {table['total_bytes'] / 1024:.0f} KB")
+
+    return 0
+
+
+if __name__ == "__main__":
+    exit(main())
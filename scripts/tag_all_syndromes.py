@@ -5,11 +5,14 @@
 為證候添加 zhengsu_composition, tagging_confidence, tagging_reasoning
 """
 
+import argparse
 import json
-import re
 from pathlib import Path
 from typing import Dict, List, Tuple, Optional
 
+from corpus import entity_files, read_json_files, add_jobs_arguments
+from keyword_matcher import KeywordAutomaton
+
 PROJECT_ROOT = Path(__file__).parent.parent
 SYNDROMES_DIR = PROJECT_ROOT / "data" / "zhenghou" / "syndromes"
 ANALYSIS_DIR = PROJECT_ROOT / "data" / "analysis"
@@ -590,39 +593,97 @@ SPECIAL_RULES: Dict[str, Dict] = {
 }
 
 
+# 臟腑常見組合（依序比對，已匹配的部分自名稱移除）
+ORGAN_PATTERNS: List[Tuple[str, List[str]]] = [
+    ("心肺", ["xin", "fei"]),
+    ("心脾", ["xin", "pi"]),
+    ("心腎", ["xin", "shen"]),
+    ("心肝", ["xin", "gan"]),
+    ("肝脾", ["gan", "pi"]),
+    ("肝腎", ["gan", "shen"]),
+    ("肝胃", ["gan", "wei"]),
+    ("肝膽", ["gan", "dan"]),
+    ("肺脾", ["fei", "pi"]),
+    ("肺腎", ["fei", "shen"]),
+    ("肺胃", ["fei", "wei"]),
+    ("脾腎", ["pi", "shen"]),
+    ("脾胃", ["pi", "wei"]),
+    ("胃腸", ["wei", "dachang"]),
+    ("沖任", ["baogong"]),
+]
+
+# 複合病性（依序比對，第一個命中的組合即為結果；「|」分隔同義寫法）
+COMPOUND_NATURE_PATTERNS: List[Tuple[str, List[str]]] = [
+    ("寒凝血瘀|血瘀寒凝|血虛寒凝", ["han", "xue_yu"]),
+    ("氣滯血瘀|血瘀氣滯", ["qi_zhi", "xue_yu"]),
+    ("氣虛血瘀", ["qi_xu", "xue_yu"]),
+    ("痰瘀互結|痰瘀", ["tan", "xue_yu"]),
+    ("痰熱", ["tan", "huo"]),
+    ("濕熱", ["shi", "huo"]),
+    ("寒濕", ["han", "shi"]),
+    ("風寒", ["feng", "han"]),
+    ("風熱", ["feng", "huo"]),
+    ("風濕", ["feng", "shi"]),
+    ("暑濕", ["shu", "shi"]),
+    ("暑熱", ["shu", "huo"]),
+    ("溫燥|燥熱", ["zao", "huo"]),
+    ("涼燥", ["zao", "han"]),
+    ("血熱動風|熱極生風|動風", ["xue_re", "dong_feng"]),
+    ("血虛生風|血虛風", ["xue_xu", "dong_feng"]),
+    ("陰虛陽亢|陰虛陽浮", ["yin_xu", "yang_kang"]),
+    ("陰虛血熱", ["yin_xu", "xue_re"]),
+    ("陰虛血燥", ["yin_xu", "zao"]),
+    ("陰虛動風", ["yin_xu", "dong_feng"]),
+    ("陽虛水泛|陽虛水停", ["yang_xu", "shui_ting"]),
+    ("陽虛寒凝", ["yang_xu", "han"]),
+    ("陽虛痰凝", ["yang_xu", "tan"]),
+    ("陽虛血瘀", ["yang_xu", "xue_yu"]),
+    ("氣滯痰凝", ["qi_zhi", "tan"]),
+    ("氣滯水停", ["qi_zhi", "shui_ting"]),
+    ("氣滯濕阻", ["qi_zhi", "shi"]),
+    ("氣鬱化火|氣鬱化熱", ["qi_zhi", "huo"]),
+    ("血熱動血", ["xue_re", "dong_xue"]),
+    ("血瘀動血", ["xue_yu", "dong_xue"]),
+    ("血瘀化熱", ["xue_yu", "huo"]),
+    ("血瘀水停", ["xue_yu", "shui_ting"]),
+    ("血虛津虧", ["xue_xu", "jin_kui"]),
+    ("血虛風燥", ["xue_xu", "dong_feng", "zao"]),
+    ("熱毒", ["huo", "du"]),
+    ("疫毒", ["du"]),
+    ("水濕泛濫|水濕", ["shi", "shui_ting"]),
+]
+
+# 關鍵字自動機（建立一次，供所有證候共用）
+ORGAN_MATCHER = KeywordAutomaton(ORGAN_PATTERNS)
+LOCATION_MATCHER = KeywordAutomaton.from_groups(LOCATION_KEYWORDS)
+COMPOUND_NATURE_MATCHER = KeywordAutomaton(
+    (alternative, natures)
+    for pattern, natures in COMPOUND_NATURE_PATTERNS
+    for alternative in pattern.split("|")
+)
+NATURE_MATCHER = KeywordAutomaton.from_groups(NATURE_KEYWORDS)
+
+
 def extract_location_from_name(name: str) -> List[str]:
     """從證候名稱提取病位"""
     locations = []
 
     # 特殊處理：臟腑證候常見組合
-    organ_patterns = [
-        (r"心肺", ["xin", "fei"]),
-        (r"心脾", ["xin", "pi"]),
-        (r"心腎", ["xin", "shen"]),
-        (r"心肝", ["xin", "gan"]),
-        (r"肝脾", ["gan", "pi"]),
-        (r"肝腎", ["gan", "shen"]),
-        (r"肝胃", ["gan", "wei"]),
-        (r"肝膽", ["gan", "dan"]),
-        (r"肺脾", ["fei", "pi"]),
-        (r"肺腎", ["fei", "shen"]),
-        (r"肺胃", ["fei", "wei"]),
-        (r"脾腎", ["pi", "shen"]),
-        (r"脾胃", ["pi", "wei"]),
-        (r"胃腸", ["wei", "dachang"]),
-        (r"沖任", ["baogong"]),
-    ]
-
-    for pattern, locs in organ_patterns:
-        if pattern in name:
-            locations.extend(locs)
-            name = name.replace(pattern, "")  # 移除已匹配的部分避免重複
+    # 依表中順序處理，移除已匹配的部分避免重複；移除後可能接合出新的組合，故每次重新掃描
+    next_priority = 0
+    while True:
+        hits = [hit for hit in ORGAN_MATCHER.find_all(name) if hit.priority >= next_priority]
+        if not hits:
+            break
+        hit = min(hits, key=lambda h: h.priority)
+        locations.extend(hit.value)
+        name = name.replace(hit.keyword, "")
+        next_priority = hit.priority + 1
 
     # 通用關鍵詞匹配
-    for loc_id, keywords in LOCATION_KEYWORDS.items():
-        for keyword in keywords:
-            if keyword in name and loc_id not in locations:
-                locations.append(loc_id)
+    for loc_id in LOCATION_MATCHER.values_in(name):
+        if loc_id not in locations:
+            locations.append(loc_id)
 
     return locations
 
@@ -631,59 +692,18 @@ def extract_nature_from_name(name: str) -> List[str]:
     """從證候名稱提取病性"""
     natures = []
 
-    # 特殊複合病性處理
-    compound_patterns = [
-        (r"寒凝血瘀|血瘀寒凝|血虛寒凝", ["han", "xue_yu"]),
-        (r"氣滯血瘀|血瘀氣滯", ["qi_zhi", "xue_yu"]),
-        (r"氣虛血瘀", ["qi_xu", "xue_yu"]),
-        (r"痰瘀互結|痰瘀", ["tan", "xue_yu"]),
-        (r"痰熱", ["tan", "huo"]),
-        (r"濕熱", ["shi", "huo"]),
-        (r"寒濕", ["han", "shi"]),
-        (r"風寒", ["feng", "han"]),
-        (r"風熱", ["feng", "huo"]),
-        (r"風濕", ["feng", "shi"]),
-        (r"暑濕", ["shu", "shi"]),
-        (r"暑熱", ["shu", "huo"]),
-        (r"溫燥|燥熱", ["zao", "huo"]),
-        (r"涼燥", ["zao", "han"]),
-        (r"血熱動風|熱極生風|動風", ["xue_re", "dong_feng"]),
-        (r"血虛生風|血虛風", ["xue_xu", "dong_feng"]),
-        (r"陰虛陽亢|陰虛陽浮", ["yin_xu", "yang_kang"]),
-        (r"陰虛血熱", ["yin_xu", "xue_re"]),
-        (r"陰虛血燥", ["yin_xu", "zao"]),
-        (r"陰虛動風", ["yin_xu", "dong_feng"]),
-        (r"陽虛水泛|陽虛水停", ["yang_xu", "shui_ting"]),
-        (r"陽虛寒凝", ["yang_xu", "han"]),
-        (r"陽虛痰凝", ["yang_xu", "tan"]),
-        (r"陽虛血瘀", ["yang_xu", "xue_yu"]),
-        (r"氣滯痰凝", ["qi_zhi", "tan"]),
-        (r"氣滯水停", ["qi_zhi", "shui_ting"]),
-        (r"氣滯濕阻", ["qi_zhi", "shi"]),
-        (r"氣鬱化火|氣鬱化熱", ["qi_zhi", "huo"]),
-        (r"血熱動血", ["xue_re", "dong_xue"]),
-        (r"血瘀動血", ["xue_yu", "dong_xue"]),
-        (r"血瘀化熱", ["xue_yu", "huo"]),
-        (r"血瘀水停", ["xue_yu", "shui_ting"]),
-        (r"血虛津虧", ["xue_xu", "jin_kui"]),
-        (r"血虛風燥", ["xue_xu", "dong_feng", "zao"]),
-        (r"熱毒", ["huo", "du"]),
-        (r"疫毒", ["du"]),
-        (r"水濕泛濫|水濕", ["shi", "shui_ting"]),
-    ]
-
-    for pattern, nature_list in compound_patterns:
-        if re.search(pattern, name):
-            for n in nature_list:
-                if n not in natures:
-                    natures.append(n)
-            return natures  # 找到複合模式後直接返回
+    # 特殊複合病性處理：找到複合模式後直接返回
+    nature_list = COMPOUND_NATURE_MATCHER.first(name)
+    if nature_list is not None:
+        for n in nature_list:
+            if n not in natures:
+                natures.append(n)
+        return natures
 
     # 通用關鍵詞匹配
-    for nat_id, keywords in NATURE_KEYWORDS.items():
-        for keyword in keywords:
-            if keyword in name and nat_id not in natures:
-                natures.append(nat_id)
+    for nat_id in NATURE_MATCHER.values_in(name):
+        if nat_id not in natures:
+            natures.append(nat_id)
 
     return natures
 
@@ -754,7 +774,7 @@ def tag_syndrome(syndrome_data: dict) -> dict:
     return syndrome_data
 
 
-def process_category(category: str) -> Dict:
+def process_category(category: str, jobs: int = 1, pool: str = "thread") -> Dict:
     """處理指定類別的所有證候"""
     results = {
         "category": category,
@@ -765,12 +785,13 @@ def process_category(category: str) -> Dict:
         "details": []
     }
 
+    paths = [f for f in entity_files(SYNDROMES_DIR) if f.name != "index.json"]
+
     syndromes = []
-    for filepath in SYNDROMES_DIR.glob("*.json"):
-        if filepath.name == "index.json":
+    for filepath, data, error in read_json_files(paths, jobs, pool):
+        if error:
+            print(f"警告: {error}")
             continue
-        with open(filepath, "r", encoding="utf-8") as f:
-            data = json.load(f)
         if data.get("category") == category:
             syndromes.append((filepath, data))
 
@@ -808,6 +829,10 @@ def process_category(category: str) -> Dict:
 
 def main():
     """主函數：處理所有非基礎證候類別"""
+    parser = argparse.ArgumentParser(description="為所有非基礎證候標註證素")
+    add_jobs_arguments(parser)
+    args = parser.parse_args()
+
     categories = ["全身證候", "臟腑證候", "傷寒證候", "溫病證候", "專科證候"]
 
     all_results = {
@@ -821,7 +846,7 @@ def main():
     }
 
     for category in categories:
-        results = process_category(category)
+        results = process_category(category, args.jobs, args.pool)
         all_results["by_category"][category] = results
         all_results["summary"]["total"] += results["total"]
         all_results["summary"]["high"] += results["high"]
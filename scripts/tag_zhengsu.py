@@ -11,6 +11,8 @@ import re
 from pathlib import Path
 from typing import Dict, List, Tuple, Set
 
+from keyword_matcher import KeywordAutomaton
+
 # 項目根目錄
 PROJECT_ROOT = Path(__file__).parent.parent
 ZHENGSU_DIR = PROJECT_ROOT / "data" / "zhengsu"
@@ -150,8 +152,17 @@ def preprocess_name(name: str) -> str:
     return clean_name
 
 
-def extract_zhengsu_from_name(name: str, location_map: Dict[str, str],
-                               nature_map: Dict[str, str]) -> Tuple[List[str], List[str], List[str]]:
+def build_keyword_matchers(location_map: Dict[str, str],
+                           nature_map: Dict[str, str]) -> Tuple[KeywordAutomaton, KeywordAutomaton]:
+    """
+    將證素對照表編譯為關鍵字自動機（建立一次，供所有證候共用）
+    返回: (病位自動機, 病性自動機)
+    """
+    return KeywordAutomaton.from_mapping(location_map), KeywordAutomaton.from_mapping(nature_map)
+
+
+def extract_zhengsu_from_name(name: str, location_matcher: KeywordAutomaton,
+                               nature_matcher: KeywordAutomaton) -> Tuple[List[str], List[str], List[str]]:
     """
     從證候名稱中提取病位和病性證素
     返回: (病位ID列表, 病性ID列表, 無法識別的原因列表)
@@ -168,23 +179,14 @@ def extract_zhengsu_from_name(name: str, location_map: Dict[str, str],
     if special_syndromes:
         return special_syndromes[0], special_syndromes[1], []
 
-    # 按長度排序，優先匹配較長的關鍵字
-    sorted_locations = sorted(location_map.keys(), key=len, reverse=True)
-    sorted_natures = sorted(nature_map.keys(), key=len, reverse=True)
-
-    # 匹配病位（使用副本避免多次替換問題）
-    remaining = clean_name
-    for keyword in sorted_locations:
-        if keyword in remaining:
-            locations.add(location_map[keyword])
-            remaining = remaining.replace(keyword, "□", 1)  # 用占位符避免重複匹配
+    # 優先匹配較長的關鍵字，已匹配的片段不再被較短的關鍵字重複使用
+    # 匹配病位
+    for hit in location_matcher.longest_first(clean_name):
+        locations.add(hit.value)
 
     # 匹配病性
-    remaining = clean_name
-    for keyword in sorted_natures:
-        if keyword in remaining:
-            natures.add(nature_map[keyword])
-            remaining = remaining.replace(keyword, "□", 1)
+    for hit in nature_matcher.longest_first(clean_name):
+        natures.add(hit.value)
 
     # 特殊情況：氣陰兩虛 -> qi_xu + yin_xu
     if "氣陰" in clean_name and "兩虛" in clean_name:
@@ -377,14 +379,14 @@ def process_special_syndromes(name: str) -> Tuple[List[str], List[str]] | None:
     return None
 
 
-def tag_syndrome(syndrome_data: dict, location_map: Dict[str, str],
-                 nature_map: Dict[str, str]) -> Tuple[dict, List[str]]:
+def tag_syndrome(syndrome_data: dict, location_matcher: KeywordAutomaton,
+                 nature_matcher: KeywordAutomaton) -> Tuple[dict, List[str]]:
     """
     為單個證候添加證素標註
     返回: (更新後的資料, 問題列表)
     """
     name = syndrome_data.get("name", "")
-    locations, natures, issues = extract_zhengsu_from_name(name, location_map, nature_map)
+    locations, natures, issues = extract_zhengsu_from_name(name, location_matcher, nature_matcher)
 
     # 添加證素組成欄位
     syndrome_data["zhengsu_composition"] = {
@@ -399,7 +401,7 @@ def process_all_syndromes():
     """
     處理所有證候檔案
     """
-    location_map, nature_map = build_extended_mappings()
+    location_matcher, nature_matcher = build_keyword_matchers(*build_extended_mappings())
 
     results = {
         "total": 0,
@@ -421,7 +423,7 @@ def process_all_syndromes():
             with open(filepath, "r", encoding="utf-8") as f:
                 data = json.load(f)
 
-            updated_data, issues = tag_syndrome(data, location_map, nature_map)
+            updated_data, issues = tag_syndrome(data, location_matcher, nature_matcher)
 
             # 寫回檔案
             with open(filepath, "w", encoding="utf-8") as f:
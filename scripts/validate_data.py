@@ -5,12 +5,17 @@
 檢查 TCM 資料的完整性和一致性
 """
 
-import json
 import os
 from pathlib import Path
-from typing import Dict, List, Set, Any, Tuple
+from typing import Dict, List, Set, Any, Tuple, Optional
 from dataclasses import dataclass, field
 
+from corpus import Corpus, ensure_corpus
+
+
+# 驗證所需的實體目錄
+VALIDATION_ENTITIES = ["zhengsu", "zhengxing", "formulas", "herbs", "symptoms"]
+
 
 @dataclass
 class ValidationResult:
@@ -64,8 +69,9 @@ class ValidationResult:
 class DataValidator:
     """資料驗證器"""
 
-    def __init__(self, data_dir: str):
+    def __init__(self, data_dir: str, corpus: Optional[Corpus] = None):
         self.data_dir = Path(data_dir)
+        self.corpus = corpus
         self.result = ValidationResult()
 
         # 載入所有資料
@@ -78,71 +84,22 @@ class DataValidator:
         self.zhengxing_data: Dict[str, Any] = {}
         self.zhengsu_data: Dict[str, Any] = {}
 
-    def load_json(self, file_path: Path) -> Dict:
-        """載入 JSON 檔案"""
-        try:
-            with open(file_path, 'r', encoding='utf-8') as f:
-                return json.load(f)
-        except json.JSONDecodeError as e:
-            self.result.add_error(f"JSON 解析錯誤: {file_path} - {e}")
-            return {}
-        except Exception as e:
-            self.result.add_error(f"讀取檔案錯誤: {file_path} - {e}")
-            return {}
-
     def load_all_ids(self):
         """載入所有實體的 ID"""
-        # 載入證素 ID
-        zhengsu_dir = self.data_dir / "zhengsu"
-        if zhengsu_dir.exists():
-            for f in zhengsu_dir.glob("*.json"):
-                if f.name.startswith("_"):
-                    continue
-                data = self.load_json(f)
-                if "id" in data:
-                    self.zhengsu_ids.add(data["id"])
-                    self.zhengsu_data[data["id"]] = data
-
-        # 載入證型 ID
-        zhengxing_dir = self.data_dir / "zhengxing"
-        if zhengxing_dir.exists():
-            for f in zhengxing_dir.glob("*.json"):
-                if f.name.startswith("_"):
-                    continue
-                data = self.load_json(f)
-                if "id" in data:
-                    self.zhengxing_ids.add(data["id"])
-                    self.zhengxing_data[data["id"]] = data
-
-        # 載入方劑 ID
-        formulas_dir = self.data_dir / "formulas"
-        if formulas_dir.exists():
-            for f in formulas_dir.glob("*.json"):
-                if f.name.startswith("_"):
-                    continue
-                data = self.load_json(f)
-                if "id" in data:
-                    self.formula_ids.add(data["id"])
-
-        # 載入中藥 ID
-        herbs_dir = self.data_dir / "herbs"
-        if herbs_dir.exists():
-            for f in herbs_dir.glob("*.json"):
-                if f.name.startswith("_"):
-                    continue
-                data = self.load_json(f)
-                if "id" in data:
-                    self.herb_ids.add(data["id"])
-
-        # 載入症狀 ID
-        symptoms_dir = self.data_dir / "symptoms"
-        if symptoms_dir.exists():
-            for f in symptoms_dir.glob("*.json"):
-                if f.name.startswith("_"):
-                    continue
-                data = self.load_json(f)
-                if "id" in data:
-                    self.symptom_ids.add(data["id"])
+        corpus = ensure_corpus(self.data_dir, self.corpus, VALIDATION_ENTITIES)
+
+        for name in VALIDATION_ENTITIES:
+            for msg in corpus.load_errors.get(name, []):
+                self.result.add_error(msg)
+
+        self.zhengsu_data = corpus.zhengsu
+        self.zhengxing_data = corpus.zhengxing
+
+        self.zhengsu_ids = set(corpus.zhengsu)
+        self.zhengxing_ids = set(corpus.zhengxing)
+        self.formula_ids = set(corpus.formulas)
+        self.herb_ids = set(corpus.herbs)
+        self.symptom_ids = set(corpus.symptoms)
 
         self.result.add_info(f"載入證素: {len(self.zhengsu_ids)} 個")
         self.result.add_info(f"載入證型: {len(self.zhengxing_ids)} 個")
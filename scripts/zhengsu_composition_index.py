@@ -0,0 +1,260 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+證素組成遮罩索引
+每個證素給予一個位元（data/zhengsu/ 的證素在前，約 55 個，只用已收錄證素的組成一個 64 位元字組即可容納；
+組成中出現但未收錄的證素排在其後，遮罩以 Python 整數表示不受字組大小限制），
+每個證型/證候的證素組成（病位 + 病性）編碼為一個遮罩；
+「至少含」「只由這些組成」「完全相同」的查詢即為遮罩比較：
+- 超集合：mask & query == query
+- 子集合：mask & ~query == 0
+- 完全相同：mask == query
+組成相同的證型/證候共用一個遮罩，查詢只需掃描不同的遮罩
+"""
+
+from pathlib import Path
+from typing import Dict, List, Any, Iterable, Optional, Tuple
+from dataclasses import dataclass
+
+from corpus import Corpus, load_corpus, add_jobs_arguments, add_cache_arguments, snapshot_cache_for
+
+
+COMPOSITION_INDEX_VERSION = 1
+
+# 實體類型
+KIND_ZHENGXING = "zhengxing"
+KIND_SYNDROME = "syndrome"
+
+# 查詢方式
+QUERY_SUPERSET = "superset"
+QUERY_SUBSET = "subset"
+QUERY_EXACT = "exact"
+QUERY_MODES = [QUERY_SUPERSET, QUERY_SUBSET, QUERY_EXACT]
+
+QUERY_LABELS = {
+    QUERY_SUPERSET: "至少含",
+    QUERY_SUBSET: "只由其中的證素組成",
+    QUERY_EXACT: "組成完全相同",
+}
+
+
+def composition_ids(data: Dict[str, Any]) -> List[str]:
+    """證型/證候的證素組成（病位在前，去除重複）"""
+    composition = data.get("zhengsu_composition") or {}
+    return list(dict.fromkeys(
+        zhengsu_id for role in ["location", "nature"] for zhengsu_id in composition.get(role, [])
+    ))
+
+
+@dataclass
+class CompositionEntry:
+    """索引中的證型/證候"""
+    kind: str
+    id: str
+    name: str
+
+
+class CompositionIndex:
+    """
+    證素組成遮罩索引
+    zhengsu[i] 為第 i 個位元的證素；groups 為「遮罩 → 證型/證候序號」
+    """
+
+    def __init__(self, zhengsu: List[str], entries: List[CompositionEntry], masks: List[int],
+                 recorded: Optional[int] = None):
+        self.zhengsu = zhengsu
+        # 前 recorded 個證素為 data/zhengsu/ 中收錄者
+        self.recorded = len(zhengsu) if recorded is None else recorded
+        self.bits = {zhengsu_id: 1 << i for i, zhengsu_id in enumerate(zhengsu)}
+        self.entries = entries
+        self.masks = masks
+
+        self.groups: Dict[int, List[int]] = {}
+        for i, mask in enumerate(masks):
+            if mask:
+                self.groups.setdefault(mask, []).append(i)
+        self.distinct = list(self.groups)
+
+    @classmethod
+    def from_corpus(cls, corpus: Corpus) -> "CompositionIndex":
+        # 證素資料目錄中的證素依序給予位元，組成中出現但未收錄的證素排在其後
+        zhengsu = list(corpus.zhengsu)
+        recorded = len(zhengsu)
+        known = set(zhengsu)
+        entries: List[CompositionEntry] = []
+        compositions: List[List[str]] = []
+        for kind, entities in [(KIND_ZHENGXING, corpus.zhengxing), (KIND_SYNDROME, corpus.syndromes)]:
+            for entity_id, data in entities.items():
+                ids = composition_ids(data)
+                for zhengsu_id in ids:
+                    if zhengsu_id not in known:
+                        known.add(zhengsu_id)
+                        zhengsu.append(zhengsu_id)
+                entries.append(CompositionEntry(kind, entity_id, data.get("name", "")))
+                compositions.append(ids)
+
+        bits = {zhengsu_id: 1 << i for i, zhengsu_id in enumerate(zhengsu)}
+        masks = [sum(bits[zhengsu_id] for zhengsu_id in ids) for ids in compositions]
+        return cls(zhengsu, entries, masks, recorded)
+
+    @classmethod
+    def from_json(cls, data: Dict[str, Any]) -> "CompositionIndex":
+        if data.get("version") != COMPOSITION_INDEX_VERSION:
+            raise ValueError(f"不支援的證素組成索引版本: {data.get('version')}")
+        entries = []
+        masks = []
+        for kind, items in [(KIND_ZHENGXING, data["zhengxing"]), (KIND_SYNDROME, data["syndromes"])]:
+            for entity_id, (name, mask) in items.items():
+                entries.append(CompositionEntry(kind, entity_id, name))
+                masks.append(int(mask, 16))
+        return cls(data["zhengsu"], entries, masks, data.get("recorded_zhengsu"))
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    @property
+    def word_bits(self) -> int:
+        """所有遮罩所需的位元數"""
+        return max(self.distinct, default=0).bit_length()
+
+    def encode(self, zhengsu_ids: Iterable[str]) -> Tuple[int, List[str]]:
+        """證素 ID → (遮罩, 索引中沒有的證素)"""
+        mask = 0
+        unknown = []
+        for zhengsu_id in zhengsu_ids:
+            bit = self.bits.get(zhengsu_id)
+            if bit is None:
+                unknown.append(zhengsu_id)
+            else:
+                mask |= bit
+        return mask, unknown
+
+    def decode(self, mask: int) -> List[str]:
+        return [zhengsu_id for zhengsu_id, bit in self.bits.items() if mask & bit]
+
+    def matching_masks(self, mode: str, query: int) -> List[int]:
+        """符合條件的不同遮罩"""
+        if mode == QUERY_SUPERSET:
+            return [mask for mask in self.distinct if mask & query == query]
+        if mode == QUERY_SUBSET:
+            return [mask for mask in self.distinct if not mask & ~query]
+        if mode == QUERY_EXACT:
+            return [query] if query in self.groups else []
+        raise ValueError(f"未知的查詢方式: {mode}")
+
+    def positions(self, mode: str, zhengsu_ids: Iterable[str],
+                  kinds: Optional[Iterable[str]] = None) -> List[int]:
+        """
+        依證素組成查詢，回傳符合的證型/證候序號（依建立順序排列）
+        查詢含索引中沒有的證素時：超集合與完全相同無結果，子集合忽略該證素
+        """
+        query, unknown = self.encode(zhengsu_ids)
+        if unknown and mode != QUERY_SUBSET:
+            return []
+
+        allowed = set(kinds) if kinds is not None else None
+        return sorted(
+            i for mask in self.matching_masks(mode, query) for i in self.groups[mask]
+            if allowed is None or self.entries[i].kind in allowed
+        )
+
+    def query(self, mode: str, zhengsu_ids: Iterable[str],
+              kinds: Optional[Iterable[str]] = None) -> List[CompositionEntry]:
+        """依證素組成查詢證型/證候"""
+        return [self.entries[i] for i in self.positions(mode, zhengsu_ids, kinds)]
+
+    def supersets(self, zhengsu_ids: Iterable[str], **kwargs) -> List[CompositionEntry]:
+        return self.query(QUERY_SUPERSET, zhengsu_ids, **kwargs)
+
+    def subsets(self, zhengsu_ids: Iterable[str], **kwargs) -> List[CompositionEntry]:
+        return self.query(QUERY_SUBSET, zhengsu_ids, **kwargs)
+
+    def exact(self, zhengsu_ids: Iterable[str], **kwargs) -> List[CompositionEntry]:
+        return self.query(QUERY_EXACT, zhengsu_ids, **kwargs)
+
+    def to_json(self) -> Dict[str, Any]:
+        """遮罩以十六進位字串表示（前端 BigInt 可直接解析，不受 53 位元整數限制）"""
+        data: Dict[str, Any] = {
+            "version": COMPOSITION_INDEX_VERSION,
+            "description": "證素組成遮罩：第 i 位元對應 zhengsu[i]；zhengxing/syndromes 為 ID → [名稱, 十六進位遮罩]",
+            "zhengsu": self.zhengsu,
+            "recorded_zhengsu": self.recorded,
+            "zhengxing": {},
+            "syndromes": {}
+        }
+        for entry, mask in zip(self.entries, self.masks):
+            key = "zhengxing" if entry.kind == KIND_ZHENGXING else "syndromes"
+            data[key][entry.id] = [entry.name, format(mask, "x")]
+        data["statistics"] = {
+            "total_zhengsu": len(self.zhengsu),
+            "total_entries": len(self.entries),
+            "distinct_compositions": len(self.distinct),
+            "mask_bits": self.word_bits,
+            "unrecorded_zhengsu": self.zhengsu[self.recorded:]
+        }
+        return data
+
+
+def main():
+    """主函數"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="依證素組成查詢證型與證候（超集合、子集合、完全相同）")
+    parser.add_argument(
+        "zhengsu",
+        nargs="+",
+        help="證素 ID，如：pi qi_xu"
+    )
+    parser.add_argument(
+        "--data-dir",
+        default="data",
+        help="資料目錄路徑 (預設: data)"
+    )
+    parser.add_argument(
+        "-m", "--mode",
+        choices=QUERY_MODES,
+        default=QUERY_SUPERSET,
+        help=f"查詢方式：{QUERY_SUPERSET} 至少含、{QUERY_SUBSET} 只由其中的證素組成、{QUERY_EXACT} 完全相同 (預設: {QUERY_SUPERSET})"
+    )
+    parser.add_argument(
+        "--kind",
+        choices=[KIND_ZHENGXING, KIND_SYNDROME],
+        help="只回傳證型或證候"
+    )
+    add_jobs_arguments(parser)
+    add_cache_arguments(parser)
+
+    args = parser.parse_args()
+
+    # 確定資料目錄
+    script_dir = Path(__file__).parent
+    data_dir = script_dir.parent / args.data_dir
+
+    if not data_dir.exists():
+        print(f"錯誤: 資料目錄不存在: {data_dir}")
+        return 1
+
+    cache = snapshot_cache_for(data_dir, args.no_cache, args.rebuild_cache)
+    corpus = load_corpus(data_dir, ["zhengsu", "zhengxing", "syndromes"], args.jobs, args.pool, cache)
+    index = CompositionIndex.from_corpus(corpus)
+
+    _, unknown = index.encode(args.zhengsu)
+    if unknown:
+        print(f"⚠️  索引中沒有的證素: {'、'.join(unknown)}")
+
+    kinds = [args.kind] if args.kind else None
+    positions = index.positions(args.mode, args.zhengsu, kinds)
+
+    names = [corpus.zhengsu.get(zs, {}).get("name", zs) for zs in args.zhengsu]
+    print(f"{QUERY_LABELS[args.mode]}「{'+'.join(names)}」: {len(positions)} 個"
+          f"（索引 {len(index)} 個證型/證候，{len(index.distinct)} 種組成，遮罩 {index.word_bits} 位元）\n")
+    for i in positions:
+        entry = index.entries[i]
+        kind = "證型" if entry.kind == KIND_ZHENGXING else "證候"
+        print(f"  [{kind}] {entry.name} ({entry.id})  {'+'.join(index.decode(index.masks[i]))}")
+
+    return 0
+
+
+if __name__ == "__main__":
+    exit(main())
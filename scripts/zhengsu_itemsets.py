@@ -0,0 +1,272 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+證素頻繁項目集探勘
+以每個證型/證候的證素組成（病位 + 病性）為一筆交易，
+以垂直格式（證素 → 交易位元集合）深度優先探勘頻繁項目集（Eclat），
+支持度即位元集合 AND 後的 popcount；再由頻繁項目集產生關聯規則（支持度、信賴度、提升度）
+"""
+
+import math
+import time
+from itertools import combinations
+from pathlib import Path
+from typing import Dict, List, Any, Iterable, Tuple
+from dataclasses import dataclass
+
+from corpus import Corpus, load_corpus, add_cache_arguments, snapshot_cache_for
+
+
+
+DEFAULT_MIN_SUPPORT = 0.01
+DEFAULT_MIN_CONFIDENCE = 0.5
+DEFAULT_MIN_LIFT = 1.0
+DEFAULT_MAX_LENGTH = 4
+
+
+@dataclass
+class FrequentItemset:
+    """頻繁項目集：items 依證素 ID 排序"""
+    items: Tuple[str, ...]
+    count: int
+    support: float
+
+
+@dataclass
+class AssociationRule:
+    """關聯規則 antecedent → consequent"""
+    antecedent: Tuple[str, ...]
+    consequent: Tuple[str, ...]
+    count: int
+    support: float
+    confidence: float
+    lift: float
+
+
+def build_transactions(corpus: Corpus) -> List[Tuple[str, ...]]:
+    """證型與證候的證素組成（病位 + 病性，去除重複並排序）；無證素者略過"""
+    transactions = []
+    for entities in [corpus.zhengxing, corpus.syndromes]:
+        for data in entities.values():
+            composition = data.get("zhengsu_composition") or {}
+            items = {zs for role in ["location", "nature"] for zs in composition.get(role, [])}
+            if items:
+                transactions.append(tuple(sorted(items)))
+    return transactions
+
+
+def mine_frequent_itemsets(transactions: List[Tuple[str, ...]], min_support: float = DEFAULT_MIN_SUPPORT,
+                           max_length: int = DEFAULT_MAX_LENGTH) -> List[FrequentItemset]:
+    """
+    探勘支持度 ≥ min_support（比例）且長度 ≤ max_length 的頻繁項目集
+    每個證素的交易集合為一個整數位元集合；延伸項目集時只與排序在後的同層項目做 AND，
+    不需產生候選再掃描交易
+    """
+    total = len(transactions)
+    if not total:
+        return []
+    min_count = max(1, math.ceil(min_support * total - 1e-9))
+
+    tidsets: Dict[str, int] = {}
+    for t, items in enumerate(transactions):
+        bit = 1 << t
+        for item in items:
+            tidsets[item] = tidsets.get(item, 0) | bit
+
+    # 單一證素層：依支持度由低至高排列，使延伸時位元集合較快變小
+    level = sorted(
+        ((item, tidset, tidset.bit_count()) for item, tidset in tidsets.items()),
+        key=lambda entry: (entry[2], entry[0])
+    )
+    level = [entry for entry in level if entry[2] >= min_count]
+
+    results: List[FrequentItemset] = []
+
+    def extend(prefix: Tuple[str, ...], siblings: List[Tuple[str, int, int]]):
+        for i, (item, tidset, count) in enumerate(siblings):
+            itemset = prefix + (item,)
+            results.append(FrequentItemset(tuple(sorted(itemset)), count, count / total))
+            if len(itemset) >= max_length:
+                continue
+            children = []
+            for other, other_tidset, _ in siblings[i + 1:]:
+                joined = tidset & other_tidset
+                joined_count = joined.bit_count()
+                if joined_count >= min_count:
+                    children.append((other, joined, joined_count))
+            if children:
+                extend(itemset, children)
+
+    extend((), level)
+    results.sort(key=lambda itemset: (-itemset.count, len(itemset.items), itemset.items))
+    return results
+
+
+def generate_rules(itemsets: List[FrequentItemset], total: int,
+                   min_confidence: float = DEFAULT_MIN_CONFIDENCE,
+                   min_lift: float = DEFAULT_MIN_LIFT) -> List[AssociationRule]:
+    """
+    由頻繁項目集產生關聯規則
+    頻繁項目集的子集必為頻繁，前提與結論的次數皆可直接查表
+    """
+    counts = {itemset.items: itemset.count for itemset in itemsets}
+    rules: List[AssociationRule] = []
+    for itemset in itemsets:
+        items = itemset.items
+        if len(items) < 2:
+            continue
+        for size in range(1, len(items)):
+            for antecedent in combinations(items, size):
+                consequent = tuple(item for item in items if item not in antecedent)
+                confidence = itemset.count / counts[antecedent]
+                if confidence < min_confidence:
+                    continue
+                lift = confidence / (counts[consequent] / total)
+                if lift < min_lift:
+                    continue
+                rules.append(AssociationRule(
+                    antecedent, consequent, itemset.count, itemset.support,
+                    round(confidence, 4), round(lift, 4)
+                ))
+    rules.sort(key=lambda rule: (-rule.lift, -rule.confidence, -rule.count, rule.antecedent, rule.consequent))
+    return rules
+
+
+def mine_zhengsu_patterns(transactions: List[Tuple[str, ...]], min_support: float = DEFAULT_MIN_SUPPORT,
+                          min_confidence: float = DEFAULT_MIN_CONFIDENCE, min_lift: float = DEFAULT_MIN_LIFT,
+                          max_length: int = DEFAULT_MAX_LENGTH) -> Tuple[List[FrequentItemset], List[AssociationRule]]:
+    """探勘頻繁項目集與關聯規則，回傳 (項目集, 規則)"""
+    itemsets = mine_frequent_itemsets(transactions, min_support, max_length)
+    rules = generate_rules(itemsets, len(transactions), min_confidence, min_lift)
+    return itemsets, rules
+
+
+def itemsets_to_json(itemsets: List[FrequentItemset], rules: List[AssociationRule],
+                     names: Dict[str, str], total: int, thresholds: Dict[str, Any]) -> Dict[str, Any]:
+    """轉為對應索引中的 JSON 區塊（附證素名稱）"""
+    def named(items: Iterable[str]) -> List[str]:
+        return [names.get(item, item) for item in items]
+
+    return {
+        "description": "證型與證候證素組成（病位 + 病性）的頻繁項目集與關聯規則",
+        "transactions": total,
+        "thresholds": thresholds,
+        "itemsets": [
+            {
+                "zhengsu": list(itemset.items),
+                "zhengsu_names": named(itemset.items),
+                "count": itemset.count,
+                "support": round(itemset.support, 4)
+            }
+            for itemset in itemsets
+        ],
+        "rules": [
+            {
+                "antecedent": list(rule.antecedent),
+                "antecedent_names": named(rule.antecedent),
+                "consequent": list(rule.consequent),
+                "consequent_names": named(rule.consequent),
+                "count": rule.count,
+                "support": round(rule.support, 4),
+                "confidence": rule.confidence,
+                "lift": rule.lift
+            }
+            for rule in rules
+        ]
+    }
+
+
+def replicate_transactions(transactions: List[Tuple[str, ...]], count: int) -> List[Tuple[str, ...]]:
+    """循環複製交易至指定數量（效能測試用）"""
+    return [transactions[i % len(transactions)] for i in range(count)]
+
+
+def main():
+    """主函數"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="探勘證素組成的頻繁項目集與關聯規則")
+    parser.add_argument(
+        "--data-dir",
+        default="data",
+        help="資料目錄路徑 (預設: data)"
+    )
+    parser.add_argument(
+        "--min-support",
+        type=float,
+        default=DEFAULT_MIN_SUPPORT,
+        help=f"最低支持度（比例）(預設: {DEFAULT_MIN_SUPPORT})"
+    )
+    parser.add_argument(
+        "--min-confidence",
+        type=float,
+        default=DEFAULT_MIN_CONFIDENCE,
+        help=f"最低信賴度 (預設: {DEFAULT_MIN_CONFIDENCE})"
+    )
+    parser.add_argument(
+        "--min-lift",
+        type=float,
+        default=DEFAULT_MIN_LIFT,
+        help=f"最低提升度 (預設: {DEFAULT_MIN_LIFT})"
+    )
+    parser.add_argument(
+        "--max-length",
+        type=int,
+        default=DEFAULT_MAX_LENGTH,
+        help=f"項目集最大長度 (預設: {DEFAULT_MAX_LENGTH})"
+    )
+    parser.add_argument(
+        "-n", "--show",
+        type=int,
+        default=15,
+        help="列出的項目集與規則數 (預設: 15)"
+    )
+    parser.add_argument(
+        "--scale",
+        type=int,
+        help="效能測試：將交易循環複製至指定數量後計時"
+    )
+    add_cache_arguments(parser)
+
+    args = parser.parse_args()
+
+    # 確定資料目錄
+    script_dir = Path(__file__).parent
+    data_dir = script_dir.parent / args.data_dir
+
+    if not data_dir.exists():
+        print(f"錯誤: 資料目錄不存在: {data_dir}")
+        return 1
+
+    cache = snapshot_cache_for(data_dir, args.no_cache, args.rebuild_cache)
+    corpus = load_corpus(data_dir, ["zhengsu", "zhengxing", "syndromes"], cache=cache)
+    transactions = build_transactions(corpus)
+    names = {zs_id: data.get("name", zs_id) for zs_id, data in corpus.zhengsu.items()}
+
+    if args.scale:
+        transactions = replicate_transactions(transactions, args.scale)
+
+    start = time.perf_counter()
+    itemsets, rules = mine_zhengsu_patterns(
+        transactions, args.min_support, args.min_confidence, args.min_lift, args.max_length
+    )
+    elapsed = time.perf_counter() - start
+
+    print(f"交易數: {len(transactions)}，頻繁項目集: {len(itemsets)}，關聯規則: {len(rules)}，"
+          f"{elapsed * 1000:.1f} ms")
+
+    print("\n頻繁項目集（2 個以上證素）:")
+    for itemset in [i for i in itemsets if len(i.items) >= 2][:args.show]:
+        print(f"  {itemset.count:>5}  {itemset.support:.3f}  {'+'.join(names.get(z, z) for z in itemset.items)}")
+
+    print("\n關聯規則:")
+    for rule in rules[:args.show]:
+        antecedent = "+".join(names.get(z, z) for z in rule.antecedent)
+        consequent = "+".join(names.get(z, z) for z in rule.consequent)
+        print(f"  {antecedent} → {consequent}  支持度 {rule.support:.3f}  信賴度 {rule.confidence:.2f}  提升度 {rule.lift:.2f}")
+
+    return 0
+
+
+if __name__ == "__main__":
+    exit(main())
@@ -3,32 +3,13 @@
 中藥查詢工具 - 支援按歸經、證素、治法查詢中藥資料
 """
 
-import json
 import sys
 from pathlib import Path
 
+# 共用 scripts/ 下的語料載入模組（含快照快取）
+sys.path.insert(0, str(Path(__file__).parent.parent / "scripts"))
 
-def load_all_herbs(herbs_dir: Path) -> list[dict]:
-    """讀取所有中藥資料"""
-    herbs = []
-    for file_path in herbs_dir.glob("*.json"):
-        if file_path.name.startswith("_"):
-            continue
-        with open(file_path, "r", encoding="utf-8") as f:
-            herbs.append(json.load(f))
-    return herbs
-
-
-def load_all_zhengsu(zhengsu_dir: Path) -> dict[str, dict]:
-    """讀取所有證素資料，返回 ID 到證素的映射"""
-    zhengsu_map = {}
-    for file_path in zhengsu_dir.glob("*.json"):
-        if file_path.name.startswith("_"):
-            continue
-        with open(file_path, "r", encoding="utf-8") as f:
-            data = json.load(f)
-            zhengsu_map[data["id"]] = data
-    return zhengsu_map
+from corpus import load_corpus, snapshot_cache_for
 
 
 def get_herb_zhengsu(herb: dict) -> set[str]:
@@ -148,6 +129,65 @@ def list_all_treatments(herbs: list[dict]) -> set[str]:
     return treatments
 
 
+class JsonHerbStore:
+    """以 JSON 語料查詢中藥（逐筆掃描）"""
+
+    def __init__(self, herbs: list[dict], zhengsu_map: dict[str, dict]):
+        self.herbs = herbs
+        self.zhengsu_map = zhengsu_map
+
+    def count(self) -> int:
+        return len(self.herbs)
+
+    def by_meridian(self, meridian: str) -> list[dict]:
+        return query_by_meridian(self.herbs, meridian)
+
+    def by_zhengsu(self, zhengsu_id: str) -> list[dict]:
+        return query_by_zhengsu(self.herbs, zhengsu_id)
+
+    def by_treatment(self, treatment: str) -> list[dict]:
+        return query_by_treatment(self.herbs, treatment)
+
+    def meridians(self) -> list[str]:
+        return sorted(list_all_meridians(self.herbs))
+
+    def zhengsu_ids(self) -> list[str]:
+        return sorted(list_all_zhengsu_in_herbs(self.herbs))
+
+    def treatments(self) -> list[str]:
+        return sorted(list_all_treatments(self.herbs))
+
+
+class DbHerbStore:
+    """以編譯後的 SQLite 資料庫查詢中藥（索引查詢，不讀取 JSON）"""
+
+    def __init__(self, db, conn):
+        self.db = db
+        self.conn = conn
+        self.zhengsu_map = db.zhengsu_map(conn)
+
+    def count(self) -> int:
+        return self.db.count_rows(self.conn, "herbs")
+
+    def by_meridian(self, meridian: str) -> list[dict]:
+        return self.db.herbs_by_meridian(self.conn, meridian)
+
+    def by_zhengsu(self, zhengsu_id: str) -> list[dict]:
+        return self.db.herbs_by_zhengsu(self.conn, zhengsu_id)
+
+    def by_treatment(self, treatment: str) -> list[dict]:
+        return self.db.herbs_by_treatment(self.conn, treatment)
+
+    def meridians(self) -> list[str]:
+        return self.db.list_herb_meridians(self.conn)
+
+    def zhengsu_ids(self) -> list[str]:
+        return self.db.list_herb_zhengsu(self.conn)
+
+    def treatments(self) -> list[str]:
+        return self.db.list_herb_treatments(self.conn)
+
+
 def print_help():
     """顯示幫助資訊"""
     print("""
@@ -162,6 +202,9 @@ def print_help():
   -t, --treatment <治法>   按治法查詢（如：祛風、散寒、補氣）
   -l, --list               列出可用的查詢選項
   -h, --help               顯示此幫助資訊
+  --no-cache               不使用快照快取，重新解析所有資料檔案
+  --rebuild-cache          重新解析所有資料檔案並重建快照快取
+  --db                     改用編譯後的資料庫查詢（需先執行 scripts/corpus_db.py）
 
 範例：
   python query_herbs.py -m 肺           # 查詢歸肺經的中藥
@@ -171,8 +214,9 @@ def print_help():
 """)
 
 
-def interactive_mode(herbs: list[dict], zhengsu_map: dict[str, dict]):
+def interactive_mode(store):
     """互動式查詢模式"""
+    zhengsu_map = store.zhengsu_map
     print("\n中藥查詢工具 - 互動模式")
     print("=" * 50)
     print("查詢選項：")
@@ -190,11 +234,11 @@ def interactive_mode(herbs: list[dict], zhengsu_map: dict[str, dict]):
             break
 
         if choice == "1":
-            all_meridians = list_all_meridians(herbs)
-            print(f"可查詢的歸經：{'、'.join(sorted(all_meridians))}")
+            all_meridians = store.meridians()
+            print(f"可查詢的歸經：{'、'.join(all_meridians)}")
             meridian = input("請輸入歸經：").strip().replace("經", "")
             if meridian:
-                results = query_by_meridian(herbs, meridian)
+                results = store.by_meridian(meridian)
                 if results:
                     print(f"\n找到 {len(results)} 筆歸{meridian}經的中藥：")
                     for herb in results:
@@ -203,14 +247,14 @@ def interactive_mode(herbs: list[dict], zhengsu_map: dict[str, dict]):
                     print(f"沒有找到歸{meridian}經的中藥")
 
         elif choice == "2":
-            all_zhengsu = list_all_zhengsu_in_herbs(herbs)
-            zhengsu_names = [(z, zhengsu_map.get(z, {}).get("name", z)) for z in sorted(all_zhengsu)]
+            all_zhengsu = store.zhengsu_ids()
+            zhengsu_names = [(z, zhengsu_map.get(z, {}).get("name", z)) for z in all_zhengsu]
             print("可查詢的證素：")
             for z_id, z_name in zhengsu_names:
                 print(f"  {z_id}: {z_name}")
             zhengsu_id = input("請輸入證素 ID：").strip()
             if zhengsu_id:
-                results = query_by_zhengsu(herbs, zhengsu_id)
+                results = store.by_zhengsu(zhengsu_id)
                 zhengsu_name = zhengsu_map.get(zhengsu_id, {}).get("name", zhengsu_id)
                 if results:
                     print(f"\n找到 {len(results)} 筆治療「{zhengsu_name}」的中藥：")
@@ -220,11 +264,11 @@ def interactive_mode(herbs: list[dict], zhengsu_map: dict[str, dict]):
                     print(f"沒有找到治療「{zhengsu_name}」的中藥")
 
         elif choice == "3":
-            all_treatments = list_all_treatments(herbs)
-            print(f"可查詢的治法：{'、'.join(sorted(all_treatments))}")
+            all_treatments = store.treatments()
+            print(f"可查詢的治法：{'、'.join(all_treatments)}")
             treatment = input("請輸入治法：").strip()
             if treatment:
-                results = query_by_treatment(herbs, treatment)
+                results = store.by_treatment(treatment)
                 if results:
                     print(f"\n找到 {len(results)} 筆具有「{treatment}」治法的中藥：")
                     for herb in results:
@@ -236,27 +280,51 @@ def interactive_mode(herbs: list[dict], zhengsu_map: dict[str, dict]):
 def main():
     # 確定資料目錄路徑
     script_dir = Path(__file__).parent
-    herbs_dir = script_dir.parent / "data" / "herbs"
-    zhengsu_dir = script_dir.parent / "data" / "zhengsu"
+    data_dir = script_dir.parent / "data"
+    herbs_dir = data_dir / "herbs"
 
     if not herbs_dir.exists():
         print(f"錯誤：找不到中藥資料目錄 {herbs_dir}")
         sys.exit(1)
 
-    # 讀取所有資料
-    herbs = load_all_herbs(herbs_dir)
-    zhengsu_map = load_all_zhengsu(zhengsu_dir) if zhengsu_dir.exists() else {}
+    # 快取與資料庫選項可出現在任意位置
+    option_flags = {"--no-cache", "--rebuild-cache", "--db"}
+    argv = [a for a in sys.argv[1:] if a not in option_flags]
+
+    if "--db" in sys.argv:
+        # 以編譯後的資料庫查詢，不掃描 JSON（sqlite3 只在此時載入，不拖慢 JSON 模式的啟動）
+        import corpus_db
+        try:
+            conn = corpus_db.connect(corpus_db.default_db_path(data_dir))
+        except (FileNotFoundError, ValueError) as e:
+            print(f"錯誤：{e}")
+            sys.exit(1)
+        if corpus_db.is_stale(conn, data_dir):
+            print("警告：資料檔案在資料庫編譯後已變更，查詢結果可能過期")
+        store = DbHerbStore(corpus_db, conn)
+    else:
+        cache = snapshot_cache_for(
+            data_dir,
+            no_cache="--no-cache" in sys.argv,
+            rebuild="--rebuild-cache" in sys.argv
+        )
+
+        # 讀取所有資料（未變更的檔案直接取用快照）
+        corpus = load_corpus(data_dir, ["herbs", "zhengsu"], cache=cache)
+        store = JsonHerbStore(list(corpus.herbs.values()), corpus.zhengsu)
+
+    zhengsu_map = store.zhengsu_map
 
-    if not herbs:
+    if not store.count():
         print("警告：沒有找到任何中藥資料")
         sys.exit(1)
 
-    print(f"已載入 {len(herbs)} 筆中藥資料")
+    print(f"已載入 {store.count()} 筆中藥資料")
     print(f"已載入 {len(zhengsu_map)} 筆證素資料")
 
     # 命令列參數模式
-    if len(sys.argv) > 1:
-        arg = sys.argv[1]
+    if len(argv) > 0:
+        arg = argv[0]
 
         if arg in ["-h", "--help"]:
             print_help()
@@ -264,21 +332,21 @@ def main():
 
         if arg in ["-l", "--list"]:
             print("\n可用的歸經：")
-            print(f"  {'、'.join(sorted(list_all_meridians(herbs)))}")
+            print(f"  {'、'.join(store.meridians())}")
             print("\n可用的證素：")
             for z_id, z_name in [(z, zhengsu_map.get(z, {}).get("name", z))
-                                  for z in sorted(list_all_zhengsu_in_herbs(herbs))]:
+                                  for z in store.zhengsu_ids()]:
                 print(f"  {z_id}: {z_name}")
             print("\n可用的治法：")
-            print(f"  {'、'.join(sorted(list_all_treatments(herbs)))}")
+            print(f"  {'、'.join(store.treatments())}")
             return
 
-        if len(sys.argv) >= 3:
-            value = sys.argv[2]
+        if len(argv) >= 2:
+            value = argv[1]
 
             if arg in ["-m", "--meridian"]:
                 meridian = value.replace("經", "")
-                results = query_by_meridian(herbs, meridian)
+                results = store.by_meridian(meridian)
                 if results:
                     print(f"\n找到 {len(results)} 筆歸{meridian}經的中藥：")
                     for herb in results:
@@ -289,7 +357,7 @@ def main():
 
             if arg in ["-z", "--zhengsu"]:
                 zhengsu_id = value
-                results = query_by_zhengsu(herbs, zhengsu_id)
+                results = store.by_zhengsu(zhengsu_id)
                 zhengsu_name = zhengsu_map.get(zhengsu_id, {}).get("name", zhengsu_id)
                 if results:
                     print(f"\n找到 {len(results)} 筆治療「{zhengsu_name}」的中藥：")
@@ -301,7 +369,7 @@ def main():
 
             if arg in ["-t", "--treatment"]:
                 treatment = value
-                results = query_by_treatment(herbs, treatment)
+                results = store.by_treatment(treatment)
                 if results:
                     print(f"\n找到 {len(results)} 筆具有「{treatment}」治法的中藥：")
                     for herb in results:
@@ -312,7 +380,7 @@ def main():
 
         # 舊版兼容：直接傳入歸經
         meridian = arg.replace("經", "")
-        results = query_by_meridian(herbs, meridian)
+        results = store.by_meridian(meridian)
         if results:
             print(f"\n找到 {len(results)} 筆歸{meridian}經的中藥：")
             for herb in results:
@@ -322,7 +390,7 @@ def main():
         return
 
     # 互動式查詢
-    interactive_mode(herbs, zhengsu_map)
+    interactive_mode(store)
 
 
 if __name__ == "__main__":
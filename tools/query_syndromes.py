@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+證候查詢工具 - 以編譯後的資料庫查詢證候（全文搜尋、證素組成、症狀、分類）
+"""
+
+import sys
+import argparse
+from pathlib import Path
+
+# 共用 scripts/ 下的資料庫模組
+sys.path.insert(0, str(Path(__file__).parent.parent / "scripts"))
+
+import corpus_db
+
+
+def display_syndrome(syndrome: dict, zhengsu_map: dict[str, dict]) -> None:
+    """顯示證候資料"""
+    print(f"\n{'=' * 50}")
+    print(f"名稱：{syndrome.get('name', '未知')}（{syndrome.get('id', '')}）")
+    print(f"分類：{syndrome.get('category', '未知')}")
+
+    comp = syndrome.get("zhengsu_composition", {})
+    for role, label in [("location", "病位"), ("nature", "病性")]:
+        names = [zhengsu_map.get(z, {}).get("name", z) for z in comp.get(role, [])]
+        if names:
+            print(f"{label}：{' + '.join(names)}")
+
+    if syndrome.get("overview"):
+        print(f"\n概述：\n{syndrome['overview']}")
+    if syndrome.get("clinical_manifestations"):
+        print(f"\n臨床表現：{syndrome['clinical_manifestations']}")
+
+    diseases = syndrome.get("common_diseases", [])
+    if diseases:
+        print(f"\n常見疾病：{'、'.join(diseases)}")
+    differential = syndrome.get("differential_syndromes", [])
+    if differential:
+        print(f"鑑別證候：{'、'.join(differential)}")
+
+
+def display_list(results: list, title: str) -> None:
+    """顯示查詢結果清單"""
+    if not results:
+        print(f"沒有找到{title}的證候")
+        return
+    print(f"\n找到 {len(results)} 筆{title}的證候：")
+    for row in results:
+        syndrome_id, name = row[0], row[1]
+        print(f"  {name}（{syndrome_id}）")
+        if len(row) > 2 and row[2]:
+            print(f"    {row[2].replace(chr(10), ' ')}")
+
+
+def main():
+    script_dir = Path(__file__).parent
+    data_dir = script_dir.parent / "data"
+
+    parser = argparse.ArgumentParser(description="證候查詢工具（需先執行 scripts/corpus_db.py 編譯資料庫）")
+    parser.add_argument("-s", "--search", help="全文搜尋概述、鑑別分析與文獻（空白分隔多個關鍵詞）")
+    parser.add_argument("-z", "--zhengsu", nargs="+", help="證素組成包含所有指定證素 ID（如：fei qi_xu）")
+    parser.add_argument("-y", "--symptom", help="臨床表現含指定症狀（如：神疲乏力）")
+    parser.add_argument("-c", "--category", help="按分類查詢（如：臟腑證候）")
+    parser.add_argument("-i", "--show", help="顯示指定 ID 或名稱的證候")
+    parser.add_argument("-n", "--limit", type=int, default=20, help="全文搜尋的最多筆數 (預設: 20)")
+    parser.add_argument("--db", help="資料庫路徑 (預設: data/indexes/tcm.db)")
+
+    args = parser.parse_args()
+
+    db_path = Path(args.db) if args.db else corpus_db.default_db_path(data_dir)
+    try:
+        conn = corpus_db.connect(db_path)
+    except (FileNotFoundError, ValueError) as e:
+        print(f"錯誤：{e}")
+        return 1
+
+    if not args.db and corpus_db.is_stale(conn, data_dir):
+        print("警告：資料檔案在資料庫編譯後已變更，查詢結果可能過期")
+
+    zhengsu_map = corpus_db.zhengsu_map(conn)
+
+    if args.show:
+        syndrome = corpus_db.get_syndrome(conn, args.show)
+        if not syndrome:
+            print(f"沒有找到證候：{args.show}")
+            return 1
+        display_syndrome(syndrome, zhengsu_map)
+    elif args.search:
+        display_list(corpus_db.search_syndromes(conn, args.search, args.limit), f"提及「{args.search}」")
+    elif args.zhengsu:
+        names = [zhengsu_map.get(z, {}).get("name", z) for z in args.zhengsu]
+        display_list(corpus_db.syndromes_by_zhengsu(conn, args.zhengsu), f"含證素「{' + '.join(names)}」")
+    elif args.symptom:
+        display_list(corpus_db.syndromes_by_symptom(conn, args.symptom), f"見「{args.symptom}」")
+    elif args.category:
+        display_list(corpus_db.syndromes_by_category(conn, args.category), f"屬「{args.category}」")
+    else:
+        parser.print_help()
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())